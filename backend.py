@@ -0,0 +1,107 @@
+import asyncio
+import os
+import socket
+import subprocess
+import time
+
+import config
+from journal import JOURNAL, Journal
+from metrics_exporter import SPAWN_DURATION
+from reconnect import has_ip_lease, local_address
+from tracing import span
+
+# Настройка для скрытия окон CMD в EXE (PyInstaller --windowed)
+if os.name == 'nt':  # Только для Windows
+    STARTUPINFO = subprocess.STARTUPINFO()
+    STARTUPINFO.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    STARTUPINFO.wShowWindow = subprocess.SW_HIDE
+else:
+    STARTUPINFO = None
+
+
+class SystemBackend:
+    """Всё, чем монитор касается системы: процессы netsh, сокеты, часы.
+
+    WiFiMonitor и его компоненты обращаются к ОС только через backend,
+    поэтому его можно подменить (см. simulation.SimulatedBackend) и
+    прогонять монитор без радиомодуля и на виртуальном времени.
+    """
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or config.APP_DATA_DIR  # Кэш профилей и история метрик
+        # Журнал событий: в каталоге по умолчанию — общий JOURNAL, куда daemon копирует и print()
+        self.journal = JOURNAL if data_dir is None else Journal(os.path.join(data_dir, "journal"))
+
+    # Монотонные часы (интервалы, TTL) и время для истории и журнала
+    clock = staticmethod(time.monotonic)
+    wall = staticmethod(time.time)
+
+    def create_session(self):
+        """Сессия команд для ProbeEngine или None (см. command_session)"""
+        from command_session import create_session  # Модуль сам берёт STARTUPINFO отсюда
+        return create_session()
+
+    def create_event_backend(self):
+        """Источник событий ОС (см. event_backend)"""
+        from event_backend import create_event_backend  # Модуль сам берёт STARTUPINFO отсюда
+        return create_event_backend()
+
+    async def run(self, args, timeout=None):
+        """Запускает процесс и возвращает CompletedProcess с выводом в байтах.
+
+        По истечении timeout процесс убивается и выбрасывается TimeoutExpired.
+        """
+        started = time.perf_counter()
+        with span("spawn", argv=" ".join(args)) as current:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                startupinfo=STARTUPINFO  # Скрывает окно
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await _kill(process)
+                raise subprocess.TimeoutExpired(args, timeout)
+            except asyncio.CancelledError:
+                await _kill(process)
+                raise
+            finally:
+                SPAWN_DURATION.observe(time.perf_counter() - started)
+            current.set(returncode=process.returncode, stdout_bytes=len(stdout), stderr_bytes=len(stderr))
+
+        return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+    async def open_connection(self, host, port):
+        """TCP-подключение: (StreamReader, StreamWriter)"""
+        return await asyncio.open_connection(host, port)
+
+    async def getaddrinfo(self, host, port):
+        """Разрешение имени через системный резолвер"""
+        return await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+    def local_address(self, gateway=None):
+        return local_address(gateway)
+
+    def has_ip_lease(self, interface=None, gateway=None):
+        return has_ip_lease(interface, gateway)
+
+
+async def _kill(process):
+    """Завершает зависший процесс netsh (если он ещё жив) и дожидается его выхода.
+
+    Без wait() убитый процесс остаётся зомби, а его каналы — открытыми,
+    пока цикл событий сам не заметит выход. Ожидание ограничено
+    KILL_WAIT_TIMEOUT, в том числе при отмене такта.
+    """
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    try:
+        await asyncio.wait_for(process.wait(), config.KILL_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
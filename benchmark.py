@@ -0,0 +1,961 @@
+import os
+import sys
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BASE_DIR, "fixtures", "netsh")
+
+
+def load_fixture(name):
+    """Читает сохранённый вывод netsh (байты, как их возвращает процесс)"""
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+def _per_call_us(func, number):
+    """Лучшее из пяти измерений, микросекунды на вызов"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def bench_parser(number=2000):
+    """Время разбора вывода netsh на каждом фикстуре и на такт (interfaces + networks)"""
+    from netsh_parser import parse_interfaces, parse_networks
+
+    print("Разбор вывода netsh (мкс на вызов):")
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        data = load_fixture(name)
+        parse = parse_interfaces if name.startswith("interfaces") else parse_networks
+        print(f"  {name:<40} {_per_call_us(lambda: parse(data), number):8.1f}")
+
+    ticks = (
+        ("en", "interfaces_en_connected.txt", "networks_en_bssid.txt"),
+        ("ru/cp866", "interfaces_ru_connected.txt", "networks_ru_bssid.txt"),
+    )
+    print("Такт мониторинга (мкс):")
+    for label, interfaces_name, networks_name in ticks:
+        interfaces = load_fixture(interfaces_name)
+        networks = load_fixture(networks_name)
+
+        def tick():
+            parse_interfaces(interfaces)
+            parse_networks(networks)
+
+        print(f"  {label:<40} {_per_call_us(tick, number):8.1f}")
+
+
+# Сценарий-заменитель `nmcli monitor`: печатает событие на каждый байт из stdin
+EVENT_STAND_IN = (
+    "import sys\n"
+    "states = ['disconnected', 'connected']\n"
+    "n = 0\n"
+    "while sys.stdin.buffer.read(1):\n"
+    "    print('wlan0: ' + states[n % 2], flush=True)\n"
+    "    n += 1\n"
+)
+
+
+def bench_events(count=200):
+    """Задержка доставки события от процесса-источника до обработчика"""
+    import asyncio
+    import time
+
+    from event_backend import NmcliEventParser, StreamingBackend
+
+    async def run():
+        backend = StreamingBackend([sys.executable, "-u", "-c", EVENT_STAND_IN], NmcliEventParser())
+        received = asyncio.Queue()
+        await backend.start(lambda event: received.put_nowait(time.perf_counter()))
+        while not backend.active:
+            await asyncio.sleep(0.01)
+
+        latencies = []
+        stdin = backend._process.stdin
+        for _ in range(count):
+            started = time.perf_counter()
+            stdin.write(b"x")
+            await stdin.drain()
+            latencies.append(await received.get() - started)
+        await backend.stop()
+        return sorted(latencies)
+
+    latencies = asyncio.run(run())
+    median = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"Поток событий: медиана {median:.2f} мс, p99 {p99:.2f} мс ({count} событий)")
+    print("Опрос netsh: задержка обнаружения до CHECK_INTERVAL + время запуска процесса")
+
+    # Источник, падающий сразу после запуска: пауза растёт, затем перезапуски прекращаются
+    import config
+
+    delays = config.EVENT_RESTART_DELAY, config.EVENT_RESTART_MAX_DELAY
+    config.EVENT_RESTART_DELAY, config.EVENT_RESTART_MAX_DELAY = 0.01, 0.04
+
+    async def crash_loop():
+        backend = StreamingBackend([sys.executable, "-c", "pass"], NmcliEventParser())
+        started = time.perf_counter()
+        await backend.start(lambda event: None)
+        await asyncio.wait_for(backend._task, 30)
+        return backend, time.perf_counter() - started
+
+    try:
+        backend, elapsed = asyncio.run(crash_loop())
+    finally:
+        config.EVENT_RESTART_DELAY, config.EVENT_RESTART_MAX_DELAY = delays
+    print(f"Падающий поток событий: запусков {backend.spawn_count}, перезапуски прекращены: {backend.gave_up} "
+          f"(за {elapsed:.2f} с)")
+    return backend.gave_up and backend.spawn_count == config.EVENT_MAX_QUICK_FAILURES
+
+
+# Заменитель netsh: с аргументами печатает ответ и завершается (как обычный запуск),
+# без аргументов работает как интерактивный режим и читает команды из stdin
+FAKE_NETSH = """
+import sys
+ANSWER = open(sys.argv[1], 'rb').read()
+def answer(command):
+    if command == 'wlan show interfaces':
+        sys.stdout.buffer.write(ANSWER)
+    else:
+        sys.stdout.buffer.write(b'The following command was not found: ' + command.encode() + b'.\\r\\n')
+    sys.stdout.flush()
+if len(sys.argv) > 2:
+    answer(' '.join(sys.argv[2:]))
+else:
+    for line in sys.stdin:
+        sys.stdout.buffer.write(b'netsh>')
+        answer(line.strip())
+"""
+
+
+def bench_session(count=100):
+    """Запуск процесса на каждый запрос против одной постоянной сессии команд"""
+    import asyncio
+    import tempfile
+    import time
+
+    from command_session import CommandSession, NetshDialect
+    from netsh_parser import parse_interfaces
+    from probe_engine import ProbeEngine
+
+    fixture = os.path.join(FIXTURES_DIR, "interfaces_en_connected.txt")
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(FAKE_NETSH)
+        tool = f.name
+    base = [sys.executable, "-u", tool, fixture]
+
+    async def run():
+        engine = ProbeEngine("Home")
+        started = time.perf_counter()
+        for _ in range(count):
+            result = await engine.run(base + ["wlan", "show", "interfaces"])
+            assert parse_interfaces(result.stdout)[0].ssid == "Home"
+        spawn_time = (time.perf_counter() - started) / count
+
+        session = CommandSession(NetshDialect(), argv=base)
+        started = time.perf_counter()
+        for _ in range(count):
+            result = await session.run(["netsh", "wlan", "show", "interfaces"], timeout=5)
+            assert parse_interfaces(result.stdout)[0].ssid == "Home" and result.returncode == 0
+        session_time = (time.perf_counter() - started) / count
+        # Отказ netsh в интерактивном режиме виден только по тексту ответа
+        failed = await session.run(["netsh", "wlan", "connect", "name=Моя сеть"], timeout=5)
+        await session.aclose()
+        return engine.direct_spawns, spawn_time, session.spawn_count, session_time, failed.returncode
+
+    try:
+        spawns, spawn_time, session_spawns, session_time, failed_code = asyncio.run(run())
+    finally:
+        os.remove(tool)
+    print(f"Запуск на каждый запрос: {spawn_time * 1000:8.2f} мс/запрос, процессов: {spawns}")
+    print(f"Постоянная сессия:       {session_time * 1000:8.2f} мс/запрос, процессов: {session_spawns}")
+    print(f"  код возврата неизвестной команды в сессии: {failed_code}")
+    return failed_code != 0
+
+
+def bench_log(sizes=(10_000, 1_000_000), updates=1000):
+    """Время GUI-потока на одно обновление лога при 10 тыс. и 1 млн записей"""
+    import tempfile
+    import time
+
+    from log_model import LogModel
+
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication, QTextEdit
+        from main_gui import LogView
+        app = QApplication.instance() or QApplication(sys.argv)
+    except ImportError:
+        app = None
+        print("PyQt5 не установлен: измеряется только модель лога")
+
+    def measure(update, count=updates):
+        started = time.perf_counter()
+        for i in range(count):
+            update(i)
+        return (time.perf_counter() - started) / count * 1e6
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            model = LogModel(spill_path=os.path.join(directory, f"spill-{size}.log"))
+            view = LogView(model.max_lines) if app else None
+            for i in range(size):
+                line = f"[00:00:00] Статус {i}"
+                model.append(line)
+                if view is not None and size - i <= model.max_lines:
+                    view.append_line(line)
+
+            def update(i):
+                line = f"[00:00:01] Подключено {i}"
+                model.replace_last(line)
+                if view is not None:
+                    view.replace_last_line(line)
+                    app.processEvents()
+
+            print(f"  {size:>9} записей, новый лог: {measure(update):10.1f} мкс/обновление")
+            model.close()
+
+        if app is not None:
+            # Прежний способ: clear() и повторное добавление всей истории
+            size = sizes[0]
+            history = [f"[00:00:00] Статус {i}" for i in range(size)]
+            old_view = QTextEdit()
+
+            def old_update(i):
+                history[-1] = f"[00:00:01] Подключено {i}"
+                old_view.clear()
+                for status in history:
+                    old_view.append(status)
+                app.processEvents()
+
+            print(f"  {size:>9} записей, clear + replay: {measure(old_update, 3):10.1f} мкс/обновление")
+
+
+# Дочерний процесс: время импорта точки входа и пиковая память
+STARTUP_PROBE = """
+import sys, time
+started = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if sys.platform == 'darwin':
+        rss /= 1024
+    rss = f"{rss:.1f} МБ"
+except ImportError:
+    rss = "н/д"
+print(f"{elapsed * 1000:.1f} {rss}")
+"""
+
+
+def bench_startup():
+    """Время импорта и пиковая память: фоновый режим (daemon) против GUI (main_gui)"""
+    import subprocess
+
+    for module in ("daemon", "main_gui"):
+        result = subprocess.run([sys.executable, "-c", STARTUP_PROBE, module],
+                                capture_output=True, text=True, cwd=BASE_DIR)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "ошибка"
+            print(f"  {module:<10} недоступен: {error}")
+            continue
+        elapsed, rss = result.stdout.split(" ", 1)
+        print(f"  {module:<10} импорт {elapsed:>7} мс, пиковая память {rss.strip()}")
+
+
+def bench_metrics(samples=2 * 24 * 3600):
+    """Запись образца и запросы к истории метрик за двое суток тактов по 1 с"""
+    import tempfile
+    import time
+
+    import metrics_store
+    from metrics_store import MetricsStore
+    from monitor_state import LinkState
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = MetricsStore(directory, raw_capacity=samples)
+        now = time.time()
+        started = time.perf_counter()
+        for i in range(samples):
+            state = LinkState.ONLINE if i % 3600 > 30 else LinkState.NOT_FOUND
+            store.record(state, signal=70 + i % 20, rx_rate=300.0, tx_rate=200.0,
+                         rtt=0.02 if state is LinkState.ONLINE else None, timestamp=now - samples + i)
+        record_us = (time.perf_counter() - started) / samples * 1e6
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"Запись: {record_us:.1f} мкс/образец, файлы: {size / 1024 / 1024:.1f} МБ")
+
+        backends = [("NumPy", metrics_store.np)] if metrics_store.np is not None else []
+        backends.append(("без NumPy", None))
+        numpy = metrics_store.np
+        for label, module in backends:
+            metrics_store.np = module
+            for name, query in (("доступность", lambda: store.uptime(samples, now)),
+                                ("p95 RTT", lambda: store.rtt_percentile(95, samples, now)),
+                                ("перебои", lambda: store.outages(samples, now))):
+                print(f"  {label:<10} {name:<12} {_per_call_us(query, 3) / 1000:8.1f} мс")
+        metrics_store.np = numpy
+        store.close()
+
+    # Такты нерегулярны: 23 ч связи с тактом 15 с и час сбоя с тактом 1 с
+    with tempfile.TemporaryDirectory() as directory:
+        store = MetricsStore(directory)
+        timestamp = now - 24 * 3600
+        for state, count, step in ((LinkState.ONLINE, 23 * 240, 15), (LinkState.NOT_FOUND, 3600, 1)):
+            for _ in range(count):
+                store.record(state, timestamp=timestamp)
+                timestamp += step
+        ticks = 23 * 240 / (23 * 240 + 3600)
+        print(f"Доступность за сутки (23 ч из 24): по времени {store.uptime(24 * 3600, timestamp) * 100:.1f}%, "
+              f"по числу тактов было бы {ticks * 100:.1f}%")
+        store.close()
+
+
+def bench_exporter(number=100000):
+    """Стоимость наблюдения в гистограмме (в такте) и формирования ответа /metrics"""
+    from metrics_exporter import REGISTRY, Histogram
+
+    histogram = Histogram("bench_seconds", "")
+    print(f"Histogram.observe: {_per_call_us(lambda: histogram.observe(0.042), number):.2f} мкс")
+    print(f"Registry.render:   {_per_call_us(REGISTRY.render, 1000):.1f} мкс")
+
+
+def bench_tracing(number=200000):
+    """Цена span() в такте при выключенной и включённой трассировке"""
+    import tracing
+
+    def traced():
+        with tracing.span("bench", value=1) as current:
+            current.set(bytes=0)
+
+    enabled = tracing.TRACER.enabled
+    for label, state in (("выключена", False), ("включена", True)):
+        tracing.TRACER.enabled = state
+        print(f"Трассировка {label:<10} {_per_call_us(traced, number):6.2f} мкс/span")
+    tracing.TRACER.enabled = enabled
+    tracing.TRACER.events.clear()
+
+
+class _RouterStandIn:
+    """Заменитель веб-интерфейса роутера: вход по cookie, ETag, счётчики соединений.
+
+    Сессия истекает после session_requests запросов, чтобы проверить повторный вход.
+    """
+
+    def __init__(self, session_requests=50, delay=0.0):
+        import json
+        import threading
+        import uuid
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        import config
+
+        stand_in = self
+        self.connections = 0
+        self.logins = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.sessions = {}
+        bodies = {
+            config.ROUTER_ENDPOINTS["wan"]: {"status": "up", "ip": "203.0.113.7"},
+            config.ROUTER_ENDPOINTS["system"]: {"uptime": 93784},
+            config.ROUTER_ENDPOINTS["clients"]: {"clients": [{"mac": f"00:11:22:33:44:{i:02x}"} for i in range(7)]},
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                stand_in.connections += 1
+
+            def _send(self, code, body=b"", headers=()):
+                self.send_response(code)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stand_in.requests += 1
+                if self.path != config.ROUTER_LOGIN_PATH:
+                    return self._send(404)
+                stand_in.logins += 1
+                sid = uuid.uuid4().hex
+                stand_in.sessions[sid] = session_requests
+                self._send(200, b"{}", [("Set-Cookie", f"sid={sid}; Path=/")])
+
+            def do_GET(self):
+                import time
+                time.sleep(delay)
+                stand_in.requests += 1
+                cookie = self.headers.get("Cookie", "")
+                sid = cookie.split("sid=", 1)[1].split(";", 1)[0] if "sid=" in cookie else None
+                if stand_in.sessions.get(sid, 0) <= 0:
+                    return self._send(401)
+                stand_in.sessions[sid] -= 1
+                if self.path not in bodies:
+                    return self._send(404)
+                body = json.dumps(bodies[self.path]).encode()
+                etag = f'"{hash(body) & 0xffffffff:x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    stand_in.not_modified += 1
+                    return self._send(304, headers=[("ETag", etag)])
+                self._send(200, body, [("ETag", etag), ("Content-Type", "application/json")])
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def bench_router(checks=200):
+    """Проверка роутера против локального заменителя: соединения, входы, 304 и кэш"""
+    import asyncio
+    import time
+
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        print("requests не установлен: проверка роутера недоступна")
+        return
+
+    from router_health import RouterClient, RouterHealth
+
+    stand_in = _RouterStandIn(session_requests=40)
+    clock = [0.0]
+    client = RouterClient(host=stand_in.host, password="secret", cache_ttl=10, clock=lambda: clock[0])
+    started = time.perf_counter()
+    for _ in range(checks):
+        status = client.status()
+        clock[0] += 5  # Половина проверок попадает в кэш, остальные — условные запросы
+    elapsed = (time.perf_counter() - started) / checks
+    print(status.describe())
+    print(f"  {checks} проверок: {elapsed * 1000:.2f} мс/проверка, HTTP-запросов: {stand_in.requests}, "
+          f"соединений: {stand_in.connections}, входов: {stand_in.logins}, "
+          f"ответов 304: {stand_in.not_modified}, из кэша: {client.cache_hits}")
+    client.close()
+    stand_in.close()
+
+    # Медленный роутер не задерживает цикл событий: проверка идёт в своём потоке
+    slow = _RouterStandIn(delay=0.5)
+    health = RouterHealth(RouterClient(host=slow.host, password="secret"))
+
+    async def run():
+        future = health.check()
+        started = time.perf_counter()
+        ticks = 0
+        while not future.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return ticks, time.perf_counter() - started, future.result()
+
+    ticks, elapsed, status = asyncio.run(run())
+    print(f"  медленный роутер: проверка {elapsed:.2f} с, за это время прошло {ticks} шагов цикла; "
+          f"{status.describe()}")
+
+    # Остановка во время зависшей проверки не ждёт её: сессию закроет сама проверка
+    async def close_while_checking():
+        future = health.check()
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        health.close()
+        closing = time.perf_counter() - started
+        await future
+        return closing, health.check().result()
+
+    closing, after = asyncio.run(close_while_checking())
+    print(f"  close() во время проверки: {closing * 1000:.2f} мс; после остановки: {after.describe()}")
+    slow.close()
+    return closing < 0.1
+
+
+def bench_reachability(stagger=0.05, deadline=1.0):
+    """Гонка целей против локальных: принимающий порт, закрытый порт и порт с переполненной очередью.
+
+    Проверяет победителя, дедлайн гонки без ответа и то, что каждая
+    попытка учтена в статистике ровно один раз.
+    """
+    import asyncio
+    import socket
+    import time
+
+    from reachability import ReachabilityProber
+
+    def listener(backlog):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(backlog)
+        return sock
+
+    accepting = listener(16)
+    refused = listener(0)
+    refused_port = refused.getsockname()[1]
+    refused.close()  # Порт свободен: подключение сразу отклоняется
+    # Очередь без accept() переполнена — новые SYN остаются без ответа, как у недоступного узла
+    blackhole = listener(0)
+    fillers = []
+    for _ in range(8):
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex(blackhole.getsockname())
+        fillers.append(filler)
+    time.sleep(0.1)
+
+    targets = {"blackhole": blackhole.getsockname(), "refused": ("127.0.0.1", refused_port),
+               "accepting": accepting.getsockname()}
+
+    def prober(*names):
+        return ReachabilityProber(targets=[(name, *targets[name]) for name in names], stagger=stagger,
+                                  timeout=deadline, min_timeout=deadline)
+
+    async def run(prober):
+        started = time.perf_counter()
+        result = await prober.probe()
+        return result, time.perf_counter() - started, prober.stats()
+
+    # (цели, победитель, {цель: (попыток, потерь)}): проигравшая победителю попытка не учитывается,
+    # не дождавшаяся дедлайна — одна потеря
+    cases = ((("blackhole", "refused", "accepting"), "accepting",
+              {"blackhole": (0, 0), "refused": (1, 1), "accepting": (1, 0)}),
+             (("blackhole", "refused"), None, {"blackhole": (1, 1), "refused": (1, 1)}))
+    ok = True
+    for names, expected, counts in cases:
+        result, elapsed, stats = asyncio.run(run(prober(*names)))
+        winner = result.target.name if result.target else None
+        counted = {name: (stats[name]["attempts"], stats[name]["failures"]) for name in names}
+        in_time = elapsed < stagger * len(names) + 0.5 if expected else deadline <= elapsed < deadline + 0.5
+        passed = winner == expected and counted == counts and in_time
+        ok = ok and passed
+        print(f"{' -> '.join(names)}: победитель {winner}, {elapsed * 1000:.0f} мс "
+              f"(дедлайн {deadline * 1000:.0f} мс), попыток/потерь {counted}{'' if passed else ' — ОШИБКА'}")
+
+    for sock in (accepting, blackhole, *fillers):
+        sock.close()
+    return ok
+
+
+def bench_diagnosis(runs=50):
+    """Диагностика по уровням против локальных заменителей шлюза и HTTP-проверки"""
+    import asyncio
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from types import SimpleNamespace
+
+    import config
+    from backend import SystemBackend
+    from diagnosis import GATEWAY, HTTP, DiagnosisPipeline
+    from netsh_parser import STATE_CONNECTED, InterfaceInfo
+    from probe_engine import NetworkSnapshot
+
+    mode = {"portal": False, "delay": 0.0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(mode["delay"])
+            if mode["portal"]:
+                self.send_response(302)
+                self.send_header("Location", "http://portal.example/login")
+            else:
+                self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config.ROUTER_IP = config.DIAG_HTTP_HOST = "127.0.0.1"
+    config.DIAG_GATEWAY_PORT = config.DIAG_HTTP_PORT = server.server_address[1]
+    config.DIAG_DNS_NAME = "localhost"
+
+    interface = InterfaceInfo()
+    interface.name, interface.state, interface.ssid, interface.bssid = "Wi-Fi", STATE_CONNECTED, "Home", "aa:bb"
+    snapshot = NetworkSnapshot(time.monotonic(), "Home", True, True, False, (interface,))
+    monitor = SimpleNamespace(engine=SimpleNamespace(last_snapshot=snapshot), ssid="Home", backend=SystemBackend(),
+                              events=SimpleNamespace(active=False))
+    # Снимок такта считается свежим, остальные уровни проверяются каждый раз
+    pipeline = DiagnosisPipeline(monitor, ttl={**{layer: 0 for layer in config.DIAG_TTL}, "link": 3600})
+
+    async def run(count):
+        started = time.perf_counter()
+        for _ in range(count):
+            diagnosis = await pipeline.run()
+        return diagnosis, (time.perf_counter() - started) / count
+
+    diagnosis, elapsed = asyncio.run(run(runs))
+    print(f"Связь в порядке: {elapsed * 1000:.2f} мс/диагностика, {diagnosis.as_dict()}")
+
+    mode["portal"] = True
+    diagnosis, elapsed = asyncio.run(run(runs))
+    print(f"Captive portal: {elapsed * 1000:.2f} мс, {diagnosis.describe()}")
+
+    # Шлюз отказал сразу, а медленная HTTP-проверка отменяется, не дожидаясь ответа
+    mode.update(portal=False, delay=1.0)
+
+    async def gateway_down():
+        raise ConnectionResetError(104, "шлюз не отвечает")
+
+    pipeline._checks[GATEWAY] = gateway_down
+    cancelled = pipeline.cancelled
+    diagnosis, elapsed = asyncio.run(run(5))
+    print(f"Отказ шлюза: {elapsed * 1000:.2f} мс (HTTP отвечает за {mode['delay']:.0f} с), "
+          f"отказал: {diagnosis.failed}, исправление: {diagnosis.remedy}, "
+          f"отменено проверок выше: {pipeline.cancelled - cancelled}, HTTP в итоге: {HTTP in diagnosis.results}")
+
+    # Кэш: повторная диагностика в пределах TTL не открывает соединений
+    pipeline.ttl = {**config.DIAG_TTL, "link": 3600}
+    pipeline.invalidate()
+    hits = pipeline.cache_hits
+    diagnosis, elapsed = asyncio.run(run(runs))
+    print(f"С кэшем (TTL): {elapsed * 1000:.3f} мс/диагностика, из кэша уровней: {pipeline.cache_hits - hits}")
+    server.shutdown()
+
+    # Симуляция: шлюз отвечает, интернета за ним нет (в том числе при проходящих TCP-подключениях
+    # и за captive portal) — монитор должен заметить каждый сбой и запустить диагностику
+    from simulation import SimulatedEnvironment, simulate
+
+    environment = SimulatedEnvironment(seed=1).add_access_point("Home", "a4:2b:b0:11:22:33", 75)
+    environment.associated("Home").blackout(600, 1500)
+    environment.captive_portal(2400, 2800).upstream_outage(3600, 4200)
+    report = simulate(environment, 5400)
+    detected = (report.stats["diagnosis_runs"] > 0 and not report.missed
+                and len(report.detection) == len(environment.outages))
+    if detected:
+        for (kind, detection), (_, recovery) in zip(report.detection, report.recovery):
+            print(f"Шлюз есть, интернета нет (симуляция, {kind}): обнаружено за {detection:.1f} с, "
+                  f"восстановление за {recovery:.1f} с")
+        print(f"  диагностик: {report.stats['diagnosis_runs']}, "
+              f"HTTP-проверок 204 в проверке интернета: {report.stats['diagnosis_verifications']}")
+    else:
+        print(f"  ОШИБКА: сбой за шлюзом не обнаружен (не замечено: {', '.join(report.missed) or '-'})")
+    return detected
+
+
+def bench_quality(episodes=40, seed=1):
+    """Повтор записи затуханий сигнала: простой при реакции на разрыв и при упреждающем переходе"""
+    import random
+
+    from link_quality import ACTION_RECONNECT, ACTION_ROAM, ACTION_SURVEY, LinkQualityAnalyzer
+    from netsh_parser import STATE_CONNECTED, BssidInfo, InterfaceInfo, NetworkInfo
+    from probe_engine import NetworkSnapshot
+
+    link_fail = 12  # Ниже этого сигнала (%) ассоциация теряется
+    reactive_outage = 8.0  # Обнаружение разрыва + ассоциация + DHCP после потери связи
+    roam_outage = 2.0  # Плановый переход на заранее найденную точку
+    scan_delay = 3  # Скан эфира занимает несколько секунд
+
+    rng = random.Random(seed)
+    # Запись: устойчивый участок, затем затухание текущей точки; соседняя держит уровень
+    trace = []
+    for n in range(episodes):
+        stable, level = rng.randint(90, 180), rng.uniform(60, 75)
+        rate, neighbour = rng.uniform(0.7, 2.0), rng.uniform(45, 65)
+        trace.append((f"ap-{n}", f"ap-{n + 1}", stable, level, rate, neighbour))
+
+    def replay(predictive):
+        noise = random.Random(seed)  # Одинаковый шум для обеих стратегий
+        analyzer = LinkQualityAnalyzer("Home")
+        now, downtime, roams, early = 0.0, 0.0, 0, 0
+        for current, other, stable, level, rate, neighbour in trace:
+            scan_at = None
+            for second in range(100000):
+                signal = level - max(0, second - stable) * rate + noise.gauss(0, 3)
+                if signal < link_fail:
+                    downtime += reactive_outage
+                    now += reactive_outage
+                    break
+                interface = InterfaceInfo()
+                interface.state, interface.ssid, interface.bssid = STATE_CONNECTED, "Home", current
+                interface.signal, interface.rx_rate = int(signal), max(1.0, signal * 2)
+                networks = None
+                if scan_at is not None and now >= scan_at:
+                    network = NetworkInfo("Home")
+                    for bssid, value in ((current, signal), (other, neighbour + noise.gauss(0, 3))):
+                        info = BssidInfo(bssid)
+                        info.signal = int(value)
+                        network.bssids.append(info)
+                    networks, scan_at = (network,), None
+                analyzer.observe(NetworkSnapshot(now, "Home", True, True, networks is None, (interface,),
+                                                 networks), now)
+                if predictive:
+                    action = analyzer.assess(now).action
+                    if action == ACTION_SURVEY and scan_at is None:
+                        scan_at = now + scan_delay
+                    elif action in (ACTION_ROAM, ACTION_RECONNECT):
+                        analyzer.acted(now)
+                        roams += 1
+                        early += signal > 40
+                        downtime += roam_outage
+                        now += roam_outage
+                        break
+                now += 1
+        return downtime, roams, early, now
+
+    reactive, _, _, total = replay(False)
+    predictive, roams, early, _ = replay(True)
+    print(f"{episodes} затуханий сигнала (~{total / 3600:.1f} ч записи):")
+    print(f"  реакция на разрыв: простой {reactive:.0f} с")
+    print(f"  упреждающий переход: простой {predictive:.0f} с ({predictive / reactive:.0%}), "
+          f"переходов: {roams}, из них при сигнале выше 40%: {early}")
+
+
+def bench_supervisor(intervals=60):
+    """Запросы netsh за одинаковое число интервалов: монитор на каждую сеть против общего ScanHub"""
+    import asyncio
+
+    import config
+    from probe_engine import ProbeEngine
+    from supervisor import ScanHub
+
+    outputs = {"interfaces": load_fixture("interfaces_en_two_adapters.txt"),
+               "networks": load_fixture("networks_en_bssid.txt")}
+    adapters = ("Wi-Fi", "Wi-Fi 2")
+
+    async def run(ssids_per_adapter, shared):
+        queries = [0]
+
+        async def query(view, timeout):
+            queries[0] += 1
+            await asyncio.sleep(0)
+            return outputs[view[0]]
+
+        clock = [0.0]
+        hub = ScanHub(clock=lambda: clock[0]) if shared else None
+        engines = []
+        for adapter in adapters:
+            for n in range(ssids_per_adapter):
+                engine = ProbeEngine(f"Cafe-{n}", interface=adapter, hub=hub)
+                engine._query = query
+                engines.append(engine)
+        for _ in range(intervals):
+            # Каждый монитор сканирует в своём такте; такты разных мониторов совпадают не всегда
+            for engine in engines:
+                await engine.snapshot(force=True, scan=True)
+            clock[0] += config.SCAN_SHARE_TTL
+        return queries[0]
+
+    print(f"Запросов netsh за {intervals} интервалов сканирования, адаптеров: {len(adapters)}")
+    for ssids in (1, 5, 20):
+        separate = asyncio.run(run(ssids, False))
+        shared = asyncio.run(run(ssids, True))
+        print(f"  сетей на адаптер {ssids:3d}: по монитору на сеть {separate:6d}, общий ScanHub {shared:5d}")
+
+
+def bench_simulation(days=7, seed=1):
+    """Неделя сбоев в симуляции на виртуальном времени; False, если метрики хуже базовых"""
+    from simulation import BASELINE_PATH, load_baseline, regressions, run_suite
+
+    report, *extra = run_suite(days, seed)
+    print(report.describe(extra))
+    baseline = load_baseline()
+    if baseline is None:
+        print(f"  базовых значений нет ({BASELINE_PATH}): python simulation.py --write-baseline")
+        return True
+    if (baseline.get("days"), baseline.get("seed")) != (days, seed):
+        print(f"  базовые значения сняты на другом сценарии: {baseline.get('days')} сут, зерно {baseline.get('seed')}")
+        return True
+    failed = regressions(report.summary(extra), baseline)
+    for name, value, limit in failed:
+        print(f"  РЕГРЕССИЯ {name}: {value} (допустимо до {limit:.2f})")
+    if not failed:
+        print("  регрессий относительно базовых значений нет")
+    return not failed
+
+
+def bench_warm_start(duration=600):
+    """От запуска до первого подтверждённого статуса: холодный и тёплый старт в симуляции"""
+    import tempfile
+    from simulation import SimulatedEnvironment, VirtualClock, simulate
+
+    def environment(epoch, associated):
+        env = SimulatedEnvironment(VirtualClock(epoch=epoch), seed=1)
+        env.add_access_point("Home", "aa:bb:cc:00:00:01", signal=75)
+        env.add_access_point("Neighbour", "aa:bb:cc:00:00:02", signal=60)
+        return env.associated("Home") if associated else env
+
+    epoch = VirtualClock().time()
+    for associated, title in ((True, "ОС уже подключена"), (False, "ОС ещё не подключилась")):
+        print(f"{title}:")
+        with tempfile.TemporaryDirectory(prefix="wifi-warm-") as data_dir:
+            # Второй запуск — через минуту после первого, с его сохранённым состоянием
+            for run, start in (("холодный", epoch), ("тёплый", epoch + duration + 60)):
+                report = simulate(environment(start, associated), duration, data_dir=data_dir)
+                warm, elapsed, spawns = report.startup
+                stats = report.stats
+                print(f"  {run} старт{'' if warm or run == 'холодный' else ' (состояние не принято)'}: "
+                      f"первый ONLINE через {elapsed:.2f} с, запусков процессов до него: {spawns}; "
+                      f"за {duration // 60} мин опросов netsh: {stats['snapshots']}, "
+                      f"сканирований: {stats['scans']}")
+
+
+# Подписчики API управления в отдельном процессе (их разбор JSON не делит GIL с издателем):
+# быстрые читают всё, два клиента с маленьким буфером приёма не читают вовсе
+SUBSCRIBERS_STAND_IN = """
+import json, selectors, socket, sys
+port, fast = int(sys.argv[1]), int(sys.argv[2])
+
+def subscribe(policy, receive_buffer=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if receive_buffer:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.connect(("127.0.0.1", port))
+    sock.sendall(json.dumps({"cmd": "subscribe", "policy": policy}).encode() + b"\\n")
+    while not sock.recv(4096).endswith(b"\\n"):
+        pass
+    return sock
+
+clients = [subscribe("drop_oldest") for _ in range(fast)]
+stalled = [subscribe(policy, 4096) for policy in ("drop_oldest", "coalesce")]
+print("ready", flush=True)
+
+received, lost, pending, done = [0] * fast, [0] * fast, [b""] * fast, 0
+selector = selectors.DefaultSelector()
+for index, sock in enumerate(clients):
+    selector.register(sock, selectors.EVENT_READ, index)
+while done < fast:
+    for key, _ in selector.select():
+        index = key.data
+        *lines, pending[index] = (pending[index] + key.fileobj.recv(65536)).split(b"\\n")
+        for line in lines:
+            event = json.loads(line)
+            if event["event"] == "dropped":
+                lost[index] += event["count"]
+                continue
+            received[index] += 1
+            if event["message"] == "last":
+                selector.unregister(key.fileobj)
+                done += 1
+print(json.dumps({"received": received, "lost": lost}), flush=True)
+sys.stdin.read()
+"""
+
+
+def bench_control(count=20000, fast=8, batch=20):
+    """Поток состояний API управления: цена publish() в потоке монитора и доставка
+    быстрым подписчикам, пока два клиента не читают совсем"""
+    import json
+    import subprocess
+    import time
+
+    from control_api import ControlServer
+    from monitor_state import LinkState, MonitorState
+
+    class Idle:
+        def states(self):
+            return []
+
+    server = ControlServer(Idle(), port=0).start()
+    clients = subprocess.Popen([sys.executable, "-c", SUBSCRIBERS_STAND_IN, str(server.port), str(fast)],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    clients.stdout.readline()
+    while server.stats()["control_subscribers"] < fast + 2:
+        time.sleep(0.01)
+
+    online = MonitorState(LinkState.ONLINE, "Home", "Подключено к Home, интернет доступен", signal=80, rtt=0.01)
+    costs = []
+    for n in range(count):
+        state = online if n < count - 1 else MonitorState(LinkState.ONLINE, "Home", "last")
+        started = time.perf_counter()
+        server.publish(state, changed=n % 10 == 0)  # Каждое десятое — переход, остальные — heartbeat
+        costs.append(time.perf_counter() - started)
+        if n % batch == batch - 1:
+            time.sleep(0.001)
+    result = json.loads(clients.stdout.readline())
+    stats = server.stats()
+    clients.communicate()
+    server.stop()
+
+    costs.sort()
+    received, lost = result["received"], result["lost"]
+    print(f"publish(): медиана {costs[len(costs) // 2] * 1e6:.1f} мкс, p99 {costs[int(len(costs) * 0.99)] * 1e6:.1f} мкс "
+          f"({count} состояний, {fast + 2} подписчиков, два из них не читают)")
+    print(f"  быстрые подписчики: получено {min(received)}–{max(received)} из {count}, потеряно {max(lost)}")
+    print(f"  нечитающие: отброшено {stats['control_dropped']}, схлопнуто {stats['control_coalesced']}")
+    return min(received) + max(lost) == count and _check_control_auth(Idle())
+
+
+def _check_control_auth(controller):
+    """Команды управления по TCP — только с токеном; Unix-сокет создаётся с правами 0600"""
+    import json
+    import socket
+    import stat
+    import tempfile
+
+    from control_api import ControlServer
+    from journal import Journal
+
+    def ask(server, request):
+        with socket.create_connection(("127.0.0.1", server.port)) as sock, sock.makefile("rwb") as stream:
+            stream.write((json.dumps(request) + "\n").encode())
+            stream.flush()
+            return json.loads(stream.readline())
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Принятая команда пишется в журнал — во временный каталог, а не в данные пользователя
+        journal = Journal(directory)
+        server = ControlServer(controller, port=0, token="secret", journal=journal).start()
+        try:
+            refused = [ask(server, {"cmd": "stop", **extra}) for extra in ({}, {"token": "guess"})]
+            accepted = ask(server, {"cmd": "stop", "token": "secret"})  # Idle без stop() — до него дошло
+        finally:
+            server.stop()
+            journal.close()
+    ok = all("token" in response["error"] for response in refused) and "недоступна" in accepted["error"]
+    print(f"  команды по TCP: без токена и с чужим отклонены, с токеном выполнены: {ok}")
+
+    if hasattr(socket, "AF_UNIX"):
+        with tempfile.TemporaryDirectory() as directory:
+            server = ControlServer(controller, path=os.path.join(directory, "control.sock")).start()
+            mode = stat.S_IMODE(os.stat(server.path).st_mode)
+            server.stop()
+        print(f"  права Unix-сокета: {mode:o}")
+        ok = ok and mode == 0o600
+    return ok
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "events": bench_events,
+    "session": bench_session,
+    "log": bench_log,
+    "startup": bench_startup,
+    "metrics": bench_metrics,
+    "exporter": bench_exporter,
+    "tracing": bench_tracing,
+    "router": bench_router,
+    "reachability": bench_reachability,
+    "diagnosis": bench_diagnosis,
+    "quality": bench_quality,
+    "supervisor": bench_supervisor,
+    "simulation": bench_simulation,
+    "warm_start": bench_warm_start,
+    "control": bench_control,
+}
+
+
+def main():
+    """Запускает выбранные бенчмарки (по умолчанию — все); код 1, если какой-то вернул False"""
+    names = sys.argv[1:] or list(BENCHMARKS)
+    failed = False
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Неизвестный бенчмарк: {name}. Доступны: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        if BENCHMARKS[name]() is False:
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
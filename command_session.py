@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import os
+import subprocess
+
+import config
+from backend import STARTUPINFO
+from netsh_parser import command_error
+from tracing import span
+
+
+class NetshDialect:
+    """Интерактивный режим netsh: команды без префикса "netsh", конец ответа —
+    сообщение об ошибке для заведомо неизвестной команды-маркера.
+
+    Кода возврата в интерактивном режиме нет: он восстанавливается по тексту
+    ответа (netsh_parser.command_error), отказ — код 1.
+    """
+
+    argv = ("netsh",)
+    prompt = b"netsh>"
+
+    def command(self, args):
+        if args and args[0].lower() == "netsh":
+            args = args[1:]
+        return " ".join(_netsh_quote(arg) for arg in args)
+
+    def encode(self, command, token):
+        return f"{command}\r\n{token}\r\n".encode()
+
+    def split(self, buffer, token):
+        """Возвращает (вывод, код возврата, остаток буфера) или None, если маркера ещё нет"""
+        marker = token.encode()
+        index = buffer.find(marker)
+        if index == -1:
+            return None
+        line_start = buffer.rfind(b"\n", 0, index) + 1
+        line_end = buffer.find(b"\n", index)
+        if line_end == -1:
+            return None
+        output = buffer[:line_start].replace(self.prompt, b"")
+        code = 1 if command_error(output) is not None else 0
+        return output, code, buffer[line_end + 1:]
+
+
+def _netsh_quote(arg):
+    """Значение с пробелами — в кавычках: name="Моя сеть" (interface=, filename= так же)"""
+    if not any(c.isspace() for c in arg):
+        return arg
+    key, sep, value = arg.partition("=")
+    return f'{key}="{value}"' if sep else f'"{arg}"'
+
+
+class ShellDialect:
+    """Постоянный POSIX-shell: после команды печатается маркер с кодом возврата"""
+
+    argv = ("sh",)
+
+    def command(self, args):
+        return " ".join(_sh_quote(arg) for arg in args)
+
+    def encode(self, command, token):
+        return f"{command} 2>&1 </dev/null; printf '\\n{token} %s\\n' \"$?\"\n".encode()
+
+    def split(self, buffer, token):
+        marker = b"\n" + token.encode() + b" "
+        index = buffer.find(marker)
+        if index == -1:
+            return None
+        line_end = buffer.find(b"\n", index + len(marker))
+        if line_end == -1:
+            return None
+        code = int(buffer[index + len(marker):line_end].strip() or 0)
+        return buffer[:index], code, buffer[line_end + 1:]
+
+
+def _sh_quote(arg):
+    if arg and all(c.isalnum() or c in "-_=./:" for c in arg):
+        return arg
+    return "'" + arg.replace("'", "'\\''") + "'"
+
+
+class CommandSession:
+    """Мультиплексор команд поверх одного долгоживущего интерактивного процесса.
+
+    Команды пишутся в stdin, ответы разделяются уникальными маркерами.
+    Команды выполняются по одной; при таймауте или падении процесс
+    убивается и при следующей команде запускается заново.
+    """
+
+    def __init__(self, dialect=None, argv=None):
+        self.dialect = dialect or (NetshDialect() if os.name == 'nt' else ShellDialect())
+        self.argv = list(argv or self.dialect.argv)
+        self.spawn_count = 0
+        self.commands = 0
+        self.restarts = 0
+        self.timeouts = 0
+        self._process = None
+        self._buffer = b""
+        self._lock = None
+        self._loop = None
+        self._tokens = itertools.count(1)
+
+    async def _ensure_process(self):
+        if self._process is not None and self._process.returncode is None:
+            return self._process
+        if self.spawn_count:
+            self.restarts += 1
+        self.spawn_count += 1
+        self._buffer = b""
+        self._process = await asyncio.create_subprocess_exec(
+            *self.argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            startupinfo=STARTUPINFO  # Скрывает окно
+        )
+        return self._process
+
+    async def run(self, args, timeout=None):
+        """Выполняет команду в сессии; возвращает subprocess.CompletedProcess с байтовым выводом"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Процесс и его каналы привязаны к циклу событий, в котором созданы
+            self.close()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            with span("session.command", command=" ".join(args)) as current:
+                try:
+                    result = await self._execute(args, timeout)
+                except (ConnectionError, EOFError):
+                    # Процесс умер между командами — один повтор в новой сессии
+                    self.close()
+                    current.set(retried=True)
+                    result = await self._execute(args, timeout)
+                current.set(returncode=result.returncode, stdout_bytes=len(result.stdout))
+                return result
+
+    async def _execute(self, args, timeout):
+        process = await self._ensure_process()
+        token = f"__wifi_monitor_end_{next(self._tokens)}__"
+        self.commands += 1
+
+        process.stdin.write(self.dialect.encode(self.dialect.command(args), token))
+        await process.stdin.drain()
+
+        try:
+            output, code = await asyncio.wait_for(self._read_response(process, token), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.close()
+            raise subprocess.TimeoutExpired(args, timeout)
+        except asyncio.CancelledError:
+            # Ответ прерванной команды испортил бы следующую — начинаем заново
+            self.close()
+            raise
+
+        return subprocess.CompletedProcess(args, code, output, b"")
+
+    async def _read_response(self, process, token):
+        while True:
+            parts = self.dialect.split(self._buffer, token)
+            if parts is not None:
+                output, code, self._buffer = parts
+                return output, code
+            chunk = await process.stdout.read(65536)
+            if not chunk:
+                raise EOFError("сессия команд завершилась")
+            self._buffer += chunk
+
+    def close(self):
+        """Завершает процесс сессии"""
+        process, self._process = self._process, None
+        self._buffer = b""
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    async def aclose(self):
+        """Завершает процесс сессии и дожидается его выхода в текущем цикле событий"""
+        process = self._process
+        self.close()
+        if process is not None:
+            try:
+                await asyncio.wait_for(process.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {"session_spawns": self.spawn_count, "session_commands": self.commands,
+                "session_restarts": self.restarts, "session_timeouts": self.timeouts}
+
+
+def create_session():
+    """Сессия команд для ProbeEngine или None, если мультиплексор выключен"""
+    return CommandSession() if config.COMMAND_SESSION else None
@@ -1,13 +1,167 @@
+import os
+
 # Настройки роутера
 ROUTER_IP = "192.168.0.1"
 ROUTER_ADMIN_PASSWORD = "admin"
+ROUTER_ADMIN_USER = "admin"
+ROUTER_SCHEME = "http"
+ROUTER_CHECK_INTERVAL = 300  # Проверка роутера раз в N секунд
+ROUTER_TIMEOUT = 3  # Таймаут HTTP-запроса к роутеру
+ROUTER_CACHE_TTL = 10  # Ответы веб-интерфейса считаются свежими N секунд
+# Пути веб-интерфейса (JSON); зависят от модели роутера
+ROUTER_LOGIN_PATH = "/api/login"
+ROUTER_ENDPOINTS = {
+    "wan": "/api/wan",  # {"status": "up", "ip": "..."}
+    "system": "/api/system",  # {"uptime": секунды}
+    "clients": "/api/dhcp/clients",  # [...] или {"clients": [...]}
+}
 
 # Тайминги (в секундах)
 CHECK_INTERVAL = 1  # Интервал проверки Wi-Fi
-RECONNECT_ATTEMPTS = 100  # Количество попыток переподключения
-RECONNECT_DELAY = 2  # Задержка между попытками
+RECONNECT_ATTEMPTS = 3  # Попыток в одном цикле переподключения; следующий цикл — из такта после задержки
+RECONNECT_DELAY = 2  # Базовая задержка между попытками (растёт экспоненциально)
+RECONNECT_MAX_DELAY = 30  # Верхняя граница задержки между попытками
+RECONNECT_POLL_INTERVAL = 0.25  # Опрос состояния интерфейса после команды connect
+RECONNECT_ASSOCIATION_TIMEOUT = 15  # Сколько ждать подключения в одной попытке
+SNAPSHOT_TTL = 0.5  # Время жизни снимка netsh (общий для всех проверок такта)
+
+# Адаптивное расписание: интервалы растут от CHECK_INTERVAL до максимума, пока всё стабильно
+SCAN_INTERVAL_MAX = 30  # Сканирование эфира (при подключении — всегда максимум)
+INTERFACE_INTERVAL_MAX = 10  # Опрос состояния интерфейса
+INTERNET_INTERVAL_MAX = 15  # Проверка интернета
+INTERNET_RETRY_INTERVAL_MAX = 2  # Проверка интернета, пока сбой продолжается
+SCHEDULE_BACKOFF = 1.5  # Множитель роста интервала
+SIGNAL_DROP_THRESHOLD = 5  # Падение сигнала (%), при котором интерфейс опрашивается чаще
+SPAWN_BUDGET_PER_MINUTE = 90  # Максимум запусков netsh в минуту
+CPU_BUDGET_PER_MINUTE = 3.0  # Максимум секунд CPU процесса в минуту
+
+# Команды netsh (show, connect, disconnect, профили) через один постоянный процесс (интерактивный netsh / sh)
+COMMAND_SESSION = True
+
+# Поток событий ОС: "auto", "windows", "nmcli", "iw" или "polling" (только опрос)
+EVENT_BACKEND = "auto"
+EVENT_FALLBACK_INTERVAL = 60  # Интервал страховочного опроса, пока поток событий активен
+EVENT_RESTART_DELAY = 5  # Пауза перед перезапуском завершившегося процесса событий
+EVENT_RESTART_MAX_DELAY = 300  # Потолок паузы: она удваивается после каждого быстрого падения
+EVENT_QUICK_FAILURE = 30  # Процесс событий, проживший меньше N секунд, считается быстро упавшим
+EVENT_MAX_QUICK_FAILURES = 5  # После стольких быстрых падений подряд — только опрос, без перезапусков
+
+# Дедлайны отдельных проверок (в секундах)
+SCAN_TIMEOUT = 5  # netsh wlan show networks
+KILL_WAIT_TIMEOUT = 1  # Ожидание выхода убитого по таймауту процесса (чтобы не оставался зомби)
+INTERFACE_TIMEOUT = 3  # netsh wlan show interfaces
+INTERNET_TIMEOUT = 2  # TCP-подключение при проверке интернета
+ERROR_RETRY_DELAY = 5  # Пауза после ошибки в цикле мониторинга
+
+# Проверка интернета: цели опрашиваются наперегонки (имя, хост, порт).
+# Шлюза среди них нет: он отвечает и тогда, когда у провайдера нет интернета
+INTERNET_TARGETS = [
+    ("dns-google", "8.8.8.8", 53),
+    ("dns-cloudflare", "1.1.1.1", 53),
+    ("http-msft", "www.msftconnecttest.com", 80),
+]
+REACHABILITY_STAGGER = 0.1  # Шаг запуска следующей цели, если предыдущая молчит
+REACHABILITY_MIN_TIMEOUT = 1.0  # Нижняя граница адаптивного дедлайна: при меньшей всплеск RTT — ложная потеря
+REACHABILITY_WINDOW = 20  # Размер окна статистики RTT/потерь по каждой цели
+
+# Послойная диагностика "подключено, но нет интернета" (diagnosis.py)
+DIAG_TTL = {  # Сколько секунд результат уровня считается свежим
+    "link": 1,
+    "ip": 5,
+    "gateway": 5,
+    "dns": 30,
+    "http": 10,
+}
+DIAG_LAYER_TIMEOUT = 2  # Дедлайн проверки одного уровня
+DIAG_GATEWAY_PORT = 80  # TCP-порт шлюза (отказ в соединении тоже означает, что шлюз жив)
+DIAG_DNS_NAME = "www.msftconnecttest.com"
+DIAG_HTTP_HOST = "connectivitycheck.gstatic.com"  # Отвечает 204 без тела
+DIAG_HTTP_PATH = "/generate_204"
+DIAG_HTTP_PORT = 80
+DIAG_REMEDY_COOLDOWN = 60  # Одно и то же исправление не чаще раза в N секунд
+REMEDY_TIMEOUT = 15  # Дедлайн команды исправления (ipconfig /renew и т.п.)
+# Команды исправлений; {interface} — имя беспроводного интерфейса
+if os.name == 'nt':
+    RENEW_LEASE_COMMAND = ["ipconfig", "/renew", "{interface}"]
+    FLUSH_DNS_COMMAND = ["ipconfig", "/flushdns"]
+    ROAM_COMMAND = None  # netsh не выбирает BSSID: разрыв и переподключение
+else:
+    RENEW_LEASE_COMMAND = ["nmcli", "device", "reapply", "{interface}"]
+    FLUSH_DNS_COMMAND = ["resolvectl", "flush-caches"]
+    ROAM_COMMAND = ["nmcli", "device", "wifi", "connect", "{ssid}", "bssid", "{bssid}"]
+
+# Прогноз разрыва по тренду сигнала и упреждающий переход на другую точку (link_quality.py)
+QUALITY_WINDOW = 60  # Секунд истории сигнала для оценки тренда
+QUALITY_MIN_SAMPLES = 6  # Меньше образцов — тренд не оценивается
+QUALITY_HORIZON = 15  # Прогноз на N секунд вперёд
+QUALITY_DROP_SIGNAL = 20  # Ниже этого сигнала (%) связь обычно рвётся
+QUALITY_SURVEY_PROBABILITY = 0.3  # С этой вероятности разрыва сканируем соседние точки
+QUALITY_ACT_PROBABILITY = 0.7  # С этой вероятности переходим на другую точку
+QUALITY_ROAM_MARGIN = 15  # Насколько (%) другая точка должна быть сильнее текущей
+QUALITY_SCAN_MAX_AGE = 10  # Скан соседних точек считается свежим N секунд
+QUALITY_ACTION_COOLDOWN = 120  # Пауза после упреждающего перехода, с
+
+# Несколько адаптеров и резервные сети (supervisor.py)
+SCAN_SHARE_TTL = 5  # Результат сканирования адаптера общий для всех мониторов N секунд
+SUPERVISOR_SCAN_INTERVAL = 60  # Скан для возврата на приоритетную сеть, пока адаптер на резервной
+FAILOVER_MIN_SIGNAL = 30  # Сеть пригодна для переключения с сигнала от N %
+FAILOVER_HOLD = 20  # Сколько секунд сеть должна быть неисправна/пригодна до переключения
+
+# Каталог данных приложения (кэши, состояние)
+APP_DATA_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+    "WiFiMonitor")
+
+# Тёплый старт (warm_start.py): учётные данные и последнее подтверждённое состояние
+CREDENTIALS_STORE = True  # Запоминать SSID и пароль (keyring или DPAPI), не спрашивая при запуске
+CREDENTIALS_SERVICE = "WiFiMonitor"  # Имя службы в хранилище паролей ОС
+WARM_START = True  # Продолжать с сохранённого состояния: без сканирования, с прежними интервалами
+WARM_START_MAX_AGE = 3600  # Состояние старше N секунд не используется
+WARM_STATE_REFRESH = 300  # Время последней рабочей связи перезаписывается не чаще раза в N секунд
+
+# История метрик связи (metrics_store.py): ~35 байт на образец
+METRICS_RAW_CAPACITY = 2 * 24 * 3600  # Образцов по тактам (двое суток при такте 1 с)
+METRICS_BUCKET = 60  # Интервал агрегации старых данных, с
+METRICS_MAX_GAP = 600  # Промежуток между тактами длиннее N секунд (монитор не работал) не учитывается
+UPTIME_REFRESH = 60  # Доступность за сутки для подсказки GUI пересчитывается не чаще раза в N секунд
+METRICS_DOWNSAMPLED_CAPACITY = 90 * 24 * 60  # Агрегатов (90 дней по минуте)
+
+# Экспорт метрик в формате Prometheus (metrics_exporter.py)
+METRICS_EXPORTER = False  # Включить HTTP-эндпоинт /metrics
+METRICS_EXPORTER_HOST = "127.0.0.1"
+METRICS_EXPORTER_PORT = 9105
+
+# Локальный API состояния и управления (control_api.py): JSON Lines
+CONTROL_API = False  # Включить сервер
+CONTROL_HOST = "127.0.0.1"  # Только локальные клиенты
+CONTROL_PORT = 9106
+# Unix-сокет (права 0600) по умолчанию, кроме Windows; None — TCP на CONTROL_HOST:CONTROL_PORT
+CONTROL_SOCKET = None if os.name == 'nt' else os.path.join(APP_DATA_DIR, "control.sock")
+CONTROL_TOKEN_PATH = os.path.join(APP_DATA_DIR, "control.token")  # Токен команд управления по TCP (права 0600)
+CONTROL_QUEUE_SIZE = 100  # Сообщений в очереди подписчика; при переполнении действует политика подписки
+CONTROL_HISTORY = 200  # Последних опубликованных состояний для команды history
+
+# Трассировка такта (tracing.py), включается и на ходу
+TRACE_ENABLED = False
+TRACE_RING_SIZE = 20000  # Последних интервалов в памяти
+TRACE_SLOW_TICK = 2.0  # Такт дольше N секунд сбрасывает трассу на диск (0 — не сбрасывать)
+TRACE_DUMP_TICKS = 10  # Сколько последних тактов попадает в такой сброс
+TRACE_DIR = os.path.join(APP_DATA_DIR, "traces")
+
+# Журнал событий JSON Lines (journal.py)
+JOURNAL_ENABLED = True
+JOURNAL_DIR = os.path.join(APP_DATA_DIR, "journal")
+JOURNAL_MAX_BYTES = 5 * 1024 * 1024  # Размер journal.jsonl до ротации
+JOURNAL_MAX_AGE = 24 * 3600  # Возраст journal.jsonl до ротации, с
+JOURNAL_KEEP = 30  # Сжатых сегментов хранится (0 — все)
+JOURNAL_QUEUE_SIZE = 10000  # Записей в очереди; при переполнении новые отбрасываются
+JOURNAL_FSYNC_INTERVAL = 2.0  # fsync не чаще раза в N секунд
 
 # Настройки интерфейса
 APP_TITLE = "Wi-Fi Монитор"
 APP_WIDTH = 600
-APP_HEIGHT = 400
\ No newline at end of file
+APP_HEIGHT = 400
+LOG_MAX_LINES = 5000  # Строк лога в окне; более старые уходят в status.log
+LOG_SPILL_MAX_BYTES = 10 * 1024 * 1024  # Размер status.log до ротации в status.log.1
+STATE_HEARTBEAT_INTERVAL = 30  # Повтор неизменного состояния в GUI/лог не чаще, чем раз в N секунд
+GUI_FRAME_INTERVAL = 0.1  # Пачка состояний за этот интервал даёт одну перерисовку GUI
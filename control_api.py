@@ -0,0 +1,432 @@
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import socket
+import sys
+import tempfile
+import threading
+from collections import deque
+
+import config
+from journal import JOURNAL
+
+# Что делать, когда подписчик не успевает читать
+POLICY_DROP_OLDEST = "drop_oldest"  # Переполненная очередь теряет самые старые сообщения
+POLICY_COALESCE = "coalesce"  # Повторы схлопываются, переполненная очередь сокращается до последнего состояния
+POLICIES = (POLICY_DROP_OLDEST, POLICY_COALESCE)
+
+COMMANDS = ("start", "stop", "reconnect")  # Команды управления (методы controller)
+
+
+def state_to_dict(state, changed=None, interface=None):
+    """MonitorState в словарь для JSON"""
+    data = {"state": state.state.value, "ssid": state.ssid, "message": state.message,
+            "signal": state.signal, "rtt": state.rtt, "timestamp": state.timestamp,
+            "connected": state.connected, "interface": interface}
+    if changed is not None:
+        data["changed"] = changed
+    return data
+
+
+def _encode(data):
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def load_token(path=None):
+    """Токен команд управления по TCP из path (config.CONTROL_TOKEN_PATH).
+
+    При первом запуске создаётся случайный токен; файл пишется через
+    mkstemp, поэтому сразу с правами 0600 — прочитать его может только
+    владелец (тот же пользователь, что и клиент control_api).
+    """
+    path = path or config.CONTROL_TOKEN_PATH
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + "-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            f.write(token)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return token
+
+
+class _Subscriber:
+    """Ограниченная очередь одного подписчика; в сокет её выгружает собственная задача"""
+
+    __slots__ = ('writer', 'policy', 'size', 'queue', 'pending_drops', 'dropped', 'coalesced',
+                 'delivered', 'ready', 'task')
+
+    def __init__(self, writer, policy, size):
+        self.writer = writer
+        self.policy = policy
+        self.size = size
+        self.queue = deque()  # (закодированная строка, переход ли)
+        self.pending_drops = 0  # Потеряно с последней выгрузки (клиент получит {"event": "dropped"})
+        self.dropped = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.ready = asyncio.Event()
+        self.task = None
+
+    def offer(self, line, changed):
+        """Ставит сообщение в очередь без ожидания; при переполнении — по политике"""
+        queue = self.queue
+        if self.policy == POLICY_COALESCE and queue:
+            if not changed and not queue[-1][1]:
+                # Повтор неизменного состояния (heartbeat) заменяет ещё не отправленный повтор
+                queue[-1] = (line, changed)
+                self.coalesced += 1
+                return
+            if len(queue) >= self.size:
+                self.pending_drops += len(queue)
+                self.dropped += len(queue)
+                queue.clear()
+        elif len(queue) >= self.size:
+            queue.popleft()
+            self.pending_drops += 1
+            self.dropped += 1
+        queue.append((line, changed))
+        self.ready.set()
+
+    async def pump(self):
+        """Выгружает очередь в сокет; медленный клиент ждёт в drain() только здесь"""
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.queue:
+                chunk = []
+                if self.pending_drops:
+                    chunk.append(_encode({"event": "dropped", "count": self.pending_drops}))
+                    self.pending_drops = 0
+                chunk.extend(line for line, _ in self.queue)
+                self.delivered += len(self.queue)
+                self.queue.clear()
+                self.writer.write(b"".join(chunk))
+                try:
+                    await self.writer.drain()
+                except ConnectionError:
+                    return  # Клиент отключился; обработчик подключения отпишет его
+
+
+class ControlServer:
+    """Локальный API состояния и управления монитором: JSON Lines поверх
+    TCP (только 127.0.0.1) или Unix-сокета.
+
+    Сервер работает в собственном потоке со своим циклом asyncio. Монитор
+    лишь вызывает publish() — одна постановка в очередь цикла сервера,
+    сколько бы ни было клиентов. Состояние кодируется один раз и
+    раздаётся подписчикам через их собственные ограниченные очереди:
+    медленный клиент теряет или схлопывает свои сообщения, но не
+    задерживает ни цикл мониторинга, ни других клиентов.
+
+    Запрос — одна JSON-строка, ответ — одна строка {"ok": ..., ...}:
+        {"cmd": "state"}                  текущие состояния и running
+        {"cmd": "history", "limit": 50}   последние опубликованные состояния
+        {"cmd": "stats"}                  счётчики монитора и сервера
+        {"cmd": "subscribe", "policy": "coalesce", "queue": 20}
+                                          далее поток {"event": "state", ...}
+        {"cmd": "unsubscribe"}
+        {"cmd": "start"}, {"cmd": "stop"}, {"cmd": "reconnect", "interface": ...}
+
+    Unix-сокет создаётся с правами 0600, и подключиться к нему может только
+    владелец. По TCP к 127.0.0.1 может подключиться любой локальный
+    пользователь, поэтому команды управления требуют поле "token" (см.
+    load_token()); без token сервер по TCP их не выполняет.
+
+    controller — объект с методом states() -> [(адаптер, MonitorState или None)]
+    и, если поддерживаются, stats(), свойством running и командами start(),
+    stop(), reconnect(interface). Команда возвращает None или текст ошибки
+    и вызывается из потока сервера.
+    """
+
+    def __init__(self, controller, host=None, port=None, path=None, queue_size=None, history=None, token=None,
+                 journal=None):
+        self.controller = controller
+        self.journal = journal or JOURNAL  # Сюда попадают выполненные команды управления
+        self.host = config.CONTROL_HOST if host is None else host
+        self.port = config.CONTROL_PORT if port is None else port
+        self.path = path  # Unix-сокет вместо TCP
+        self.token = token  # Для команд управления по TCP
+        self.queue_size = config.CONTROL_QUEUE_SIZE if queue_size is None else queue_size
+        self.history = deque(maxlen=config.CONTROL_HISTORY if history is None else history)
+        self.connections = 0
+        self.published = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._subscribers = set()
+        self._handlers = {}  # задача обработчика -> writer подключения
+        self._server = None
+        self._loop = None
+        self._error = None
+        self._ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="control-api", daemon=True)
+
+    @property
+    def address(self):
+        return self.path or f"{self.host}:{self.port}"
+
+    def start(self):
+        """Запускает поток сервера; OSError, если адрес занят"""
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        """Закрывает сервер и все подключения (из любого потока)"""
+        loop = self._loop
+        if loop is not None and self.thread.is_alive():
+            loop.call_soon_threadsafe(loop.stop)
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._listen())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self._shutdown())
+            self._loop = None
+            loop.close()
+
+    async def _listen(self):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Сокет сразу создаётся с правами 0600 (команды управления — только владельцу),
+            # а не получает их chmod после bind, когда к нему уже можно подключиться
+            umask = os.umask(0o177)
+            try:
+                self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+            finally:
+                os.umask(umask)
+        else:
+            self._server = await asyncio.start_server(self._serve, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _shutdown(self):
+        self._server.close()
+        pumps = [subscriber.task for subscriber in self._subscribers]
+        # Разрыв соединения завершает readline() обработчиков, и они выходят сами;
+        # abort(), а не close(): неотправленное медленным клиентам не дожидается
+        for writer in self._handlers.values():
+            writer.transport.abort()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=1)
+        await asyncio.gather(*pumps, return_exceptions=True)
+        await self._server.wait_closed()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def publish(self, state, changed, interface=None):
+        """Новое состояние от монитора (из любого потока) — без ожидания клиентов"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._broadcast, state, changed, interface)
+        except RuntimeError:
+            pass  # Сервер уже остановлен
+
+    def _broadcast(self, state, changed, interface):
+        """Один производитель на всех: кодирование один раз, дальше — очереди подписчиков"""
+        data = state_to_dict(state, changed, interface)
+        self.history.append(data)
+        self.published += 1
+        line = _encode({"event": "state", **data})
+        for subscriber in self._subscribers:
+            subscriber.offer(line, changed)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._handlers[asyncio.current_task()] = writer
+        subscriber = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    command = request["cmd"]
+                except (ValueError, TypeError, KeyError):
+                    response = {"ok": False, "error": "ожидается JSON-объект с полем cmd"}
+                else:
+                    if command == "subscribe":
+                        response, subscriber = self._subscribe(request, writer, subscriber)
+                    elif command == "unsubscribe":
+                        self._unsubscribe(subscriber)
+                        subscriber = None
+                        response = {"ok": True}
+                    else:
+                        response = self._command(command, request)
+                writer.write(_encode(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Клиент отключился или прислал слишком длинную строку
+        finally:
+            self._unsubscribe(subscriber)
+            self._handlers.pop(asyncio.current_task(), None)
+            self.connections -= 1
+            writer.close()
+
+    def _subscribe(self, request, writer, subscriber):
+        policy = request.get("policy", POLICY_DROP_OLDEST)
+        if policy not in POLICIES:
+            return {"ok": False, "error": f"политика: {', '.join(POLICIES)}"}, subscriber
+        try:
+            size = min(max(1, int(request.get("queue", self.queue_size))), self.queue_size)
+        except (TypeError, ValueError):
+            return {"ok": False, "error": "queue — целое число"}, subscriber
+        if subscriber is None:
+            subscriber = _Subscriber(writer, policy, size)
+            subscriber.task = asyncio.ensure_future(subscriber.pump())
+            self._subscribers.add(subscriber)
+        else:
+            subscriber.policy, subscriber.size = policy, size
+        return {"ok": True, "policy": policy, "queue": size}, subscriber
+
+    def _unsubscribe(self, subscriber):
+        if subscriber is None or subscriber not in self._subscribers:
+            return
+        self._subscribers.discard(subscriber)
+        subscriber.task.cancel()
+        self.dropped += subscriber.dropped
+        self.coalesced += subscriber.coalesced
+
+    def _command(self, command, request):
+        controller = self.controller
+        if command == "state":
+            return {"ok": True, "running": getattr(controller, "running", None),
+                    "states": [state_to_dict(state, interface=interface) if state is not None
+                               else {"interface": interface, "state": None}
+                               for interface, state in controller.states()]}
+        if command == "history":
+            try:
+                limit = int(request.get("limit", len(self.history)))
+            except (TypeError, ValueError):
+                return {"ok": False, "error": "limit — целое число"}
+            return {"ok": True, "history": list(self.history)[-limit:] if limit > 0 else []}
+        if command == "stats":
+            stats = controller.stats() if hasattr(controller, "stats") else {}
+            return {"ok": True, "stats": {**stats, **self.stats()}}
+        if command in COMMANDS:
+            if not self.path and not self._authorized(request):
+                return {"ok": False, "error": f"по TCP команда {command} требует token из {config.CONTROL_TOKEN_PATH}"}
+            action = getattr(controller, command, None)
+            if action is None:
+                return {"ok": False, "error": f"команда {command} здесь недоступна"}
+            error = action(request.get("interface")) if command == "reconnect" else action()
+            self.journal.write("control", command=command, interface=request.get("interface"), error=error)
+            return {"ok": True} if error is None else {"ok": False, "error": error}
+        return {"ok": False, "error": f"неизвестная команда {command}"}
+
+    def _authorized(self, request):
+        token = request.get("token")
+        return (self.token is not None and isinstance(token, str)
+                and hmac.compare_digest(token.encode(), self.token.encode()))
+
+    def stats(self):
+        """Счётчики сервера (читаются из потока сервера)"""
+        subscribers = list(self._subscribers)
+        return {
+            "control_connections": self.connections,
+            "control_subscribers": len(subscribers),
+            "control_published": self.published,
+            "control_dropped": self.dropped + sum(s.dropped for s in subscribers),
+            "control_coalesced": self.coalesced + sum(s.coalesced for s in subscribers),
+        }
+
+
+def start_control_server(controller, port=None, path=None):
+    """Запускает API управления, если он включён (config.CONTROL_API, port или path).
+
+    Без port и path — на Unix-сокете config.CONTROL_SOCKET (в Windows — по TCP).
+    По TCP команды управления принимаются с токеном load_token().
+    Возвращает ControlServer или None.
+    """
+    if port is None and path is None and not config.CONTROL_API:
+        return None
+    if path is None and port is None:
+        path = config.CONTROL_SOCKET
+    if path and not hasattr(asyncio, "start_unix_server"):
+        print("Unix-сокеты в этой ОС недоступны, API управления — по TCP")
+        path = None
+    try:
+        token = None if path else load_token()
+        server = ControlServer(controller, port=port, path=path, token=token).start()
+    except OSError as e:
+        print(f"Ошибка запуска API управления: {e}")
+        return None
+    print(f"API управления доступно: {server.address}")
+    return server
+
+
+def main(argv=None):
+    """Клиент командной строки: python control_api.py state | history | stats | subscribe | start | stop | reconnect"""
+    parser = argparse.ArgumentParser(description="Клиент API управления Wi-Fi монитора")
+    parser.add_argument("command", choices=("state", "history", "stats", "subscribe") + COMMANDS)
+    parser.add_argument("--port", type=int, help=f"TCP вместо Unix-сокета (по умолчанию {config.CONTROL_PORT})")
+    parser.add_argument("--socket", default=config.CONTROL_SOCKET, help="путь Unix-сокета вместо TCP")
+    parser.add_argument("--interface", help="адаптер для reconnect (по умолчанию все)")
+    parser.add_argument("--limit", type=int, default=20, help="состояний для history")
+    parser.add_argument("--policy", choices=POLICIES, default=POLICY_COALESCE, help="политика для subscribe")
+    args = parser.parse_args(argv)
+
+    request = {"cmd": args.command}
+    if args.command == "history":
+        request["limit"] = args.limit
+    elif args.command == "subscribe":
+        request["policy"] = args.policy
+    elif args.command == "reconnect" and args.interface:
+        request["interface"] = args.interface
+
+    try:
+        if args.socket and args.port is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(args.socket)
+        else:
+            if args.command in COMMANDS:
+                request["token"] = load_token()
+            sock = socket.create_connection((config.CONTROL_HOST, args.port or config.CONTROL_PORT))
+    except OSError as e:
+        print(f"Нет подключения к API управления: {e}")
+        return 1
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(_encode(request))
+        stream.flush()
+        try:
+            for line in stream:
+                print(line.decode('utf-8').rstrip())
+                if args.command != "subscribe":
+                    return 0 if json.loads(line).get("ok") else 1
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+import argparse
+import configparser
+import logging
+import os
+import signal
+import sys
+import threading
+
+import config
+from control_api import start_control_server
+from journal import JOURNAL, JournalStream
+from metrics_exporter import monitor_collector, serve_collectors, start_exporter
+from monitor_core import MonitorCore
+from supervisor import AdapterPlan, Network, Supervisor
+from tracing import TRACER
+from warm_start import CredentialStore
+from wifi_monitor import WiFiMonitor
+
+DEFAULT_CONFIG_PATH = os.path.join(config.APP_DATA_DIR, "wifi_monitor.ini")
+
+log = logging.getLogger("wifi_monitor")
+
+
+def load_credentials(config_path=None):
+    """SSID и пароль: переменные окружения, затем файл конфигурации,
+    затем сохранённые в GUI (warm_start.CredentialStore).
+
+    Файл (INI):
+        [wifi]
+        ssid = Home
+        password = secret
+    """
+    ssid = os.environ.get("WIFI_MONITOR_SSID")
+    password = os.environ.get("WIFI_MONITOR_PASSWORD")
+
+    path = config_path or DEFAULT_CONFIG_PATH
+    if (not ssid or not password) and os.path.exists(path):
+        parser = configparser.ConfigParser()
+        parser.read(path, encoding='utf-8')
+        ssid = ssid or parser.get("wifi", "ssid", fallback=None)
+        password = password or parser.get("wifi", "password", fallback=None)
+
+    if (not ssid or not password) and config.CREDENTIALS_STORE:
+        stored_ssid, stored_password = CredentialStore().load()
+        if stored_ssid and (not ssid or ssid == stored_ssid):
+            ssid, password = stored_ssid, password or stored_password
+
+    return (ssid or "").strip(), (password or "").strip()
+
+
+def load_plans(config_path=None):
+    """Сети для нескольких адаптеров и резервных сетей из секций [network.*] INI-файла.
+
+        [network.home]
+        ssid = Home
+        password = secret
+        priority = 0        ; меньше — предпочтительнее
+        adapter = Wi-Fi 2   ; необязательно, по умолчанию — адаптер по умолчанию
+
+    Возвращает список AdapterPlan (пустой, если таких секций нет).
+    """
+    path = config_path or DEFAULT_CONFIG_PATH
+    if not os.path.exists(path):
+        return []
+    parser = configparser.ConfigParser()
+    parser.read(path, encoding='utf-8')
+    adapters = {}
+    for section in parser.sections():
+        if not section.startswith("network."):
+            continue
+        ssid = parser.get(section, "ssid", fallback="").strip()
+        password = parser.get(section, "password", fallback="").strip()
+        if not ssid or not password:
+            log.error("Секция [%s]: не заданы ssid и password, пропущена", section)
+            continue
+        adapter = parser.get(section, "adapter", fallback="").strip() or None
+        network = Network(ssid, password, parser.getint(section, "priority", fallback=0))
+        adapters.setdefault(adapter, []).append(network)
+    return [AdapterPlan(adapter, tuple(networks)) for adapter, networks in adapters.items()]
+
+
+def setup_logging(log_file=None):
+    """Статусы — в stdout; print() и stderr дополнительно копируются в журнал событий"""
+    handlers = [logging.StreamHandler(sys.stdout)]
+    sys.stdout = JournalStream(JOURNAL, "stdout", sys.stdout)
+    sys.stderr = JournalStream(JOURNAL, "stderr", sys.stderr)
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s",
+                        datefmt="%H:%M:%S", handlers=handlers)
+
+
+def toggle_tracing():
+    """Переключает трассировку; при выключении сохраняет накопленное"""
+    if TRACER.enabled:
+        TRACER.disable()
+        log.info("Трассировка выключена, трасса: %s", TRACER.dump())
+    else:
+        TRACER.enable()
+        log.info("Трассировка включена")
+
+
+def install_signals(stop):
+    """SIGINT/SIGTERM (и Ctrl+Break) вызывают stop(); SIGUSR1/SIGUSR2 управляют трассировкой"""
+    def on_signal(signum, frame):
+        log.info("Получен сигнал %s, остановка...", signum)
+        stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGBREAK"):  # Ctrl+Break в консоли Windows
+        signal.signal(signal.SIGBREAK, on_signal)
+    if hasattr(signal, "SIGUSR1"):
+        # SIGUSR1 включает/выключает трассировку, SIGUSR2 сохраняет накопленную трассу
+        signal.signal(signal.SIGUSR1, lambda signum, frame: toggle_tracing())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: log.info("Трасса: %s", TRACER.dump()))
+
+
+class HeadlessController:
+    """Мониторинг одной сети в текущем потоке с командами API управления.
+
+    stop приостанавливает мониторинг (процесс и API продолжают работать),
+    start возобновляет его новым MonitorCore, shutdown завершает run_forever().
+    Команды вызываются из потока сервера управления.
+    """
+
+    def __init__(self, monitor, on_state):
+        self.monitor = monitor
+        self.on_state = on_state
+        self.core = MonitorCore(monitor, on_state=on_state)
+        self.running = True
+        self._shutdown = False
+        self._resume = threading.Event()
+        self._lock = threading.RLock()  # shutdown() вызывается и из обработчика сигнала в этом же потоке
+
+    def run_forever(self):
+        """Блокирует текущий поток до shutdown()"""
+        while True:
+            self.core.run_forever()
+            while not self._resume.wait(0.5):
+                pass  # Приостановлено; короткие ожидания не мешают обработке сигналов
+            with self._lock:
+                self._resume.clear()
+                if self._shutdown:
+                    return
+                if self.running:
+                    self.core = MonitorCore(self.monitor, on_state=self.on_state)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return "мониторинг уже запущен"
+            self.running = True
+            self._resume.set()
+        log.info("Мониторинг возобновлён по команде")
+        return None
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return "мониторинг уже остановлен"
+            self.running = False
+            core = self.core
+        core.stop()
+        log.info("Мониторинг приостановлен по команде")
+        return None
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown = True
+            self._resume.set()
+            core = self.core
+        core.stop()
+
+    def reconnect(self, interface=None):
+        if not self.running:
+            return "мониторинг остановлен"
+        return self.core.request_reconnect()
+
+    def states(self):
+        return [(self.monitor.interface, self.core.publisher.last)]
+
+    def stats(self):
+        return self.monitor.last_stats or {}
+
+
+class SupervisedController:
+    """Команды API управления для Supervisor: состояния, статистика и reconnect (без start/stop)"""
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+
+    def reconnect(self, interface=None):
+        return self.supervisor.request_reconnect(interface)
+
+    def states(self):
+        return self.supervisor.states()
+
+    def stats(self):
+        return self.supervisor.last_stats or {}
+
+
+def run_headless(ssid, password, verbose=False, metrics_port=None, control_port=None, control_socket=None):
+    """Запускает мониторинг в текущем потоке до SIGINT/SIGTERM"""
+    monitor = WiFiMonitor(ssid, password)
+    server = None
+
+    def on_state(state, changed):
+        if changed or verbose:
+            log.info(state.message)
+        if server is not None:
+            server.publish(state, changed, monitor.interface)
+
+    controller = HeadlessController(monitor, on_state)
+    exporter = start_exporter(monitor, lambda: controller.core.publisher.last, port=metrics_port)
+    server = start_control_server(controller, port=control_port, path=control_socket)
+    install_signals(controller.shutdown)
+    log.info("Мониторинг сети %s запущен", ssid)
+    controller.run_forever()
+    if server is not None:
+        server.stop()
+    if exporter is not None:
+        exporter.stop()
+    log.info("Мониторинг остановлен. Статистика: %s", monitor.get_stats())
+    monitor.metrics.close()
+    monitor.router.close()
+    JOURNAL.close()
+
+
+def run_supervised(plans, verbose=False, metrics_port=None, control_port=None, control_socket=None):
+    """Несколько адаптеров и резервные сети (supervisor.Supervisor) до SIGINT/SIGTERM"""
+    server = None
+
+    def on_state(interface, state, changed):
+        if changed or verbose:
+            log.info("%s%s", f"[{interface}] " if interface else "", state.message)
+        if server is not None:
+            server.publish(state, changed, interface)
+
+    supervisor = Supervisor(plans, on_state=on_state)
+    # Счётчики и состояние /metrics — по каждому адаптеру с меткой interface; гистограммы проверок общие
+    exporter = serve_collectors(
+        [monitor_collector(unit.monitor, lambda unit=unit: unit.core.publisher.last,
+                           {"interface": unit.plan.interface or "default"})
+         for unit in supervisor.units], port=metrics_port)
+    server = start_control_server(SupervisedController(supervisor), port=control_port, path=control_socket)
+    install_signals(supervisor.stop)
+    for plan in plans:
+        log.info("Адаптер %s: сети %s", plan.interface or "по умолчанию",
+                 ", ".join(network.ssid for network in sorted(plan.networks, key=lambda n: n.priority)))
+    supervisor.run_forever()
+    if server is not None:
+        server.stop()
+    if exporter is not None:
+        exporter.stop()
+    log.info("Мониторинг остановлен. Статистика: %s", supervisor.stats())
+    supervisor.close()
+    JOURNAL.close()
+
+
+def main(argv=None):
+    """Точка входа без GUI (PyQt5 не импортируется)"""
+    parser = argparse.ArgumentParser(description=config.APP_TITLE)
+    parser.add_argument("--config", help=f"INI-файл с SSID и паролем или секциями [network.*] "
+                                         f"(по умолчанию {DEFAULT_CONFIG_PATH})")
+    parser.add_argument("--log-file", help="дополнительно писать статусы в файл")
+    parser.add_argument("--verbose", action="store_true", help="печатать и повторы состояния (heartbeat)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="включить эндпоинт Prometheus /metrics на этом порту")
+    parser.add_argument("--control-port", type=int,
+                        help="включить API состояния и управления (control_api) на этом порту 127.0.0.1; "
+                             "команды управления — с токеном из config.CONTROL_TOKEN_PATH")
+    parser.add_argument("--control-socket", help="то же на Unix-сокете по этому пути (права 0600, без токена)")
+    parser.add_argument("--trace", action="store_true",
+                        help="включить трассировку такта (сброс медленных тактов в каталог traces)")
+    parser.add_argument("--gui", action="store_true", help="запустить графический интерфейс")
+    args = parser.parse_args(argv)
+
+    if args.gui:
+        # GUI загружается только по запросу
+        import main_gui
+        main_gui.main()
+        return
+
+    setup_logging(args.log_file)
+    if args.trace:
+        TRACER.enable()
+    plans = load_plans(args.config)
+    if plans:
+        run_supervised(plans, args.verbose, args.metrics_port, args.control_port, args.control_socket)
+        return
+
+    ssid, password = load_credentials(args.config)
+    if not ssid or not password:
+        log.error("SSID и пароль не заданы: WIFI_MONITOR_SSID / WIFI_MONITOR_PASSWORD "
+                  "или секция [wifi] в %s", args.config or DEFAULT_CONFIG_PATH)
+        sys.exit(1)
+
+    run_headless(ssid, password, args.verbose, args.metrics_port, args.control_port, args.control_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import asyncio
+import time
+
+import config
+from netsh_parser import connected_interface
+from tracing import span
+
+# Уровни проверки снизу вверх: отказ нижнего объясняет отказы всех верхних
+LINK = "link"  # Ассоциация с точкой доступа
+IP = "ip"  # Адрес от DHCP
+GATEWAY = "gateway"  # Шлюз отвечает
+DNS = "dns"  # Имена разрешаются
+HTTP = "http"  # HTTP-проверка 204 (или страница входа captive portal)
+LAYERS = (LINK, IP, GATEWAY, DNS, HTTP)
+
+# Что делать при отказе уровня
+REMEDY_RECONNECT = "reconnect"  # Полное переподключение к сети
+REMEDY_RENEW_LEASE = "renew_lease"  # Повторный запрос адреса у DHCP
+REMEDY_FLUSH_DNS = "flush_dns"  # Сброс кэша DNS
+REMEDY_NONE = None  # Исправить нельзя (вход на портале, нет интернета у провайдера)
+
+_REMEDIES = {LINK: REMEDY_RECONNECT, IP: REMEDY_RENEW_LEASE, GATEWAY: REMEDY_RENEW_LEASE,
+             DNS: REMEDY_FLUSH_DNS, HTTP: REMEDY_NONE}
+
+_FAILURES = {
+    LINK: "нет связи с точкой доступа",
+    IP: "нет IP-адреса от DHCP",
+    GATEWAY: "шлюз не отвечает",
+    DNS: "не работает DNS",
+    HTTP: "нет доступа в интернет",
+}
+
+
+class LayerResult:
+    """Результат проверки одного уровня"""
+
+    __slots__ = ('layer', 'ok', 'detail', 'elapsed', 'timestamp', 'portal')
+
+    def __init__(self, layer, ok, detail=None, elapsed=0.0, timestamp=0.0, portal=None):
+        self.layer = layer
+        self.ok = ok
+        self.detail = detail
+        self.elapsed = elapsed
+        self.timestamp = timestamp
+        self.portal = portal  # Адрес страницы входа, если HTTP-проверку перехватил портал
+
+    def __repr__(self):
+        return f"LayerResult({self.layer!r}, ok={self.ok}, detail={self.detail!r})"
+
+
+class Diagnosis:
+    """Итог диагностики: нижний отказавший уровень и способ исправления"""
+
+    __slots__ = ('results', 'failed', 'elapsed')
+
+    def __init__(self, results, failed=None, elapsed=0.0):
+        self.results = results  # уровень -> LayerResult (отменённые уровни отсутствуют)
+        self.failed = failed
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.failed is None
+
+    @property
+    def portal(self):
+        """Адрес страницы входа captive portal или None"""
+        result = self.results.get(HTTP)
+        return result.portal if result is not None else None
+
+    @property
+    def captive_portal(self):
+        return self.failed == HTTP and self.portal is not None
+
+    @property
+    def remedy(self):
+        return _REMEDIES[self.failed] if self.failed is not None else REMEDY_NONE
+
+    def describe(self):
+        """Причина отказа для строки статуса"""
+        if self.failed is None:
+            return "все уровни в порядке"
+        if self.captive_portal:
+            return f"требуется вход на странице {self.portal}"
+        result = self.results[self.failed]
+        reason = _FAILURES[self.failed]
+        return f"{reason} ({result.detail})" if result.detail else reason
+
+    def as_dict(self):
+        return {layer: self.results[layer].ok for layer in LAYERS if layer in self.results}
+
+
+class DiagnosisPipeline:
+    """Послойная диагностика "подключено, но нет интернета".
+
+    Все уровни проверяются одновременно, поэтому диагностика занимает
+    время самой медленной из нужных проверок. Как только отказывает
+    уровень, проверки выше него отменяются: их результат уже ничего не
+    объясняет. Результаты уровней кэшируются на DIAG_TTL, после
+    исправления кэш сбрасывается через invalidate().
+    """
+
+    def __init__(self, monitor, ttl=None, timeout=None, clock=time.monotonic):
+        self.monitor = monitor
+        self.ttl = {**config.DIAG_TTL, **(ttl or {})}
+        self.timeout = config.DIAG_LAYER_TIMEOUT if timeout is None else timeout
+        self.clock = clock
+        self.last = None
+        self.runs = 0
+        self.cache_hits = 0
+        self.cancelled = 0
+        self.verifications = 0
+        self._cache = {}
+        self._checks = {LINK: self._check_link, IP: self._check_ip, GATEWAY: self._check_gateway,
+                        DNS: self._check_dns, HTTP: self._check_http}
+
+    def invalidate(self, layers=None):
+        """Сбрасывает кэш уровней (по умолчанию всех)"""
+        for layer in layers or LAYERS:
+            self._cache.pop(layer, None)
+
+    def _cached(self, layer, now):
+        result = self._cache.get(layer)
+        if result is not None and now - result.timestamp < self.ttl[layer]:
+            return result
+        return None
+
+    async def run(self):
+        """Проверяет уровни и возвращает Diagnosis"""
+        started = self.clock()
+        self.runs += 1
+        results = {}
+        failed = None
+        for layer in LAYERS:
+            cached = self._cached(layer, started)
+            if cached is not None:
+                self.cache_hits += 1
+                results[layer] = cached
+                if not cached.ok:
+                    # Кэшированный отказ: уровни выше проверять незачем
+                    failed = layer
+                    break
+
+        rank = LAYERS.index
+        running = {}
+        cancelled = []
+        with span("diagnosis") as current:
+            for layer in LAYERS[:rank(failed) if failed else len(LAYERS)]:
+                if layer not in results:
+                    running[asyncio.ensure_future(self._run_layer(layer))] = layer
+            try:
+                while running:
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task not in running:
+                            continue  # Уже отменена отказом нижнего уровня из этого же набора
+                        layer = running.pop(task)
+                        result = results[layer] = self._cache[layer] = task.result()
+                        if result.ok or (failed is not None and rank(failed) < rank(layer)):
+                            continue
+                        failed = layer
+                        # Отказ нижнего уровня — проверки выше него отменяются
+                        for other, name in list(running.items()):
+                            if rank(name) > rank(layer):
+                                other.cancel()
+                                running.pop(other)
+                                cancelled.append(other)
+                                results.pop(name, None)
+                                self.cancelled += 1
+                # Выше отказавшего уровня результаты не показательны
+                if failed is not None:
+                    for layer in LAYERS[rank(failed) + 1:]:
+                        results.pop(layer, None)
+            finally:
+                for task in running:
+                    task.cancel()
+                cancelled.extend(running)
+                if cancelled:
+                    # Отмена закрывает сокеты незавершённых проверок
+                    await asyncio.gather(*cancelled, return_exceptions=True)
+            current.set(failed=failed)
+
+        self.last = Diagnosis(results, failed, self.clock() - started)
+        return self.last
+
+    async def verify(self):
+        """Только HTTP-проверка (в обход кэша) для проверки интернета; возвращает LayerResult.
+
+        Результат попадает в кэш: если проверка не прошла, следующий run()
+        начнёт с этого отказа и проверит только уровни ниже.
+        """
+        self.verifications += 1
+        result = self._cache[HTTP] = await self._run_layer(HTTP)
+        return result
+
+    async def _run_layer(self, layer):
+        started = self.clock()
+        with span("diagnosis." + layer) as current:
+            try:
+                ok, detail, portal = await asyncio.wait_for(self._checks[layer](), self.timeout)
+            except asyncio.TimeoutError:
+                ok, detail, portal = False, "таймаут", None
+            except OSError as e:
+                ok, detail, portal = False, e.strerror or type(e).__name__, None
+            current.set(ok=ok, detail=detail)
+        now = self.clock()
+        return LayerResult(layer, ok, detail, now - started, now, portal)
+
+    # --- проверки уровней: возвращают (ok, подробности, адрес портала) ---
+
+    async def _check_link(self):
+        """Интерфейс подключён к нашей сети (свежий снимок такта или опрос интерфейса).
+
+        Пока поток событий ОС активен, разрыв пришёл бы событием и вызвал
+        опрос интерфейса, поэтому снимок годится до EVENT_FALLBACK_INTERVAL.
+        """
+        engine = self.monitor.engine
+        snapshot = engine.last_snapshot
+        ttl = config.EVENT_FALLBACK_INTERVAL if self.monitor.events.active else self.ttl[LINK]
+        if snapshot is not None and snapshot.age(self.clock()) < ttl:
+            interfaces = snapshot.interfaces
+        else:
+            interfaces = await engine.poll_interfaces()
+        interface = connected_interface(interfaces, self.monitor.ssid)
+        if interface is None:
+            return False, None, None
+        return True, interface.bssid, None
+
+    async def _check_ip(self):
+        address = self.monitor.backend.local_address()
+        if address is None or address == "0.0.0.0":
+            return False, None, None
+        if address.startswith("169.254."):
+            return False, f"автоматический адрес {address}", None
+        return True, address, None
+
+    async def _check_gateway(self):
+        """TCP к шлюзу: ответ RST (порт закрыт) тоже доказывает, что шлюз жив"""
+        try:
+            _, writer = await self.monitor.backend.open_connection(config.ROUTER_IP, config.DIAG_GATEWAY_PORT)
+        except ConnectionRefusedError:
+            return True, "порт закрыт", None
+        writer.close()
+        return True, None, None
+
+    async def _check_dns(self):
+        infos = await self.monitor.backend.getaddrinfo(config.DIAG_DNS_NAME, 80)
+        return True, infos[0][4][0] if infos else None, None
+
+    async def _check_http(self):
+        """HTTP-проверка: 204 — интернет есть, иной ответ или редирект — captive portal"""
+        host, path = config.DIAG_HTTP_HOST, config.DIAG_HTTP_PATH
+        reader, writer = await self.monitor.backend.open_connection(host, config.DIAG_HTTP_PORT)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            status_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode('latin-1').partition(":")
+                headers[name.strip().lower()] = value.strip()
+        finally:
+            writer.close()
+
+        parts = status_line.split()
+        code = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+        if code == 204:
+            return True, None, None
+        if code == 200 or 300 <= (code or 0) < 400:
+            # Портал подменяет ответ: редирект на страницу входа или сама страница
+            return False, f"HTTP {code}", headers.get("location") or f"http://{host}{path}"
+        return False, f"HTTP {code}" if code else "нет ответа HTTP", None
+
+    def stats(self):
+        return {"diagnosis_runs": self.runs, "diagnosis_cache_hits": self.cache_hits,
+                "diagnosis_cancelled": self.cancelled, "diagnosis_verifications": self.verifications}
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import re
+import shutil
+import time
+
+import config
+from backend import STARTUPINFO
+
+EVENT_CONNECTED = "connected"
+EVENT_DISCONNECTED = "disconnected"
+EVENT_CONNECTING = "connecting"
+EVENT_SCAN_COMPLETE = "scan_complete"
+
+
+class WlanEvent:
+    """Событие беспроводного интерфейса, полученное из потока ОС"""
+
+    __slots__ = ('kind', 'interface', 'ssid', 'bssid', 'timestamp', 'raw')
+
+    def __init__(self, kind, interface=None, ssid=None, bssid=None, raw=""):
+        self.kind = kind
+        self.interface = interface
+        self.ssid = ssid
+        self.bssid = bssid
+        self.timestamp = time.monotonic()
+        self.raw = raw
+
+    def __repr__(self):
+        return f"WlanEvent({self.kind!r}, interface={self.interface!r}, ssid={self.ssid!r})"
+
+
+class NmcliEventParser:
+    """Разбор строк `nmcli monitor`"""
+
+    _DEVICE_RE = re.compile(r"^(?P<device>[^\s:']+): (?P<message>.+)$")
+    _USING_RE = re.compile(r"^using connection '(?P<ssid>.*)'$")
+
+    def __init__(self):
+        self._connections = {}
+
+    def parse(self, line):
+        match = self._DEVICE_RE.match(line)
+        if not match:
+            return None
+        device, message = match.group('device'), match.group('message')
+
+        using = self._USING_RE.match(message)
+        if using:
+            self._connections[device] = using.group('ssid')
+            return None
+        if message == "connected":
+            return WlanEvent(EVENT_CONNECTED, device, self._connections.get(device), raw=line)
+        if message in ("disconnected", "unavailable", "deactivating"):
+            self._connections.pop(device, None)
+            return WlanEvent(EVENT_DISCONNECTED, device, raw=line)
+        if message.startswith("connecting"):
+            return WlanEvent(EVENT_CONNECTING, device, self._connections.get(device), raw=line)
+        return None
+
+
+class IwEventParser:
+    """Разбор строк `iw event`"""
+
+    _LINE_RE = re.compile(r"^(?P<device>\S+) \(phy #\d+\): (?P<message>.+)$")
+    _CONNECTED_RE = re.compile(r"^connected to (?P<bssid>[0-9a-fA-F:]{17})")
+
+    def parse(self, line):
+        match = self._LINE_RE.match(line)
+        if not match:
+            return None
+        device, message = match.group('device'), match.group('message')
+
+        connected = self._CONNECTED_RE.match(message)
+        if connected:
+            return WlanEvent(EVENT_CONNECTED, device, bssid=connected.group('bssid').lower(), raw=line)
+        if message.startswith("disconnected"):
+            return WlanEvent(EVENT_DISCONNECTED, device, raw=line)
+        if message.startswith("scan finished"):
+            return WlanEvent(EVENT_SCAN_COMPLETE, device, raw=line)
+        if message.startswith(("auth", "assoc")):
+            return WlanEvent(EVENT_CONNECTING, device, raw=line)
+        return None
+
+
+# PowerShell-сценарий: подписка на журнал WLAN-AutoConfig, по строке на событие
+WINDOWS_WATCHER_SCRIPT = (
+    "$q = New-Object System.Diagnostics.Eventing.Reader.EventLogQuery("
+    "'Microsoft-Windows-WLAN-AutoConfig/Operational', "
+    "[System.Diagnostics.Eventing.Reader.PathType]::LogName); "
+    "$w = New-Object System.Diagnostics.Eventing.Reader.EventLogWatcher($q); "
+    "Register-ObjectEvent $w EventRecordWritten -SourceIdentifier wlan | Out-Null; "
+    "$w.Enabled = $true; "
+    "while ($true) { $e = Wait-Event -SourceIdentifier wlan; "
+    "Remove-Event -EventIdentifier $e.EventIdentifier; "
+    "[Console]::Out.WriteLine('wlan-event ' + $e.SourceEventArgs.EventRecord.Id); "
+    "[Console]::Out.Flush() }"
+)
+
+
+class WindowsEventParser:
+    """Разбор строк сценария WINDOWS_WATCHER_SCRIPT (коды событий WLAN-AutoConfig)"""
+
+    _LINE_RE = re.compile(r"^wlan-event (?P<id>\d+)")
+    _KINDS = {
+        8000: EVENT_CONNECTING,  # Начато подключение
+        8001: EVENT_CONNECTED,  # Подключение выполнено
+        8002: EVENT_DISCONNECTED,  # Не удалось подключиться
+        8003: EVENT_DISCONNECTED,  # Отключено
+        11000: EVENT_CONNECTING,  # Начата ассоциация
+        11001: EVENT_CONNECTING,  # Ассоциация выполнена
+    }
+
+    def parse(self, line):
+        match = self._LINE_RE.match(line)
+        if not match:
+            return None
+        kind = self._KINDS.get(int(match.group('id')))
+        return WlanEvent(kind, raw=line) if kind else None
+
+
+class PollingBackend:
+    """Запасной вариант без потока событий: состояние узнаётся только опросом netsh"""
+
+    streaming = False
+
+    def __init__(self):
+        self.events_received = 0
+        self.spawn_count = 0
+        self.restarts = 0
+
+    @property
+    def active(self):
+        return False
+
+    async def start(self, on_event):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self):
+        return {"event_backend": type(self).__name__, "events_received": self.events_received,
+                "event_spawns": self.spawn_count, "event_restarts": self.restarts}
+
+
+class StreamingBackend(PollingBackend):
+    """Долгоживущий процесс ОС, чей stdout построчно разбирается в WlanEvent.
+
+    Процесс запускается один раз; при его завершении перезапускается с
+    паузой EVENT_RESTART_DELAY. Если процесс падает быстрее
+    EVENT_QUICK_FAILURE, пауза удваивается (до EVENT_RESTART_MAX_DELAY),
+    а после EVENT_MAX_QUICK_FAILURES таких падений подряд перезапуски
+    прекращаются (gave_up). Пока процесс не работает, active == False и
+    мониторинг опирается на опрос.
+    """
+
+    streaming = True
+
+    def __init__(self, command, parser, encoding='utf-8'):
+        super().__init__()
+        self.command = list(command)
+        self.parser = parser
+        self.encoding = encoding
+        self._process = None
+        self._task = None
+        self.quick_failures = 0  # Быстрых падений подряд
+        self.gave_up = False  # Перезапуски прекращены, остаётся опрос
+
+    @property
+    def active(self):
+        return self._process is not None and self._process.returncode is None
+
+    def stats(self):
+        return {**super().stats(), "event_quick_failures": self.quick_failures, "event_gave_up": self.gave_up}
+
+    async def start(self, on_event):
+        """Запускает чтение потока событий; on_event вызывается в цикле событий"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run(on_event))
+
+    async def stop(self):
+        """Останавливает чтение и завершает процесс"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self, on_event):
+        while True:
+            started = time.monotonic()
+            try:
+                self.spawn_count += 1
+                self._process = await asyncio.create_subprocess_exec(
+                    *self.command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    startupinfo=STARTUPINFO  # Скрывает окно
+                )
+            except OSError as e:
+                print(f"Ошибка запуска потока событий {self.command[0]}: {e}")
+                self._process = None
+                return
+
+            try:
+                await self._read(self._process.stdout, on_event)
+            finally:
+                if self._process.returncode is None:
+                    try:
+                        self._process.kill()
+                    except ProcessLookupError:
+                        pass
+                    try:
+                        await asyncio.wait_for(self._process.wait(), 1)
+                    except asyncio.TimeoutError:
+                        pass
+                self._process = None
+
+            if time.monotonic() - started >= config.EVENT_QUICK_FAILURE:
+                self.quick_failures = 0  # Поработал — начинаем отсчёт заново
+            else:
+                self.quick_failures += 1
+                if self.quick_failures >= config.EVENT_MAX_QUICK_FAILURES:
+                    self.gave_up = True
+                    print(f"Поток событий {self.command[0]} падает сразу после запуска "
+                          f"({self.quick_failures} раз подряд), дальше только опрос")
+                    return
+            self.restarts += 1
+            delay = config.EVENT_RESTART_DELAY * 2 ** max(self.quick_failures - 1, 0)
+            await asyncio.sleep(min(delay, config.EVENT_RESTART_MAX_DELAY))
+
+    async def _read(self, stream, on_event):
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            event = self.parser.parse(line.decode(self.encoding, errors='replace').rstrip("\r\n"))
+            if event is not None:
+                self.events_received += 1
+                on_event(event)
+
+
+def create_event_backend(mode=None):
+    """Подбирает источник событий для текущей ОС (config.EVENT_BACKEND)"""
+    mode = config.EVENT_BACKEND if mode is None else mode
+
+    if mode == "auto":
+        if os.name == 'nt':
+            mode = "windows" if shutil.which("powershell") else "polling"
+        elif shutil.which("nmcli"):
+            mode = "nmcli"
+        elif shutil.which("iw"):
+            mode = "iw"
+        else:
+            mode = "polling"
+
+    if mode == "windows":
+        return StreamingBackend(
+            ["powershell", "-NoProfile", "-NonInteractive", "-Command", WINDOWS_WATCHER_SCRIPT],
+            WindowsEventParser())
+    if mode == "nmcli":
+        return StreamingBackend(["nmcli", "monitor"], NmcliEventParser())
+    if mode == "iw":
+        return StreamingBackend(["iw", "event"], IwEventParser())
+    return PollingBackend()
@@ -0,0 +1,308 @@
+import argparse
+import atexit
+import calendar
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+import config
+
+ACTIVE_NAME = "journal.jsonl"
+SEGMENT_PREFIX = "journal-"
+_SEGMENT_TIME = "%Y%m%dT%H%M%S"
+_STOP = object()
+
+
+def _format_time(timestamp):
+    return time.strftime(_SEGMENT_TIME, time.gmtime(timestamp))
+
+
+def _parse_time(text):
+    return calendar.timegm(time.strptime(text, _SEGMENT_TIME))
+
+
+class Journal:
+    """Журнал событий в формате JSON Lines, который пишет фоновый поток.
+
+    write() только кладёт запись в ограниченную очередь и никогда не ждёт:
+    если очередь полна (диск не успевает), запись отбрасывается, а число
+    потерь попадает в журнал отдельной записью. Поток-писатель забирает
+    записи пачками и делает fsync не чаще JOURNAL_FSYNC_INTERVAL. Текущий
+    файл journal.jsonl по размеру или возрасту переименовывается в сегмент
+    journal-<начало>-<конец>.jsonl и сжимается gzip.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, max_age=None, keep=None,
+                 queue_size=None, fsync_interval=None, enabled=None):
+        self.directory = directory or config.JOURNAL_DIR
+        self.max_bytes = max_bytes or config.JOURNAL_MAX_BYTES
+        self.max_age = max_age or config.JOURNAL_MAX_AGE
+        self.keep = config.JOURNAL_KEEP if keep is None else keep
+        self.fsync_interval = config.JOURNAL_FSYNC_INTERVAL if fsync_interval is None else fsync_interval
+        self.enabled = config.JOURNAL_ENABLED if enabled is None else enabled
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._queue = queue.Queue(maxsize=queue_size or config.JOURNAL_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = None
+        self._reported_drops = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, ACTIVE_NAME)
+
+    def write(self, kind, **fields):
+        """Ставит запись в очередь; не блокирует и не бросает исключений"""
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), kind, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def close(self, timeout=2):
+        """Дописывает очередь на диск и останавливает поток-писатель"""
+        thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        self._thread = None
+
+    # --- поток-писатель ---
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval if dirty else None)
+            except queue.Empty:
+                item = None
+
+            batch = [] if item is None else [item]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            records = [record for record in batch if record is not _STOP]
+            if self.dropped > self._reported_drops:
+                records.append((time.time(), "journal.dropped", {"count": self.dropped - self._reported_drops}))
+                self._reported_drops = self.dropped
+            if records:
+                dirty = self._append(records) or dirty
+
+            now = time.monotonic()
+            if dirty and (stop or now - last_sync >= self.fsync_interval):
+                self._sync()
+                last_sync, dirty = now, False
+            if stop:
+                self._close_file()
+                return
+
+    def _append(self, records):
+        lines = []
+        for timestamp, kind, fields in records:
+            lines.append(json.dumps({"ts": round(timestamp, 3), "kind": kind, **fields},
+                                    ensure_ascii=False, separators=(',', ':'), default=str))
+        data = ("\n".join(lines) + "\n").encode('utf-8')
+        try:
+            if self._file is None:
+                self._open_file(records[0][0])
+            elif (self._file.tell() + len(data) > self.max_bytes
+                  or records[0][0] - self._opened_at > self.max_age):
+                self._rotate(records[0][0])
+            self._file.write(data)
+        except OSError as e:
+            _report(f"Ошибка записи журнала: {e}")
+            self._close_file()
+            return False
+        self.written += len(records)
+        return True
+
+    def _open_file(self, timestamp):
+        os.makedirs(self.directory, exist_ok=True)
+        self._opened_at = _first_timestamp(self.path) or timestamp
+        self._file = open(self.path, "ab")
+
+    def _sync(self):
+        if self._file is not None:
+            try:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                _report(f"Ошибка записи журнала: {e}")
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.flush()
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _rotate(self, timestamp):
+        """Закрывает текущий файл, сжимает его в сегмент и открывает новый"""
+        self._sync()
+        self._close_file()
+        base = os.path.join(self.directory, f"{SEGMENT_PREFIX}{_format_time(self._opened_at)}"
+                                            f"-{_format_time(timestamp)}")
+        segment, n = base + ".jsonl", 1
+        while os.path.exists(segment + ".gz"):
+            # Несколько ротаций за секунду — не затираем предыдущий сегмент
+            n += 1
+            segment = f"{base}_{n}.jsonl"
+        os.replace(self.path, segment)
+        with open(segment, "rb") as source, gzip.open(segment + ".gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(segment)
+        self.rotations += 1
+        if self.keep:
+            for _, _, old in segments(self.directory)[:-self.keep]:
+                os.remove(old)
+        self._open_file(timestamp)
+
+    def stats(self):
+        return {"journal_written": self.written, "journal_dropped": self.dropped,
+                "journal_rotations": self.rotations, "journal_queued": self._queue.qsize()}
+
+
+class JournalStream:
+    """Поток вывода, копирующий строки print() в журнал.
+
+    В оконном EXE sys.stdout равен None — тогда строки попадают только
+    в журнал.
+    """
+
+    def __init__(self, journal, kind, stream=None):
+        self.journal = journal
+        self.kind = kind
+        self.stream = stream
+        self._buffer = ""
+
+    def write(self, text):
+        if self.stream is not None:
+            self.stream.write(text)
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line.strip():
+                self.journal.write(self.kind, message=line)
+        return len(text)
+
+    def flush(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+
+def _report(message):
+    """Ошибка самого журнала: в исходный stderr, минуя перехват print()"""
+    if sys.__stderr__ is not None:
+        print(message, file=sys.__stderr__)
+
+
+def _first_timestamp(path):
+    """Время первой записи файла журнала (None, если файла нет или он пуст)"""
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.readline())["ts"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def segments(directory):
+    """Сжатые сегменты журнала [(начало, конец, путь)] по возрастанию времени"""
+    result = []
+    for path in glob.glob(os.path.join(directory, SEGMENT_PREFIX + "*.jsonl*")):
+        name = os.path.basename(path)[len(SEGMENT_PREFIX):].split(".", 1)[0].split("_", 1)[0]
+        try:
+            start, end = (_parse_time(part) for part in name.split("-"))
+        except ValueError:
+            continue
+        result.append((start, end, path))
+    return sorted(result)
+
+
+def read_journal(directory=None, since=None, until=None, kinds=None):
+    """Потоково читает журнал: записи с since <= ts <= until нужных типов.
+
+    Сегменты вне интервала не открываются, файлы читаются построчно, а
+    строки чужих типов отсеиваются до разбора JSON.
+    """
+    directory = directory or config.JOURNAL_DIR
+    markers = [f'"kind":{json.dumps(kind, ensure_ascii=False)}'.encode('utf-8') for kind in kinds or ()]
+    files = [(start, end, path) for start, end, path in segments(directory)
+             if (since is None or end + 1 >= since) and (until is None or start <= until)]
+    active = os.path.join(directory, ACTIVE_NAME)
+    if os.path.exists(active):
+        files.append((None, None, active))
+
+    for _, _, path in files:
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rb") as f:
+                for line in f:
+                    if markers and not any(marker in line for marker in markers):
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Недописанная последняя строка
+                    timestamp = record.get("ts", 0)
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        break
+                    yield record
+        except OSError as e:
+            print(f"Ошибка чтения журнала {path}: {e}")
+
+
+JOURNAL = Journal()
+
+
+def main(argv=None):
+    """Печатает записи журнала: python journal.py --since 60 --kind state"""
+    parser = argparse.ArgumentParser(description="Чтение журнала событий")
+    parser.add_argument("--since", type=float, help="за последние N минут")
+    parser.add_argument("--until", type=float, help="не позже, чем N минут назад")
+    parser.add_argument("--kind", action="append", help="тип записи (можно несколько)")
+    parser.add_argument("--dir", help=f"каталог журнала (по умолчанию {config.JOURNAL_DIR})")
+    args = parser.parse_args(argv)
+
+    now = time.time()
+    since = now - args.since * 60 if args.since is not None else None
+    until = now - args.until * 60 if args.until is not None else None
+    for record in read_journal(args.dir, since, until, args.kind):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.pop("ts", 0)))
+        kind = record.pop("kind", "?")
+        print(stamp, kind, json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import math
+import time
+from collections import deque
+
+import config
+from netsh_parser import connected_interface, find_network
+
+try:
+    import numpy as np
+except ImportError:  # Без NumPy тренд считается циклами
+    np = None
+
+ACTION_SURVEY = "survey"  # Нужен свежий скан соседних точек доступа
+ACTION_ROAM = "roam"  # Перейти на более сильную точку той же сети
+ACTION_RECONNECT = "reconnect"  # Управляемое переподключение (точку выберет ОС)
+
+
+def trend(times, values):
+    """Линейный тренд: (значение в последний момент, наклон в ед./с, дисперсия остатков, ошибка наклона)"""
+    if np is not None:
+        t = np.asarray(times, dtype=np.float64)
+        v = np.asarray(values, dtype=np.float64)
+        t = t - t[-1]
+        dt = t - t.mean()
+        sxx = float(dt @ dt)
+        if sxx == 0:
+            return float(v[-1]), 0.0, float(v.var()), 0.0
+        slope = float(dt @ (v - v.mean())) / sxx
+        intercept = float(v.mean()) - slope * float(t.mean())
+        residuals = v - (intercept + slope * t)
+        variance = float(residuals @ residuals) / max(len(v) - 2, 1)
+        return intercept, slope, variance, math.sqrt(variance / sxx)
+
+    last = times[-1]
+    t = [x - last for x in times]
+    n = len(t)
+    t_mean, v_mean = sum(t) / n, sum(values) / n
+    sxx = sum((x - t_mean) ** 2 for x in t)
+    if sxx == 0:
+        return values[-1], 0.0, sum((v - v_mean) ** 2 for v in values) / n, 0.0
+    slope = sum((x - t_mean) * (v - v_mean) for x, v in zip(t, values)) / sxx
+    intercept = v_mean - slope * t_mean
+    variance = sum((v - intercept - slope * x) ** 2 for x, v in zip(t, values)) / max(n - 2, 1)
+    return intercept, slope, variance, math.sqrt(variance / sxx)
+
+
+def drop_probability(level, slope, variance, slope_error, horizon, threshold):
+    """Вероятность, что через horizon секунд сигнал окажется ниже threshold.
+
+    Прогноз по тренду с нормальной ошибкой: разброс остатков плюс
+    неопределённость наклона, растущая с горизонтом.
+    """
+    predicted = level + slope * horizon
+    sigma = math.sqrt(variance + (slope_error * horizon) ** 2)
+    if sigma == 0:
+        return 1.0 if predicted < threshold else 0.0
+    return 0.5 * (1 + math.erf((threshold - predicted) / (sigma * math.sqrt(2))))
+
+
+class Assessment:
+    """Оценка качества связи на текущий момент"""
+
+    __slots__ = ('signal', 'slope', 'variance', 'rate_slope', 'drop_probability', 'bssid',
+                 'candidate', 'candidate_signal', 'action')
+
+    def __init__(self, signal=None, slope=0.0, variance=0.0, rate_slope=0.0, drop_probability=0.0,
+                 bssid=None, candidate=None, candidate_signal=None, action=None):
+        self.signal = signal
+        self.slope = slope
+        self.variance = variance
+        self.rate_slope = rate_slope
+        self.drop_probability = drop_probability
+        self.bssid = bssid
+        self.candidate = candidate  # Более сильная точка той же сети
+        self.candidate_signal = candidate_signal
+        self.action = action
+
+    def describe(self):
+        text = (f"сигнал {self.signal}%, тренд {self.slope:+.1f} %/с, "
+                f"вероятность разрыва {self.drop_probability:.0%}")
+        if self.candidate is not None:
+            text += f", точка {self.candidate} ({self.candidate_signal:.0f}%)"
+        return text
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class LinkQualityAnalyzer:
+    """Прогноз разрыва связи по тренду сигнала и выбор точки доступа.
+
+    Хранит скользящее окно (QUALITY_WINDOW секунд) сигнала и скорости
+    подключённого интерфейса и последние уровни всех BSSID нашей сети из
+    сканирований. Если по тренду сигнал за QUALITY_HORIZON секунд упадёт
+    ниже QUALITY_DROP_SIGNAL с вероятностью от QUALITY_ACT_PROBABILITY,
+    предлагает перейти на более сильную точку той же сети, пока связь ещё
+    есть. Смена точки обнуляет окно: тренд старой точки к новой не относится.
+    """
+
+    def __init__(self, ssid, window=None, clock=time.monotonic):
+        self.ssid = ssid
+        self.window = config.QUALITY_WINDOW if window is None else window
+        self.clock = clock
+        self.samples = deque()  # (время, сигнал %, скорость приёма Мбит/с)
+        self.bssid = None
+        self.neighbours = {}  # BSSID -> deque((время, сигнал %))
+        self.last_survey = None
+        self.last_action = None
+        self.actions = 0
+        self.assessments = 0
+
+    def observe(self, snapshot, now=None):
+        """Добавляет данные снимка ProbeEngine (интерфейс и, если был, скан эфира)"""
+        now = self.clock() if now is None else now
+        interface = connected_interface(snapshot.interfaces, self.ssid)
+        if interface is not None and interface.signal is not None:
+            if interface.bssid != self.bssid:
+                self.samples.clear()
+                self.bssid = interface.bssid
+            self.samples.append((now, interface.signal, interface.rx_rate))
+        elif interface is None:
+            self.samples.clear()
+            self.bssid = None
+
+        if not snapshot.scan_skipped and snapshot.networks is not None:
+            self.last_survey = now
+            network = find_network(snapshot.networks, self.ssid)
+            for info in network.bssids if network is not None else ():
+                if info.signal is not None:
+                    history = self.neighbours.setdefault(info.bssid, deque(maxlen=3))
+                    history.append((now, info.signal))
+
+        horizon = now - self.window
+        while self.samples and self.samples[0][0] < horizon:
+            self.samples.popleft()
+        for bssid in [b for b, history in self.neighbours.items() if history[-1][0] < horizon]:
+            del self.neighbours[bssid]
+
+    def survey_fresh(self, now=None):
+        now = self.clock() if now is None else now
+        return self.last_survey is not None and now - self.last_survey <= config.QUALITY_SCAN_MAX_AGE
+
+    def _candidate(self, signal, now):
+        """Самая сильная другая точка нашей сети из свежего скана (сглаживание по 3 сканам)"""
+        best, best_signal = None, None
+        for bssid, history in self.neighbours.items():
+            if bssid == self.bssid or now - history[-1][0] > config.QUALITY_SCAN_MAX_AGE:
+                continue
+            level = sum(value for _, value in history) / len(history)
+            if best_signal is None or level > best_signal:
+                best, best_signal = bssid, level
+        if best is not None and best_signal >= signal + config.QUALITY_ROAM_MARGIN:
+            return best, best_signal
+        return None, None
+
+    def assess(self, now=None):
+        """Оценка и рекомендуемое действие (Assessment.action) на момент now"""
+        now = self.clock() if now is None else now
+        self.assessments += 1
+        if len(self.samples) < config.QUALITY_MIN_SAMPLES:
+            signal = self.samples[-1][1] if self.samples else None
+            return Assessment(signal=signal, bssid=self.bssid)
+
+        times = [sample[0] for sample in self.samples]
+        level, slope, variance, slope_error = trend(times, [sample[1] for sample in self.samples])
+        rates = [(t, rate) for t, _, rate in self.samples if rate is not None]
+        rate_slope = trend(*zip(*rates))[1] if len(rates) >= config.QUALITY_MIN_SAMPLES else 0.0
+        probability = drop_probability(level, slope, variance, slope_error, config.QUALITY_HORIZON,
+                                       config.QUALITY_DROP_SIGNAL)
+        signal = self.samples[-1][1]
+        candidate, candidate_signal = self._candidate(signal, now)
+        assessment = Assessment(signal, slope, variance, rate_slope, probability, self.bssid,
+                                candidate, candidate_signal)
+
+        cooling = self.last_action is not None and now - self.last_action < config.QUALITY_ACTION_COOLDOWN
+        if probability >= config.QUALITY_ACT_PROBABILITY and not cooling:
+            if candidate is not None:
+                assessment.action = ACTION_ROAM
+            elif not self.survey_fresh(now):
+                assessment.action = ACTION_SURVEY
+            elif not self.neighbours:
+                # Скан не сообщает точки доступа — пусть ОС выберет точку сама
+                assessment.action = ACTION_RECONNECT
+        elif probability >= config.QUALITY_SURVEY_PROBABILITY and not self.survey_fresh(now):
+            assessment.action = ACTION_SURVEY
+        return assessment
+
+    def acted(self, now=None):
+        """Отмечает выполненный переход: окно сбрасывается, действует пауза QUALITY_ACTION_COOLDOWN"""
+        self.last_action = self.clock() if now is None else now
+        self.actions += 1
+        self.samples.clear()
+        self.bssid = None
+
+    def stats(self):
+        return {"quality_assessments": self.assessments, "quality_actions": self.actions}
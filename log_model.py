@@ -0,0 +1,63 @@
+import os
+from collections import deque
+
+import config
+
+
+class LogModel:
+    """Ограниченный журнал строк статуса для GUI.
+
+    Хранит последние max_lines строк в кольцевом буфере; вытесненные строки
+    дописываются в файл spill_path (при превышении LOG_SPILL_MAX_BYTES он
+    переименовывается в *.1). Стоимость append/replace_last не зависит от
+    длины истории.
+    """
+
+    def __init__(self, max_lines=None, spill_path=None):
+        self.max_lines = config.LOG_MAX_LINES if max_lines is None else max_lines
+        self.spill_path = spill_path
+        self.lines = deque(maxlen=self.max_lines)
+        self.spilled = 0
+        self._spill = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    def append(self, line):
+        """Добавляет строку; самая старая при переполнении уходит на диск"""
+        if len(self.lines) == self.max_lines:
+            self._spill_line(self.lines[0])
+        self.lines.append(line)
+
+    def replace_last(self, line):
+        """Заменяет последнюю строку (повтор того же статуса с новым временем)"""
+        if self.lines:
+            self.lines[-1] = line
+        else:
+            self.lines.append(line)
+
+    def clear(self):
+        self.lines.clear()
+
+    def _spill_line(self, line):
+        if self.spill_path is None:
+            return
+        try:
+            if self._spill is None:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                self._spill = open(self.spill_path, "a", encoding='utf-8')
+            self._spill.write(line + "\n")
+            self.spilled += 1
+            if self._spill.tell() > config.LOG_SPILL_MAX_BYTES:
+                self._spill.close()
+                self._spill = None
+                os.replace(self.spill_path, self.spill_path + ".1")
+        except OSError as e:
+            print(f"Ошибка записи архива лога: {e}")
+            self.spill_path = None
+
+    def close(self):
+        """Сбрасывает и закрывает файл архива"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
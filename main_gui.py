@@ -1,96 +1,123 @@
+import os
 import sys
-import time
 from datetime import datetime
 
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                             QTextEdit, QPushButton, QLabel, QHBoxLayout,
-                             QDialog, QLineEdit, QFormLayout, QDialogButtonBox, QMessageBox)
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-from PyQt5.QtGui import QFont
+                             QPlainTextEdit, QPushButton, QLabel, QHBoxLayout,
+                             QDialog, QLineEdit, QFormLayout, QDialogButtonBox, QMessageBox,
+                             QShortcut, QCheckBox)
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal, Qt
+from PyQt5.QtGui import QFont, QKeySequence, QTextCursor
 
 import config
+from control_api import start_control_server
+from journal import JOURNAL, JournalStream
+from log_model import LogModel
+from metrics_exporter import start_exporter
+from monitor_core import MonitorCore
+from monitor_state import LinkState, StateQueue
+from tracing import TRACER
+from warm_start import CredentialStore
 from wifi_monitor import WiFiMonitor  # Теперь безопасно — нет обратного импорта
 
 
 class MonitorThread(QThread):
-    """Поток для мониторинга Wi-Fi в фоновом режиме"""
+    """Поток для мониторинга Wi-Fi в фоновом режиме.
 
-    status_signal = pyqtSignal(str, bool)  # текст статуса, изменился ли статус
-    connection_changed = pyqtSignal(bool)  # состояние подключения
+    Только размещает цикл asyncio из MonitorCore. Состояния складываются
+    в очередь states, а сигнал states_ready отправляется лишь для первого
+    из пачки — остальные GUI заберёт тем же drain(). on_state(state, changed),
+    если задан, получает каждое состояние в потоке цикла (API управления).
+    """
 
-    def __init__(self, monitor):
+    states_ready = pyqtSignal()  # в очереди states появились состояния
+
+    def __init__(self, monitor, on_state=None):
         super().__init__()
         self.monitor = monitor
-        self.running = True
-        self.last_status = ""
-        self.last_router_check = 0
-        self.router_check_interval = 300  # 5 минут
+        self.on_state = on_state
+        self.states = StateQueue()
+        self.core = MonitorCore(monitor, on_state=self._on_state)
+        self.core.uptime_window = 24 * 3600  # Доступность за сутки для подсказки
+
+    def _on_state(self, state, changed):
+        if self.states.push(state, changed):
+            self.states_ready.emit()
+        if self.on_state is not None:
+            self.on_state(state, changed)
 
     def run(self):
         """Основной цикл потока мониторинга"""
-        while self.running:
-            try:
-                # 1. Проверяем, доступна ли наша сеть
-                ssid_available = self.monitor.check_wifi_available()
-
-                if ssid_available:
-                    # 2. Проверяем, подключены ли мы к ней
-                    is_connected = self.monitor.get_current_connection()
-
-                    if is_connected:
-                        # Проверяем интернет
-                        has_internet = self.monitor.check_internet()
-
-                        if has_internet:
-                            status = f"Подключено к {self.monitor.ssid}, интернет доступен"
-
-                            # Проверяем роутер (раз в заданный интервал)
-                            current_time = time.time()
-                            if current_time - self.last_router_check > self.router_check_interval:
-                                self.last_router_check = current_time
-                                self.status_signal.emit("Проверка роутера...", True)
-                                # Здесь можно добавить логику проверки/настройки роутера
-                        else:
-                            status = f"Подключено к {self.monitor.ssid}, но нет интернета"
-
-                        self.connection_changed.emit(True)
-
-                    else:
-                        # Сеть доступна, но не подключены - пытаемся подключиться
-                        status = f"Обнаружена сеть {self.monitor.ssid}, подключаюсь..."
-                        success, message = self.monitor.connect_to_wifi()
-
-                        if success:
-                            status = f"{message}"
-                            self.connection_changed.emit(True)
-                        else:
-                            status = f"{message}"
-                            self.connection_changed.emit(False)
-
-                else:
-                    # Наша сеть недоступна
-                    status = f"Сеть {self.monitor.ssid} не обнаружена"
-                    self.connection_changed.emit(False)
-
-                # Отправляем статус в GUI
-                status_changed = (status != self.last_status)
-                self.status_signal.emit(status, status_changed)
-                self.last_status = status
-
-                # Задержка перед следующей проверкой
-                self.msleep(config.CHECK_INTERVAL * 1000)
-
-            except Exception as e:
-                error_status = f"Ошибка мониторинга: {str(e)}"
-                self.status_signal.emit(error_status, True)
-                self.msleep(5000)  # Ждем 5 секунд при ошибке
+        self.core.run_forever()
 
     def stop(self):
-        """Останавливает поток"""
-        self.running = False
+        """Останавливает поток: отменяет текущие проверки и ждёт выхода из цикла"""
+        self.core.stop()
         self.wait()
 
 
+class GuiController(QObject):
+    """Команды API управления (control_api) для окна.
+
+    Вызываются из потока сервера: start/stop передаются в поток GUI
+    сигналом и выполняются так же, как кнопки, reconnect и чтение
+    состояния потокобезопасны и выполняются сразу.
+    """
+
+    command = pyqtSignal(str)
+
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self.command.connect(self._execute)  # Из другого потока — через очередь событий GUI
+
+    def _execute(self, name):
+        if name == "start":
+            self.window.start_monitoring()
+        elif name == "stop":
+            self.window.stop_monitoring()
+
+    @property
+    def running(self):
+        return self.window.monitor_thread is not None
+
+    def start(self):
+        self.command.emit("start")
+
+    def stop(self):
+        self.command.emit("stop")
+
+    def reconnect(self, interface=None):
+        thread = self.window.monitor_thread
+        if thread is None:
+            return "мониторинг остановлен"
+        return thread.core.request_reconnect()
+
+    def states(self):
+        return [(self.window.monitor.interface, self.window.current_state())]
+
+    def stats(self):
+        return self.window.monitor.last_stats or {}
+
+
+class LogView(QPlainTextEdit):
+    """Представление лога: число блоков ограничено, последняя строка заменяется на месте"""
+
+    def __init__(self, max_lines):
+        super().__init__()
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+
+    def append_line(self, line):
+        self.appendPlainText(line)
+
+    def replace_last_line(self, line):
+        cursor = self.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.movePosition(QTextCursor.StartOfBlock, QTextCursor.KeepAnchor)
+        cursor.insertText(line)
+
+
 class MainWindow(QMainWindow):
     """Главное окно приложения"""
 
@@ -98,7 +125,12 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.monitor = monitor
         self.monitor_thread = None
-        self.status_history = []
+        self.state_queue = None
+        self.connected = None
+        self.status_history = LogModel(spill_path=os.path.join(config.APP_DATA_DIR, "status.log"))
+        self.exporter = start_exporter(monitor, self.current_state)
+        self.controller = GuiController(self)
+        self.control = start_control_server(self.controller)
         self.init_ui()
         self.start_monitoring()
 
@@ -137,11 +169,10 @@ class MainWindow(QMainWindow):
         layout.addWidget(line)
 
         # Текстовое поле для статусов
-        self.status_display = QTextEdit()
-        self.status_display.setReadOnly(True)
+        self.status_display = LogView(self.status_history.max_lines)
         self.status_display.setFont(QFont("Consolas", 9))
         self.status_display.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #ecf0f1;
                 border: 1px solid #bdc3c7;
                 border-radius: 5px;
@@ -214,12 +245,23 @@ class MainWindow(QMainWindow):
         self.bottom_status.setStyleSheet("color: #7f8c8d; padding-top: 10px; border-top: 1px solid #ecf0f1;")
         layout.addWidget(self.bottom_status)
 
+        # Ctrl+T — включить/выключить трассировку такта
+        QShortcut(QKeySequence("Ctrl+T"), self, activated=self.toggle_tracing)
+        # Ctrl+Shift+N — забыть сохранённые SSID и пароль (при следующем запуске спросить снова)
+        QShortcut(QKeySequence("Ctrl+Shift+N"), self, activated=self.forget_credentials)
+
+        # Пачка состояний за GUI_FRAME_INTERVAL применяется одной перерисовкой
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(int(config.GUI_FRAME_INTERVAL * 1000))
+        self.frame_timer.timeout.connect(self.flush_states)
+
     def start_monitoring(self):
         """Запускает поток мониторинга"""
         if self.monitor_thread is None or not self.monitor_thread.isRunning():
-            self.monitor_thread = MonitorThread(self.monitor)
-            self.monitor_thread.status_signal.connect(self.update_status)
-            self.monitor_thread.connection_changed.connect(self.update_connection_status)
+            self.monitor_thread = MonitorThread(self.monitor, on_state=self.publish_state)
+            self.state_queue = self.monitor_thread.states
+            self.monitor_thread.states_ready.connect(self.schedule_flush)
             self.monitor_thread.start()
 
             self.start_button.setEnabled(False)
@@ -231,15 +273,30 @@ class MainWindow(QMainWindow):
         if self.monitor_thread and self.monitor_thread.isRunning():
             self.monitor_thread.stop()
             self.monitor_thread = None
+            self.flush_states()
 
             self.start_button.setEnabled(True)
             self.stop_button.setEnabled(False)
             self.add_status("Мониторинг остановлен", True)
 
+    def toggle_tracing(self):
+        """Переключает трассировку; при выключении сохраняет трассу в файл"""
+        if TRACER.enabled:
+            TRACER.disable()
+            self.add_status(f"Трассировка выключена, трасса: {TRACER.dump()}", True)
+        else:
+            TRACER.enable()
+            self.add_status("Трассировка включена (Ctrl+T — выключить)", True)
+
+    def forget_credentials(self):
+        """Удаляет сохранённые SSID и пароль"""
+        CredentialStore().clear()
+        self.add_status("Сохранённая сеть забыта, при следующем запуске SSID и пароль будут запрошены", True)
+
     def clear_log(self):
         """Очищает лог сообщений"""
         self.status_display.clear()
-        self.status_history = []
+        self.status_history.clear()
         self.add_status("Лог очищен", True)
 
     def add_status(self, message, is_new_line=False):
@@ -248,29 +305,76 @@ class MainWindow(QMainWindow):
         formatted_message = f"[{timestamp}] {message}"
 
         if is_new_line or not self.status_history:
-            self.status_display.append(formatted_message)
+            self.status_display.append_line(formatted_message)
             self.status_history.append(formatted_message)
         else:
-            if self.status_history:
-                self.status_history[-1] = formatted_message
-                self.status_display.clear()
-                for status in self.status_history:
-                    self.status_display.append(status)
-
-    def update_status(self, message, status_changed):
-        """Обновляет статус из потока мониторинга"""
-        self.add_status(message, status_changed)
-
-        if "Подключено" in message and "интернет доступен" in message:
+            self.status_history.replace_last(formatted_message)
+            self.status_display.replace_last_line(formatted_message)
+
+    def current_state(self):
+        """Последнее состояние для экспорта метрик (вызывается из HTTP-потока)"""
+        thread = self.monitor_thread
+        return thread.core.publisher.last if thread is not None else None
+
+    def publish_state(self, state, changed):
+        """Состояние для подписчиков API управления (вызывается из потока мониторинга)"""
+        if self.control is not None:
+            self.control.publish(state, changed, self.monitor.interface)
+
+    def schedule_flush(self):
+        """Первое состояние пачки: применяем всю пачку в следующем кадре"""
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def flush_states(self):
+        """Переносит накопленные состояния в лог; строку статуса рисует только по последнему"""
+        states = self.state_queue.drain() if self.state_queue is not None else []
+        if not states:
+            return
+        for state, changed in states:
+            self.add_status(state.message, changed)
+        self.update_status(states[-1][0])
+
+    def update_status(self, state):
+        """Обновляет строку статуса по MonitorState"""
+        if state.state is LinkState.ONLINE:
             self.bottom_status.setStyleSheet(
                 "color: #27ae60; font-weight: bold; padding-top: 10px; border-top: 1px solid #ecf0f1;")
-        elif "нет интернета" in message or "не обнаружена" in message:
+        elif state.state in (LinkState.NO_INTERNET, LinkState.CAPTIVE_PORTAL, LinkState.NOT_FOUND,
+                             LinkState.ERROR):
             self.bottom_status.setStyleSheet(
                 "color: #e74c3c; font-weight: bold; padding-top: 10px; border-top: 1px solid #ecf0f1;")
         else:
             self.bottom_status.setStyleSheet("color: #7f8c8d; padding-top: 10px; border-top: 1px solid #ecf0f1;")
 
-        self.bottom_status.setText(message)
+        self.bottom_status.setText(state.message)
+
+        if state.state is not LinkState.INFO and state.connected != self.connected:
+            self.connected = state.connected
+            self.update_connection_status(state.connected)
+
+        stats = self.monitor.last_stats  # Снимок из потока мониторинга
+        tooltip = ""
+        if stats is not None:
+            tooltip = (f"Запусков netsh: {stats['spawns']}, сканирований: {stats['scans']}, "
+                       f"пропущено сканирований: {stats['scans_skipped']}, из кэша: {stats['cache_hits']}")
+        if state.signal is not None or state.rtt is not None:
+            signal = f"{state.signal}%" if state.signal is not None else "н/д"
+            rtt = f"{state.rtt * 1000:.0f} мс" if state.rtt is not None else "н/д"
+            tooltip += f"\nСигнал: {signal}, RTT: {rtt}"
+        if self.monitor_thread is not None:
+            core = self.monitor_thread.core
+            if core.uptime is not None:
+                tooltip += f"\nИнтернет доступен за сутки: {core.uptime * 100:.1f}%"
+            budget = core.budget  # Копия из потока мониторинга: его очереди здесь не читаются
+            if budget is not None:
+                tooltip += (f"\nЗапусков за минуту: {budget['spawns_last_minute']}/{budget['spawn_budget']}, "
+                            f"CPU за минуту: {budget['cpu_last_minute']:.2f}/{budget['cpu_budget']} с, "
+                            f"отложено проверок: {budget['deferred']}")
+            if core.startup_time is not None:
+                tooltip += (f"\nПервый подтверждённый статус через {core.startup_time:.1f} с"
+                            f"{' (тёплый старт)' if core.warm else ''}")
+        self.bottom_status.setToolTip(tooltip.strip())
 
     def update_connection_status(self, connected):
         """Обновляет статус подключения"""
@@ -278,19 +382,23 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
+        if self.control is not None:
+            self.control.stop()  # Команды клиентов больше не принимаются
         self.stop_monitoring()
+        self.status_history.close()
+        self.monitor.metrics.close()
+        self.monitor.router.close()
+        JOURNAL.close()
+        if self.exporter is not None:
+            self.exporter.stop()
         event.accept()
 
 
-def main():
-    """Точка входа в приложение"""
-    app = QApplication(sys.argv)
-    app.setStyle("Fusion")
-
-    # Всплывающее окно для ввода Wi-Fi данных
+def ask_credentials(store):
+    """Диалог ввода SSID и пароля; при отмене или пустых полях — выход из приложения"""
     dialog = QDialog()
     dialog.setWindowTitle("Настройка Wi-Fi сети")
-    dialog.setFixedSize(350, 180)
+    dialog.setFixedSize(350, 210)
     layout = QFormLayout()
 
     ssid_input = QLineEdit()
@@ -300,6 +408,10 @@ def main():
     layout.addRow("SSID сети:", ssid_input)
     layout.addRow("Пароль:", password_input)
 
+    remember_input = QCheckBox("Запомнить")
+    remember_input.setChecked(config.CREDENTIALS_STORE)
+    layout.addRow("", remember_input)
+
     buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
     buttons.accepted.connect(dialog.accept)
     buttons.rejected.connect(dialog.reject)
@@ -307,20 +419,39 @@ def main():
 
     dialog.setLayout(layout)
 
-    if dialog.exec_() == QDialog.Accepted:
-        ssid = ssid_input.text().strip()
-        password = password_input.text().strip()
+    if dialog.exec_() != QDialog.Accepted:
+        sys.exit(0)  # Выход при отмене
 
-        if not ssid or not password:
-            QMessageBox.critical(None, "Ошибка", "SSID и пароль не могут быть пустыми!")
-            sys.exit(1)
+    ssid = ssid_input.text().strip()
+    password = password_input.text().strip()
 
-        # Создаём монитор с введёнными данными
-        monitor = WiFiMonitor(ssid, password)
-    else:
-        sys.exit(0)  # Выход при отмене
+    if not ssid or not password:
+        QMessageBox.critical(None, "Ошибка", "SSID и пароль не могут быть пустыми!")
+        sys.exit(1)
+
+    if remember_input.isChecked():
+        store.save(ssid, password)
+    return ssid, password
+
+
+def main():
+    """Точка входа в приложение"""
+    # В оконном EXE stdout/stderr равны None — ошибки из print() сохраняются в журнале
+    sys.stdout = JournalStream(JOURNAL, "stdout", sys.stdout)
+    sys.stderr = JournalStream(JOURNAL, "stderr", sys.stderr)
+
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")
+
+    # Сохранённые SSID и пароль — без диалога (Ctrl+Shift+N в окне их забывает)
+    store = CredentialStore()
+    ssid, password = store.load() if config.CREDENTIALS_STORE else (None, None)
+    if not ssid or not password:
+        # Всплывающее окно для ввода Wi-Fi данных
+        ssid, password = ask_credentials(store)
 
-    # Создаём и показываем главное окно
+    # Создаём монитор и показываем главное окно
+    monitor = WiFiMonitor(ssid, password)
     window = MainWindow(monitor)
     window.show()
 
@@ -328,4 +459,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,264 @@
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECOVERY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value is None or value != value:
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик. Пишет только поток мониторинга, поэтому без блокировок"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=None, value=0):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name + "_total", self.labels, self.value
+
+
+class Gauge(Counter):
+    """Текущее значение"""
+
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Histogram:
+    """Гистограмма с корзинами, выделенными при создании.
+
+    observe() — поиск корзины и три сложения без блокировок: пишет один
+    поток, а HTTP-поток может прочитать значения посреди обновления —
+    расхождение на одно наблюдение для метрик несущественно.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket
+            yield self.name + "_bucket", {**self.labels, "le": _format_value(float(bound))}, cumulative
+        yield self.name + "_sum", self.labels, total
+        yield self.name + "_count", self.labels, count
+
+
+class Registry:
+    """Набор метрик и функций-сборщиков, которые вызываются при каждом запросе"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() возвращает метрики, созданные по текущему состоянию (без учёта в такте)"""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def collect(self):
+        metrics = list(self._metrics)
+        for collector in list(self._collectors):
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                print(f"Ошибка сбора метрик: {e}")
+        return metrics
+
+    def render(self, openmetrics=False):
+        """Текст в формате Prometheus (или OpenMetrics)"""
+        # Ряды одного семейства идут подряд, даже если их дали разные сборщики (адаптеры)
+        families = {}
+        for metric in self.collect():
+            # В OpenMetrics семейство счётчика называется без суффикса _total
+            family = metric.name if openmetrics or metric.kind != "counter" else metric.name + "_total"
+            families.setdefault(family, []).append(metric)
+        lines = []
+        for family, metrics in families.items():
+            lines.append(f"# HELP {family} {metrics[0].help}")
+            lines.append(f"# TYPE {family} {metrics[0].kind}")
+            for metric in metrics:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROBE_DURATION = {
+    probe: REGISTRY.register(Histogram(
+        "wifi_monitor_probe_duration_seconds", "Длительность проверки", labels={"probe": probe}))
+    for probe in ("scan", "interface", "internet")
+}
+SPAWN_DURATION = REGISTRY.register(Histogram(
+    "wifi_monitor_spawn_duration_seconds", "Время работы отдельно запущенного процесса netsh"))
+TICK_DURATION = REGISTRY.register(Histogram(
+    "wifi_monitor_tick_duration_seconds", "Длительность такта мониторинга"))
+TIME_TO_RECOVER = REGISTRY.register(Histogram(
+    "wifi_monitor_time_to_recover_seconds", "Время от начала переподключения до проверенной связи",
+    buckets=RECOVERY_BUCKETS))
+SIGNAL = REGISTRY.register(Gauge("wifi_monitor_signal_percent", "Качество сигнала, %", value=None))
+RTT = REGISTRY.register(Gauge("wifi_monitor_internet_rtt_seconds", "RTT последней проверки интернета",
+                              value=None))
+STARTUP = REGISTRY.register(Gauge("wifi_monitor_startup_seconds",
+                                  "От запуска цикла до первого подтверждённого статуса", value=None))
+
+
+def monitor_collector(monitor, state_getter=None, labels=None):
+    """Сборщик счётчиков WiFiMonitor и текущего состояния.
+
+    Счётчики берутся из снимка monitor.last_stats, который публикует цикл
+    мониторинга: живые объекты монитора из HTTP-потока не читаются.
+    labels добавляются ко всем рядам (например, {"interface": ...} у
+    каждого адаптера Supervisor).
+    """
+    from monitor_state import LinkState
+
+    labels = labels or {}
+
+    def collect():
+        stats = monitor.last_stats
+        if stats is None:
+            return []  # Ещё не было ни одного такта
+        metrics = [
+            Counter("wifi_monitor_spawns", "Запуски процессов", {**labels, "source": "probe"}, stats["spawns"]),
+            Counter("wifi_monitor_spawns", "Запуски процессов", {**labels, "source": "events"},
+                    stats["event_spawns"]),
+            Counter("wifi_monitor_scans", "Сканирования эфира", labels, stats["scans"]),
+            Counter("wifi_monitor_scans_skipped", "Пропущенные сканирования", labels, stats["scans_skipped"]),
+            Counter("wifi_monitor_probe_timeouts", "Проверки, прерванные по таймауту", labels, stats["timeouts"]),
+            Counter("wifi_monitor_reconnect_attempts", "Попытки переподключения", labels,
+                    stats["reconnect_attempts"]),
+            Counter("wifi_monitor_reconnect_successes", "Успешные переподключения", labels,
+                    stats["reconnect_successes"]),
+            Counter("wifi_monitor_reconnect_failures", "Неудачные переподключения", labels,
+                    stats["reconnect_failures"]),
+            Gauge("wifi_monitor_connected", "Подключено к целевой сети", labels, int(stats["connected"])),
+        ]
+        state = state_getter() if state_getter else None
+        if state is not None:
+            for link_state in LinkState:
+                metrics.append(Gauge("wifi_monitor_state", "Текущее состояние (1 — активно)",
+                                     {**labels, "state": link_state.value}, int(state.state is link_state)))
+        return metrics
+
+    return collect
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.registry.render(openmetrics).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Опросы Prometheus не засоряют stdout
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics в собственном потоке-демоне"""
+
+    def __init__(self, registry=REGISTRY, host=None, port=None):
+        self.host = config.METRICS_EXPORTER_HOST if host is None else host
+        self.port = config.METRICS_EXPORTER_PORT if port is None else port
+        handler = type("Handler", (_Handler,), {"registry": registry})
+        self.server = HTTPServer((self.host, self.port), handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_exporter(monitor, state_getter=None, port=None):
+    """Запускает экспорт метрик одного монитора, если он включён (config.METRICS_EXPORTER или port).
+
+    Возвращает MetricsServer или None.
+    """
+    return serve_collectors([monitor_collector(monitor, state_getter)], port)
+
+
+def serve_collectors(collectors, port=None):
+    """Как start_exporter(), но со своими сборщиками (например, по одному на адаптер)"""
+    if port is None and not config.METRICS_EXPORTER:
+        return None
+    for collector in collectors:
+        REGISTRY.add_collector(collector)
+    try:
+        server = MetricsServer(port=port).start()
+    except OSError as e:
+        print(f"Ошибка запуска экспорта метрик: {e}")
+        return None
+    print(f"Метрики доступны на http://{server.host}:{server.port}/metrics")
+    return server
@@ -0,0 +1,354 @@
+import math
+import mmap
+import os
+import struct
+import time
+
+import config
+from monitor_state import LinkState
+
+try:
+    import numpy as np
+except ImportError:  # Без NumPy запросы считаются циклами по memoryview
+    np = None
+
+# Колонки образца: имя, код типа array/memoryview. Порядок — по убыванию
+# размера, чтобы каждая колонка в файле была выровнена по своему типу.
+COLUMNS = (
+    ('timestamp', 'd'),  # Unix-время начала образца
+    ('rtt', 'f'),  # RTT проверки интернета, с (NaN — нет данных)
+    ('rx_rate', 'f'),  # Скорость приёма, Мбит/с
+    ('tx_rate', 'f'),  # Скорость передачи, Мбит/с
+    ('duration', 'f'),  # Время, которое покрывает образец, с (от предыдущего такта)
+    ('online_time', 'f'),  # Из него с доступным интернетом, с
+    ('samples', 'H'),  # Сколько тактов объединено в образце
+    ('online', 'H'),  # Из них с доступным интернетом
+    ('signal', 'b'),  # Качество сигнала, % (-128 — нет данных)
+    ('rssi', 'b'),  # Оценка RSSI, дБм
+    ('state', 'B'),  # Код LinkState
+)
+ROW_SIZE = sum(struct.calcsize(code) for _, code in COLUMNS)
+NO_BYTE = -128
+
+STATE_CODES = {state: code for code, state in enumerate(LinkState, 1)}
+STATES = {code: state for state, code in STATE_CODES.items()}
+
+_HEADER = struct.Struct('<4sHIII')  # сигнатура, версия, ёмкость, голова, количество
+_HEADER_SIZE = 64
+_MAGIC = b'WFMS'
+_VERSION = 2  # 2: колонки duration и online_time
+
+
+def signal_to_rssi(signal):
+    """Качество сигнала Windows (%) в приблизительный RSSI (дБм)"""
+    return max(-100, min(-50, signal // 2 - 100))
+
+
+class MetricsRing:
+    """Кольцо образцов фиксированной ширины в отображённом в память файле.
+
+    Каждая колонка — непрерывный участок файла, доступный как memoryview
+    (и как массив NumPy без копирования). Ёмкость задаётся при создании;
+    файл с другой ёмкостью или версией пересоздаётся.
+    """
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        size = _HEADER_SIZE + capacity * ROW_SIZE
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        self._file = open(path, "w+b" if fresh else "r+b")
+        if fresh:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+        magic, version, stored_capacity, self.head, self.count = _HEADER.unpack_from(self._mm, 0)
+        if fresh or magic != _MAGIC or version != _VERSION or stored_capacity != capacity:
+            self.head = self.count = 0
+            self._write_header()
+
+        self._offsets = {}
+        self.columns = {}
+        offset = _HEADER_SIZE
+        self._view = memoryview(self._mm)
+        for name, code in COLUMNS:
+            width = struct.calcsize(code) * capacity
+            self._offsets[name] = offset
+            self.columns[name] = self._view[offset:offset + width].cast(code)
+            offset += width
+
+    def __len__(self):
+        return self.count
+
+    def _write_header(self):
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION, self.capacity, self.head, self.count)
+
+    def append(self, row):
+        """Записывает образец (dict колонка -> значение) поверх самого старого"""
+        index = self.head
+        for name, _ in COLUMNS:
+            self.columns[name][index] = row[name]
+        self.head = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+
+    def order(self):
+        """Индексы образцов в хронологическом порядке"""
+        if self.count < self.capacity:
+            return range(self.count)
+        return list(range(self.head, self.capacity)) + list(range(self.head))
+
+    def order_array(self):
+        """order() для NumPy"""
+        if self.count < self.capacity:
+            return np.arange(self.count)
+        return np.concatenate((np.arange(self.head, self.capacity), np.arange(self.head)))
+
+    def newest(self):
+        if not self.count:
+            return None
+        return self.columns['timestamp'][(self.head - 1) % self.capacity]
+
+    def oldest(self):
+        if not self.count:
+            return None
+        return self.columns['timestamp'][0 if self.count < self.capacity else self.head]
+
+    def array(self, name):
+        """Колонка как массив NumPy без копирования (в хронологическом порядке — через order())"""
+        code = dict(COLUMNS)[name]
+        return np.frombuffer(self._mm, dtype=np.dtype(code), count=self.capacity,
+                             offset=self._offsets[name])
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self._view.release()
+        self._mm.close()
+        self._file.close()
+
+
+class MetricsStore:
+    """История качества связи: образец на каждый такт и агрегаты по минутам.
+
+    Свежие образцы лежат в кольце raw (METRICS_RAW_CAPACITY тактов), каждые
+    METRICS_BUCKET секунд их агрегат дописывается в кольцо downsampled,
+    которое хранит недели истории. Запросы за окно, которое покрывает raw,
+    считаются по нему, более длинные — по агрегатам. Файлы открываются при
+    первом обращении; при ошибке ввода-вывода история просто не ведётся.
+
+    Такты нерегулярны (при стабильной связи — раз в 10–15 с, при сбое —
+    каждую секунду), поэтому образец хранит и свою длительность: время
+    от предыдущего такта. Доля времени считается по ней, а не по числу тактов.
+    Методы не потокобезопасны — их вызывает поток цикла мониторинга.
+    """
+
+    def __init__(self, directory=None, raw_capacity=None, downsampled_capacity=None, bucket=None):
+        self.directory = directory or os.path.join(config.APP_DATA_DIR, "metrics")
+        self.raw_capacity = raw_capacity or config.METRICS_RAW_CAPACITY
+        self.downsampled_capacity = downsampled_capacity or config.METRICS_DOWNSAMPLED_CAPACITY
+        self.bucket = bucket or config.METRICS_BUCKET
+        self.raw = None
+        self.downsampled = None
+        self.enabled = True
+        self._bucket_start = None
+        self._bucket_rows = []
+        self._last_timestamp = None  # Время предыдущего образца (для duration)
+
+    def _open(self):
+        if self.raw is None and self.enabled:
+            try:
+                self.raw = MetricsRing(os.path.join(self.directory, "raw.bin"), self.raw_capacity)
+                self.downsampled = MetricsRing(os.path.join(self.directory, "downsampled.bin"),
+                                               self.downsampled_capacity)
+            except (OSError, ValueError) as e:
+                print(f"Ошибка открытия истории метрик: {e}")
+                self.enabled = False
+                self.raw = self.downsampled = None
+            else:
+                self._last_timestamp = self.raw.newest()
+        return self.raw is not None
+
+    def record(self, state, signal=None, rx_rate=None, tx_rate=None, rtt=None, timestamp=None):
+        """Сохраняет образец одного такта"""
+        if not self._open():
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        online = state is LinkState.ONLINE
+        # Промежуток длиннее METRICS_MAX_GAP — монитор не работал: это время не учитывается
+        duration = 0.0 if self._last_timestamp is None else timestamp - self._last_timestamp
+        if not 0 < duration <= config.METRICS_MAX_GAP:
+            duration = 0.0
+        self._last_timestamp = timestamp
+        row = {
+            'timestamp': timestamp,
+            'rtt': math.nan if rtt is None else rtt,
+            'rx_rate': math.nan if rx_rate is None else rx_rate,
+            'tx_rate': math.nan if tx_rate is None else tx_rate,
+            'duration': duration,
+            'online_time': duration if online else 0.0,
+            'samples': 1,
+            'online': 1 if online else 0,
+            'signal': NO_BYTE if signal is None else signal,
+            'rssi': NO_BYTE if signal is None else signal_to_rssi(signal),
+            'state': STATE_CODES[state],
+        }
+        self.raw.append(row)
+
+        bucket_start = timestamp - timestamp % self.bucket
+        if self._bucket_start is not None and bucket_start != self._bucket_start:
+            self._flush_bucket()
+        self._bucket_start = bucket_start
+        self._bucket_rows.append(row)
+
+    def _flush_bucket(self):
+        """Агрегирует накопленные за интервал образцы в одну строку downsampled"""
+        rows, self._bucket_rows = self._bucket_rows, []
+        if not rows:
+            return
+
+        def mean(name, missing):
+            values = [row[name] for row in rows if row[name] == row[name] and row[name] != NO_BYTE]
+            return sum(values) / len(values) if values else missing
+
+        signal = mean('signal', None)
+        self.downsampled.append({
+            'timestamp': self._bucket_start,
+            'rtt': mean('rtt', math.nan),
+            'rx_rate': mean('rx_rate', math.nan),
+            'tx_rate': mean('tx_rate', math.nan),
+            'duration': sum(row['duration'] for row in rows),
+            'online_time': sum(row['online_time'] for row in rows),
+            'samples': min(65535, sum(row['samples'] for row in rows)),
+            'online': min(65535, sum(row['online'] for row in rows)),
+            'signal': NO_BYTE if signal is None else round(signal),
+            'rssi': NO_BYTE if signal is None else signal_to_rssi(round(signal)),
+            'state': rows[-1]['state'],
+        })
+
+    def _window(self, names, window, now=None):
+        """Колонки names за окно в хронологическом порядке.
+
+        Часть окна, которую ещё покрывает raw, берётся из него, более
+        старая — из агрегатов. С NumPy значения — массивы, без него — списки.
+        """
+        if not self._open():
+            return None
+        since = (time.time() if now is None else now) - window
+        raw_oldest = self.raw.oldest()
+        if raw_oldest is not None and raw_oldest <= since:
+            segments = [(self.raw, since, math.inf)]
+        else:
+            # Агрегаты только до начала raw, чтобы такты не учитывались дважды
+            cutoff = math.inf if raw_oldest is None else raw_oldest - self.bucket
+            segments = [(self.downsampled, since, cutoff), (self.raw, since, math.inf)]
+
+        if np is not None:
+            parts = {name: [] for name in names}
+            for ring, start, end in segments:
+                order = ring.order_array()
+                timestamps = ring.array('timestamp')[order]
+                index = order[(timestamps >= start) & (timestamps < end)]
+                for name in names:
+                    parts[name].append(ring.array(name)[index])
+            return {name: np.concatenate(values) for name, values in parts.items()}
+
+        columns = {name: [] for name in names}
+        for ring, start, end in segments:
+            timestamps = ring.columns['timestamp']
+            index = [i for i in ring.order() if start <= timestamps[i] < end]
+            for name in names:
+                column = ring.columns[name]
+                columns[name].extend(column[i] for i in index)
+        return columns
+
+    def uptime(self, window, now=None):
+        """Доля времени с доступным интернетом за окно (0..1) или None без данных.
+
+        Пока длительности нет (один образец после запуска) — доля тактов.
+        """
+        columns = self._window(('duration', 'online_time', 'samples', 'online'), window, now)
+        if columns is None:
+            return None
+        if np is not None:
+            duration = float(columns['duration'].sum(dtype=np.float64))
+            online_time = float(columns['online_time'].sum(dtype=np.float64))
+            samples = int(columns['samples'].sum(dtype=np.int64))
+            online = int(columns['online'].sum(dtype=np.int64))
+        else:
+            duration, online_time = sum(columns['duration']), sum(columns['online_time'])
+            samples, online = sum(columns['samples']), sum(columns['online'])
+        if duration > 0:
+            return online_time / duration
+        return online / samples if samples else None
+
+    def rtt_percentile(self, percent, window, now=None):
+        """Перцентиль RTT (с) за окно или None, если измерений не было"""
+        columns = self._window(('rtt',), window, now)
+        if columns is None:
+            return None
+        if np is not None:
+            values = columns['rtt'][~np.isnan(columns['rtt'])]
+            return float(np.percentile(values, percent)) if len(values) else None
+
+        values = sorted(v for v in columns['rtt'] if v == v)
+        if not values:
+            return None
+        # Линейная интерполяция, как np.percentile по умолчанию
+        position = (len(values) - 1) * percent / 100
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def outages(self, window, now=None):
+        """Список (начало, конец, длительность) периодов без интернета за окно.
+
+        Незавершённый период заканчивается на последнем образце. На агрегатах
+        перебоем считается интервал, в котором был хотя бы один такт без интернета.
+        """
+        columns = self._window(('timestamp', 'samples', 'online'), window, now)
+        if columns is None or not len(columns['timestamp']):
+            return []
+        if np is not None:
+            down = columns['online'] < columns['samples']
+            edges = np.flatnonzero(np.diff(down.astype(np.int8)))
+            starts = (edges[down[edges + 1]] + 1).tolist()
+            ends = (edges[~down[edges + 1]] + 1).tolist()
+            if down[0]:
+                starts.insert(0, 0)
+            timestamps = columns['timestamp'].tolist()
+        else:
+            timestamps = columns['timestamp']
+            down = [online < samples for online, samples in zip(columns['online'], columns['samples'])]
+            starts = [i for i in range(len(down)) if down[i] and (i == 0 or not down[i - 1])]
+            ends = [i for i in range(1, len(down)) if not down[i] and down[i - 1]]
+
+        result = []
+        for n, start in enumerate(starts):
+            end = timestamps[ends[n]] if n < len(ends) else timestamps[-1]
+            result.append((timestamps[start], end, end - timestamps[start]))
+        return result
+
+    def flush(self):
+        if self.raw is not None:
+            self.raw.flush()
+            self.downsampled.flush()
+
+    def close(self):
+        """Сбрасывает агрегат текущего интервала и закрывает файлы"""
+        if self.raw is not None:
+            self._flush_bucket()
+            self.flush()
+            self.raw.close()
+            self.downsampled.close()
+            self.raw = self.downsampled = None
+
+    def stats(self):
+        return {"metrics_samples": len(self.raw) if self.raw else 0,
+                "metrics_downsampled": len(self.downsampled) if self.downsampled else 0}
@@ -0,0 +1,489 @@
+import asyncio
+import math
+import threading
+import time
+
+import config
+from diagnosis import REMEDY_FLUSH_DNS, REMEDY_RECONNECT, REMEDY_RENEW_LEASE
+from link_quality import ACTION_ROAM, ACTION_SURVEY
+from metrics_exporter import SIGNAL, STARTUP, TICK_DURATION
+from tracing import TRACER, span
+from monitor_state import LinkState, MonitorState, StatePublisher
+from scheduler import PROBE_INTERFACE, PROBE_INTERNET, PROBE_SCAN, AdaptiveScheduler
+from warm_start import WarmState
+
+
+async def with_deadline(coro, timeout, default):
+    """Выполняет проверку с дедлайном; по его истечении отменяет её и возвращает default"""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        return default
+
+
+_REMEDY_LABELS = {
+    REMEDY_RENEW_LEASE: "запрашиваю адрес у DHCP заново",
+    REMEDY_FLUSH_DNS: "сбрасываю кэш DNS",
+}
+
+
+class MonitorCore:
+    """Цикл мониторинга на asyncio, не зависящий от Qt.
+
+    Независимые проверки (снимок netsh и доступность интернета) выполняются
+    параллельно, поэтому длительность такта ограничена самой медленной из них.
+    Когда какую проверку запускать, решает scheduler.AdaptiveScheduler.
+    Результат такта — monitor_state.MonitorState; колбэк on_state(state, changed)
+    вызывается из потока цикла только при переходе или по heartbeat
+    (см. StatePublisher), поэтому при стабильной связи он почти не срабатывает.
+    Подтверждённое состояние сохраняется (warm_start.WarmStateStore), и
+    следующий запуск продолжает с него: первый такт — опрос интерфейса и
+    интернета без сканирования эфира.
+    """
+
+    def __init__(self, monitor, on_state=None):
+        self.monitor = monitor
+        self.on_state = on_state or (lambda state, changed: None)
+        self.clock = monitor.backend.clock
+        self.journal = monitor.journal
+        self.publisher = StatePublisher(clock=self.clock)
+        self.last_router_check = 0
+        self.router_check_interval = config.ROUTER_CHECK_INTERVAL
+        self._router_task = None
+        self._router_report = None
+        self.has_internet = False
+        self.ticking = False  # Идёт такт
+        self.before_tick = None  # Вызывается между тактами (Supervisor меняет здесь сеть)
+        self._survey = False  # Следующее сканирование — и при подключении (соседние точки)
+        self._reconnect_requested = False  # Переподключение по команде (control_api) в ближайшем такте
+        self._remedies = {}  # исправление -> время применения (с момента последней рабочей связи)
+        self.scheduler = AdaptiveScheduler(clock=self.clock)
+        self.budget = None  # Копия scheduler.stats() на конец такта — для чтения из других потоков
+        self.uptime_window = None  # Окно доступности (с), которую нужно считать для других потоков
+        self.uptime = None  # Доступность за uptime_window (0..1), обновляется раз в UPTIME_REFRESH
+        self._uptime_at = None
+        self.warm = False  # Запуск продолжил сохранённое состояние
+        self.startup_time = None  # От запуска цикла до первого ONLINE, с
+        self.startup_spawns = None  # Запусков процессов до первого ONLINE
+        self._started = None
+        self._fingerprint = None  # ((SSID, пароль), отпечаток профиля) для сохраняемого состояния
+        self._wake = None
+        self._loop = None
+        self._task = None
+        self._stop_requested = False
+        self._lock = threading.Lock()
+
+    def run_forever(self):
+        """Запускает цикл событий в текущем потоке и блокирует его до stop()"""
+        try:
+            asyncio.run(self._main())
+        except asyncio.CancelledError:
+            pass
+
+    async def _main(self):
+        with self._lock:
+            if self._stop_requested:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        try:
+            await self.run()
+        finally:
+            with self._lock:
+                self._loop = None
+                self._task = None
+
+    def stop(self):
+        """Останавливает цикл из любого потока: текущие проверки сразу отменяются"""
+        with self._lock:
+            self._stop_requested = True
+            if self._loop is not None and self._task is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def request_reconnect(self):
+        """Переподключение по команде из любого потока; None или текст ошибки"""
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            return "мониторинг не запущен"
+        loop.call_soon_threadsafe(self.reconnect_now)
+        return None
+
+    def reconnect_now(self):
+        """Переподключение в ближайшем такте (из потока цикла)"""
+        self._reconnect_requested = True
+        self.expedite()
+
+    async def run(self):
+        """Основной цикл мониторинга: проверки по адаптивному расписанию и событиям ОС"""
+        self._wake = asyncio.Event()
+        events = self.monitor.events
+        self._started = self.clock()
+        self.warm = self._resume()
+        self.journal.write("monitor", action="start", ssid=self.monitor.ssid, events=type(events).__name__,
+                           warm=self.warm)
+        await events.start(self._on_event)
+        try:
+            await self._loop_ticks()
+        finally:
+            if self._router_task is not None:
+                self._router_task.cancel()
+            await events.stop()
+            await self.monitor.aclose()
+            self.journal.write("monitor", action="stop", ssid=self.monitor.ssid)
+
+    def _resume(self):
+        """Тёплый старт: интервалы прошлого запуска, сеть считается видимой до первого сканирования.
+
+        Состояние не используется, если оно другой сети, пароль сменился
+        (другой отпечаток профиля) или связь последний раз была
+        подтверждена дольше WARM_START_MAX_AGE назад.
+        """
+        monitor = self.monitor
+        state = monitor.warm_state.load() if config.WARM_START else None
+        if (state is None or state.ssid != monitor.ssid or state.last_good is None
+                or state.fingerprint != monitor.profiles.fingerprint(monitor.ssid, monitor.password)
+                or monitor.backend.wall() - state.last_good > config.WARM_START_MAX_AGE):
+            return False
+        self.scheduler.restore(state.intervals)
+        monitor.engine.assume_visible = True
+        return True
+
+    def _persist(self):
+        """Запоминает подтверждённую связь для тёплого старта (файл — только при изменениях)"""
+        monitor = self.monitor
+        credentials = (monitor.ssid, monitor.password)
+        if self._fingerprint is None or self._fingerprint[0] != credentials:
+            self._fingerprint = credentials, monitor.profiles.fingerprint(*credentials)
+        interface, _ = self._observed()
+        monitor.warm_state.update(WarmState(
+            ssid=monitor.ssid, fingerprint=self._fingerprint[1],
+            bssid=interface.bssid if interface is not None else None, last_good=monitor.backend.wall(),
+            intervals=self.scheduler.intervals()))
+
+    def _verified(self):
+        """Первый ONLINE после запуска: время и число запусков процессов до него"""
+        self.startup_time = self.clock() - self._started
+        self.startup_spawns = self.monitor.engine.spawn_count
+        STARTUP.set(self.startup_time)
+        self.journal.write("startup", ssid=self.monitor.ssid, warm=self.warm, elapsed=round(self.startup_time, 3),
+                           spawns=self.startup_spawns)
+
+    def _on_event(self, event):
+        """Событие от ОС: внеочередная проверка без ожидания интервала"""
+        self.journal.write("os_event", event=event.kind, interface=event.interface, ssid=event.ssid,
+                           bssid=event.bssid)
+        self.scheduler.on_event(event.kind)
+        self._wake.set()
+
+    async def _sleep(self, delay):
+        """Ждёт delay секунд или до ближайшего события ОС"""
+        self._wake.clear()
+        # Таймер взводит то же событие: без wait_for, создающего задачу на каждый такт
+        timer = asyncio.get_running_loop().call_later(delay, self._wake.set)
+        try:
+            await self._wake.wait()
+        finally:
+            timer.cancel()
+
+    async def _loop_ticks(self):
+        while True:
+            try:
+                if self.before_tick is not None:
+                    self.before_tick()
+                self.scheduler.set_events_active(self.monitor.events.active)
+                await self.tick()
+                await self._sleep(self.scheduler.delay())
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._emit(LinkState.ERROR, f"Ошибка мониторинга: {str(e)}")
+                await asyncio.sleep(config.ERROR_RETRY_DELAY)  # Ждем при ошибке
+
+    async def tick(self):
+        """Один такт: параллельные проверки, срок которых подошёл, затем решение о переподключении"""
+        started = time.perf_counter()
+        tick = TRACER.begin_tick()
+        self.ticking = True
+        try:
+            with span("tick", tick=tick):
+                await self._tick()
+        finally:
+            self.ticking = False
+            self.monitor.publish_stats()
+            duration = time.perf_counter() - started
+            TICK_DURATION.observe(duration)
+            TRACER.end_tick(duration)
+
+    async def _tick(self):
+        monitor = self.monitor
+        scheduler = self.scheduler
+        if self._reconnect_requested:
+            # Разрыв и переподключение по команде; проверки остаются на следующий такт
+            self._reconnect_requested = False
+            self._emit(LinkState.CONNECTING, f"Переподключаюсь к {monitor.ssid} по команде...")
+            with span("reconnect", command=True) as reconnect:
+                success, message = await monitor.roam_async(
+                    on_progress=lambda text: self._emit(LinkState.CONNECTING, text))
+                reconnect.set(success=success)
+            self.expedite()
+            scheduler.charge(monitor.engine.spawn_count)
+            self._emit(LinkState.CONNECTED if success else LinkState.ERROR, message)
+            return
+
+        due = scheduler.due()
+        if not due:
+            return
+
+        snapshot_deadline = config.INTERFACE_TIMEOUT + config.SCAN_TIMEOUT
+        internet_deadline = config.INTERNET_TIMEOUT + config.DIAG_LAYER_TIMEOUT + 1  # Гонка, затем HTTP-проверка
+        check_link = PROBE_INTERFACE in due or PROBE_SCAN in due
+        check_internet = PROBE_INTERNET in due
+
+        # 1. Снимок netsh и проверка интернета независимы — запускаем одновременно
+        refresh = with_deadline(monitor.refresh_async(force=True, scan=PROBE_SCAN in due,
+                                                      survey=self._survey and PROBE_SCAN in due),
+                                snapshot_deadline, None) if check_link else None
+        internet = with_deadline(monitor.check_internet_async(),
+                                 internet_deadline, False) if check_internet else None
+        if refresh is not None and internet is not None:
+            snapshot, has_internet = await asyncio.gather(refresh, internet)
+        else:
+            # Одна проверка — без gather, который обернул бы её в отдельную задачу
+            snapshot = await refresh if refresh is not None else None
+            has_internet = await internet if internet is not None else None
+
+        # Видимость сети из сохранённого состояния действует только в первом опросе
+        assumed = check_link and monitor.engine.assume_visible
+        if check_link:
+            monitor.engine.assume_visible = False
+
+        # Состояние связи опрошено в этом такте (в такте только проверки интернета оно из прошлого опроса)
+        fresh = check_link and snapshot is not None
+        if fresh:
+            if not snapshot.scan_skipped:
+                self._survey = False
+            interface = snapshot.interface
+            scheduler.observe_link(monitor.connected, monitor.ssid_available,
+                                   interface.signal if interface else None)
+        if check_internet:
+            self.has_internet = has_internet
+            scheduler.observe_internet(has_internet)
+        scheduler.completed(due)
+        if (fresh and monitor.connected and self.has_internet
+                and not monitor.backend.has_ip_lease(snapshot.interface.name if snapshot.interface else None)):
+            # Адрес пропал (DHCP) — интернет проверяем в следующем такте, не дожидаясь его интервала
+            scheduler.request(PROBE_INTERNET)
+
+        if monitor.ssid_available:
+            # 2. Проверяем, подключены ли мы к ней
+            if monitor.connected:
+                if not self.has_internet:
+                    # Выясняем, какой уровень отказал, и исправляем только его
+                    state, status = await self._diagnose(fresh)
+                if self.has_internet:
+                    self._remedies.clear()
+                    state, status = LinkState.ONLINE, f"Подключено к {monitor.ssid}, интернет доступен"
+                if state in (LinkState.ONLINE, LinkState.NO_INTERNET):
+                    # Сигнал падает — уходим на другую точку, пока связь ещё есть
+                    state, status = await self._check_quality(state, status)
+
+                # Проверяем роутер (раз в заданный интервал) в фоне, не задерживая такт
+                current_time = monitor.backend.wall()
+                if (current_time - self.last_router_check > self.router_check_interval
+                        and not monitor.router.busy):
+                    self.last_router_check = current_time
+                    self._emit(LinkState.INFO, "Проверка роутера...")
+                    self._router_task = asyncio.ensure_future(self._check_router())
+
+            elif assumed:
+                # Тёплый старт: одна попытка без сканирования, при неудаче — обычный путь со сканированием
+                self._emit(LinkState.CONNECTING, f"Подключаюсь к {monitor.ssid} по сохранённому состоянию...")
+                state, status = await self._reconnect(attempts=1)
+                if state is not LinkState.CONNECTED:
+                    state = LinkState.CONNECTING
+                    status = f"Сеть {monitor.ssid} не подключилась сразу, сканирую эфир..."
+
+            elif monitor.reconnect.retry_in() > 0:
+                # Цикл попыток не удался: следующий — после задержки, с опросом интерфейса к её концу
+                state, status = LinkState.ERROR, monitor.reconnect.status
+                scheduler.request_at(PROBE_INTERFACE, monitor.reconnect.retry_at)
+
+            elif not self._can_reconnect(fresh):
+                state, status = LinkState.CONNECTING, f"Сеть {monitor.ssid} доступна, проверяю подключение..."
+
+            else:
+                # Сеть доступна, но не подключены - пытаемся подключиться
+                self._emit(LinkState.CONNECTING, f"Обнаружена сеть {monitor.ssid}, подключаюсь...")
+                state, status = await self._reconnect()
+
+        else:
+            # Наша сеть недоступна
+            state, status = LinkState.NOT_FOUND, f"Сеть {monitor.ssid} не обнаружена"
+
+        scheduler.charge(monitor.engine.spawn_count)
+        self.budget = scheduler.stats()  # Новый словарь целиком: читатели не видят его изменений
+        if state is LinkState.ONLINE:
+            if self.startup_time is None:
+                self._verified()
+            self._persist()
+
+        # Образец такта в историю метрик
+        interface, rtt = self._observed()
+        monitor.metrics.record(
+            state, signal=interface.signal if interface is not None else None,
+            rx_rate=interface.rx_rate if interface is not None else None,
+            tx_rate=interface.tx_rate if interface is not None else None,
+            rtt=rtt if self.has_internet else None, timestamp=monitor.backend.wall())
+        if self.uptime_window is not None:
+            # Запрос к истории — здесь, в потоке цикла, который её и пишет
+            now = self.clock()
+            if self._uptime_at is None or now - self._uptime_at >= config.UPTIME_REFRESH:
+                self._uptime_at = now
+                self.uptime = monitor.metrics.uptime(self.uptime_window, now=monitor.backend.wall())
+
+        # Отправляем статус
+        self._emit(state, status)
+
+    def _can_reconnect(self, fresh):
+        """Можно ли переподключаться в этом такте: снимок интерфейса свежий и бюджет не исчерпан.
+
+        Иначе опрос интерфейса запрашивается на ближайший такт (due() откладывает
+        его до освобождения бюджета), и решение принимается уже по нему.
+        """
+        if fresh and not self.scheduler.over_budget():
+            return True
+        self.scheduler.request(PROBE_INTERFACE)
+        return False
+
+    async def _reconnect(self, attempts=None):
+        """Полное переподключение; после него все проверки снова с минимальным интервалом"""
+        with span("reconnect") as reconnect:
+            success, message = await self.monitor.connect_to_wifi_async(
+                on_progress=lambda text: self._emit(LinkState.CONNECTING, text), attempts=attempts)
+            reconnect.set(success=success)
+        self.expedite()
+        return (LinkState.CONNECTED if success else LinkState.ERROR), f"{message}"
+
+    def expedite(self):
+        """Состояние изменилось — все проверки снова с минимальным интервалом, начиная с ближайшего такта"""
+        for name in self.scheduler.schedules:
+            self.scheduler.request(name)
+        if self._wake is not None:
+            self._wake.set()
+
+    def request_survey(self):
+        """Следующее сканирование — и при подключении, чтобы увидеть соседние точки и сети"""
+        if not self._survey:
+            self._survey = True
+            self.scheduler.request(PROBE_SCAN)
+            if self._wake is not None:
+                self._wake.set()
+
+    async def _check_quality(self, state, status):
+        """Прогноз разрыва по тренду сигнала (link_quality); возвращает итоговые состояние и статус"""
+        monitor = self.monitor
+        assessment = monitor.quality.assess()
+        if assessment.action is None:
+            return state, status
+        if assessment.action == ACTION_SURVEY:
+            # Для выбора точки нужен свежий скан соседних точек доступа
+            self.request_survey()
+            return state, status
+
+        self.journal.write("quality", **assessment.as_dict())
+        if assessment.action == ACTION_ROAM:
+            text = f"переход на точку {assessment.candidate}"
+        else:
+            text = "переподключаюсь"
+        self._emit(LinkState.CONNECTING, f"Сигнал падает ({assessment.describe()}), {text}...")
+        monitor.quality.acted()
+        with span("roam", action=assessment.action) as roam:
+            success, message = await monitor.roam_async(
+                assessment.candidate if assessment.action == ACTION_ROAM else None,
+                on_progress=lambda text: self._emit(LinkState.CONNECTING, text))
+            roam.set(success=success)
+        self.expedite()
+        return (LinkState.CONNECTED if success else LinkState.ERROR), f"{message}"
+
+    async def _diagnose(self, fresh):
+        """Подключены, но интернета нет: диагностика по уровням и исправление отказавшего.
+
+        Повторный отказ уровня после обновления адреса DHCP (по истечении
+        DIAG_REMEDY_COOLDOWN) приводит к полному переподключению — только по
+        свежему снимку интерфейса (fresh) и в пределах бюджета; кэш DNS
+        сбрасывается один раз за отказ.
+        """
+        monitor = self.monitor
+        no_internet = f"Подключено к {monitor.ssid}, но нет интернета"
+        diagnosis = await with_deadline(monitor.diagnose_async(), config.DIAG_LAYER_TIMEOUT + 1, None)
+        if diagnosis is None:
+            return LinkState.NO_INTERNET, no_internet
+
+        self.journal.write("diagnosis", failed=diagnosis.failed, remedy=diagnosis.remedy,
+                           layers=diagnosis.as_dict(), portal=diagnosis.portal,
+                           elapsed=round(diagnosis.elapsed, 3))
+        if diagnosis.ok:
+            # Все уровни в порядке, включая HTTP — проверка интернета ошиблась
+            self.has_internet = True
+            return LinkState.ONLINE, ""
+        if diagnosis.captive_portal:
+            return LinkState.CAPTIVE_PORTAL, f"Подключено к {monitor.ssid}, {diagnosis.describe()}"
+
+        status = f"{no_internet}: {diagnosis.describe()}"
+        remedy = diagnosis.remedy
+        if remedy == REMEDY_RENEW_LEASE and remedy in self._remedies:
+            remedy = REMEDY_RECONNECT  # Обновление адреса уже не помогло
+        elif remedy == REMEDY_FLUSH_DNS and remedy in self._remedies:
+            remedy = None  # Кэш уже сброшен: если резолвер не отвечает, повтор не поможет
+        now = self.clock()
+        if remedy is None or now - self._remedies.get(remedy, -math.inf) < config.DIAG_REMEDY_COOLDOWN:
+            return LinkState.NO_INTERNET, status
+        if remedy == REMEDY_RECONNECT and monitor.reconnect.retry_in() > 0:
+            return LinkState.NO_INTERNET, status  # Прошлый цикл попыток не удался — ждём его задержку
+        if remedy == REMEDY_RECONNECT and not self._can_reconnect(fresh):
+            return LinkState.NO_INTERNET, status
+        self._remedies[remedy] = now
+
+        if remedy == REMEDY_RECONNECT:
+            self._emit(LinkState.CONNECTING, f"{status}; переподключаюсь...")
+            monitor.diagnosis.invalidate()
+            return await self._reconnect()
+
+        self._emit(LinkState.NO_INTERNET, f"{status}; {_REMEDY_LABELS[remedy]}...")
+        await monitor.remedy_async(remedy)
+        self.expedite()
+        return LinkState.NO_INTERNET, status
+
+    async def _check_router(self):
+        """Ждёт проверку роутера в его потоке; в лог попадают только изменения"""
+        status = await self.monitor.router.check()
+        self.journal.write("router", wan_up=status.wan_up, wan_ip=status.wan_ip, uptime=status.uptime,
+                           clients=status.clients, error=status.error)
+        report = status.describe()
+        if report != self._router_report:
+            self._router_report = report
+            self._emit(LinkState.INFO, report)
+
+    def _observed(self):
+        """Последние известные интерфейс и RTT проверки интернета"""
+        snapshot = self.monitor.engine.last_snapshot
+        interface = snapshot.interface if snapshot is not None else None
+        result = self.monitor.reachability.last_result
+        return interface, result.rtt if result is not None else None
+
+    def _emit(self, state, message):
+        """Публикует состояние, если это переход или подошёл heartbeat"""
+        interface, rtt = self._observed()
+        SIGNAL.set(interface.signal if interface is not None else None)
+        current = MonitorState(
+            state, self.monitor.ssid, message,
+            signal=interface.signal if interface is not None else None,
+            rtt=rtt, timestamp=self.monitor.backend.wall())
+        publish, changed = self.publisher.offer(current)
+        if changed:
+            self.journal.write("state", state=state.value, ssid=current.ssid, message=message,
+                               signal=current.signal, rtt=current.rtt)
+        if publish:
+            self.on_state(current, changed)
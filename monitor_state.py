@@ -0,0 +1,94 @@
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+import config
+
+
+class LinkState(Enum):
+    """Состояние подключения, которое видит пользователь"""
+
+    ONLINE = "online"  # Подключено, интернет доступен
+    NO_INTERNET = "no_internet"  # Подключено, но интернета нет
+    CONNECTED = "connected"  # Подключение выполнено, интернет ещё не проверен
+    CONNECTING = "connecting"  # Идёт подключение
+    NOT_FOUND = "not_found"  # Сеть не обнаружена
+    ERROR = "error"  # Ошибка мониторинга или неудачное подключение
+    INFO = "info"  # Служебное сообщение (проверка роутера и т.п.)
+    # Новые состояния — только в конец: порядок задаёт коды в истории метрик
+    CAPTIVE_PORTAL = "captive_portal"  # Подключено, но нужен вход на странице портала
+
+
+@dataclass(frozen=True)
+class MonitorState:
+    """Результат такта мониторинга.
+
+    message — готовая строка для лога; signal (%) и rtt (с) — последние
+    известные значения, они меняются на каждом такте и переходом не считаются.
+    """
+
+    state: LinkState
+    ssid: str
+    message: str
+    signal: Optional[int] = None
+    rtt: Optional[float] = None
+    timestamp: float = 0.0
+
+    @property
+    def connected(self):
+        return self.state in (LinkState.ONLINE, LinkState.NO_INTERNET, LinkState.CONNECTED,
+                              LinkState.CAPTIVE_PORTAL)
+
+    def same_as(self, other):
+        """Совпадают ли состояния без учёта signal, rtt и времени"""
+        return (other is not None and self.state == other.state
+                and self.ssid == other.ssid and self.message == other.message)
+
+
+class StatePublisher:
+    """Пропускает состояние дальше только при переходе или раз в heartbeat секунд"""
+
+    def __init__(self, heartbeat=None, clock=time.monotonic):
+        self.heartbeat = config.STATE_HEARTBEAT_INTERVAL if heartbeat is None else heartbeat
+        self.clock = clock
+        self.last = None
+        self.published = 0
+        self.suppressed = 0
+        self._last_publish = 0.0
+
+    def offer(self, state):
+        """Возвращает (публиковать ли, является ли это переходом)"""
+        changed = not state.same_as(self.last)
+        self.last = state
+        now = self.clock()
+        if not changed and now - self._last_publish < self.heartbeat:
+            self.suppressed += 1
+            return False, False
+        self._last_publish = now
+        self.published += 1
+        return True, changed
+
+
+class StateQueue:
+    """Передача состояний между потоками с объединением пачек.
+
+    push() вызывается потоком мониторинга и возвращает True только для
+    первого состояния в пустой очереди — лишь тогда нужно будить GUI.
+    GUI забирает всё накопленное одним drain().
+    """
+
+    def __init__(self):
+        self._items = []
+        self._lock = threading.Lock()
+
+    def push(self, state, changed):
+        with self._lock:
+            self._items.append((state, changed))
+            return len(self._items) == 1
+
+    def drain(self):
+        with self._lock:
+            items, self._items = self._items, []
+        return items
@@ -0,0 +1,368 @@
+import os
+import re
+
+# Кодировки, в которых netsh может вернуть вывод: UTF-8 (chcp 65001),
+# OEM-страницы русской и западноевропейской консоли, ANSI-страницы
+CANDIDATE_ENCODINGS = ('utf-8', 'cp866', 'cp850', 'cp1251', 'cp1252')
+
+# Строка вида "    Метка    : значение" (метка до первого двоеточия)
+_FIELD_RE = re.compile(r'^\s*([^:\r\n]+?)\s*:\s?(.*?)\s*$')
+# Нумерованные заголовки блоков из `show networks`: "SSID 1 : Home", "BSSID 2 : aa:bb:..."
+_SSID_HEADER_RE = re.compile(r'^SSID\s+\d+\s*:\s?(.*?)\s*$')
+_BSSID_HEADER_RE = re.compile(r'^\s+BSSID\s+\d+\s*:\s*(.*?)\s*$')
+_LEADING_INT_RE = re.compile(r'-?\d+')
+_LEADING_FLOAT_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+# Локализованные метки netsh -> каноническое имя поля.
+# Сравнение идёт по метке без суффикса единиц измерения, в нижнем регистре.
+_LABELS = {
+    # English
+    'name': 'name',
+    'description': 'description',
+    'guid': 'guid',
+    'physical address': 'mac',
+    'state': 'state',
+    'ssid': 'ssid',
+    'bssid': 'bssid',
+    'network type': 'network_type',
+    'radio type': 'radio_type',
+    'authentication': 'auth',
+    'cipher': 'cipher',
+    'encryption': 'cipher',
+    'connection mode': 'connection_mode',
+    'channel': 'channel',
+    'receive rate': 'rx_rate',
+    'transmit rate': 'tx_rate',
+    'signal': 'signal',
+    'profile': 'profile',
+    # Русский
+    'имя': 'name',
+    'описание': 'description',
+    'физический адрес': 'mac',
+    'состояние': 'state',
+    'тип сети': 'network_type',
+    'тип радио': 'radio_type',
+    'тип радиомодуля': 'radio_type',
+    'проверка подлинности': 'auth',
+    'шифр': 'cipher',
+    'шифрование': 'cipher',
+    'режим подключения': 'connection_mode',
+    'канал': 'channel',
+    'скорость приема': 'rx_rate',
+    'скорость приёма': 'rx_rate',
+    'скорость передачи': 'tx_rate',
+    'сигнал': 'signal',
+    'профиль': 'profile',
+    # Deutsch
+    'beschreibung': 'description',
+    'physische adresse': 'mac',
+    'status': 'state',
+    'netzwerktyp': 'network_type',
+    'funktyp': 'radio_type',
+    'authentifizierung': 'auth',
+    'verschlüsselung': 'cipher',
+    'verbindungsmodus': 'connection_mode',
+    'kanal': 'channel',
+    'empfangsrate': 'rx_rate',
+    'übertragungsrate': 'tx_rate',
+    'profil': 'profile',
+}
+
+# Локализованные значения состояния интерфейса -> каноническое
+_STATES = {
+    'connected': 'connected',
+    'disconnected': 'disconnected',
+    'disconnecting': 'disconnecting',
+    'associating': 'associating',
+    'authenticating': 'authenticating',
+    'discovering': 'discovering',
+    'подключено': 'connected',
+    'отключено': 'disconnected',
+    'отключение': 'disconnecting',
+    'связывание': 'associating',
+    'проверка подлинности': 'authenticating',
+    'обнаружение': 'discovering',
+    'verbunden': 'connected',
+    'getrennt': 'disconnected',
+    'wird getrennt': 'disconnecting',
+    'zuordnung': 'associating',
+    'authentifizierung': 'authenticating',
+    'erkennung': 'discovering',
+}
+
+STATE_CONNECTED = 'connected'
+
+# Начала локализованных сообщений об ошибке netsh (в нижнем регистре).
+# В интерактивном режиме кода возврата нет, отказ виден только по тексту
+_ERRORS = (
+    # English
+    'the following command was not found',
+    'there is no wireless interface',
+    'there is no such wireless interface',
+    'the wireless autoconfig service',
+    'profile "',  # ... is not found on any interface
+    'there is no profile',
+    'the parameter is incorrect',
+    'one or more parameters for the command are not correct',
+    'connection request failed',
+    'the network connection profile is corrupted',
+    'element not found',
+    'access is denied',
+    'an attempt was made to reference a token',
+    'error',
+    # Русский
+    'следующая команда не найдена',
+    'в системе нет беспроводного интерфейса',
+    'нет такого беспроводного интерфейса',
+    'служба автонастройки беспроводной сети',
+    'профиль "',
+    'профиль с именем',
+    'параметр задан неверно',
+    'один или несколько параметров команды',
+    'сбой запроса на подключение',
+    'профиль подключения к сети поврежден',
+    'элемент не найден',
+    'отказано в доступе',
+    'ошибка',
+    # Deutsch
+    'der folgende befehl wurde nicht gefunden',
+    'auf dem system ist keine drahtlosschnittstelle',
+    'der parameter ist falsch',
+    'fehler',
+)
+# Строки с этими словами — сообщения об успехе, даже если начинаются как ошибка ('Profile "x" is added ...')
+_SUCCESS = ('successfully', 'is added', 'is deleted', 'успешно', 'добавлен', 'удален', 'удалён',
+            'erfolgreich', 'hinzugefügt', 'gelöscht')
+
+
+def _label_key(label):
+    """Нормализует метку: убирает единицы "(Mbps)" / "(Мбит/с)" и регистр"""
+    paren = label.find('(')
+    if paren != -1:
+        label = label[:paren]
+    return label.strip().lower()
+
+
+def _to_int(value):
+    """Первое целое число из строки ("93%" -> 93), иначе None"""
+    match = _LEADING_INT_RE.search(value)
+    return int(match.group()) if match else None
+
+
+def _to_float(value):
+    """Первое число из строки ("866.7" / "866,7" -> 866.7), иначе None"""
+    match = _LEADING_FLOAT_RE.search(value)
+    return float(match.group().replace(',', '.')) if match else None
+
+
+class InterfaceInfo:
+    """Состояние одного беспроводного интерфейса из `netsh wlan show interfaces`"""
+
+    __slots__ = ('name', 'description', 'guid', 'mac', 'state', 'ssid', 'bssid',
+                 'network_type', 'radio_type', 'auth', 'cipher', 'connection_mode',
+                 'channel', 'rx_rate', 'tx_rate', 'signal', 'profile')
+
+    def __init__(self):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+
+    @property
+    def is_connected(self):
+        return self.state == STATE_CONNECTED
+
+    def __repr__(self):
+        return (f"InterfaceInfo(name={self.name!r}, state={self.state!r}, ssid={self.ssid!r}, "
+                f"bssid={self.bssid!r}, signal={self.signal!r}, channel={self.channel!r})")
+
+
+class BssidInfo:
+    """Одна точка доступа (BSSID) сети из `netsh wlan show networks mode=bssid`"""
+
+    __slots__ = ('bssid', 'signal', 'radio_type', 'channel')
+
+    def __init__(self, bssid):
+        self.bssid = bssid
+        self.signal = None
+        self.radio_type = None
+        self.channel = None
+
+    def __repr__(self):
+        return f"BssidInfo(bssid={self.bssid!r}, signal={self.signal!r}, channel={self.channel!r})"
+
+
+class NetworkInfo:
+    """Видимая сеть (SSID) из `netsh wlan show networks`"""
+
+    __slots__ = ('ssid', 'network_type', 'auth', 'cipher', 'bssids')
+
+    def __init__(self, ssid):
+        self.ssid = ssid
+        self.network_type = None
+        self.auth = None
+        self.cipher = None
+        self.bssids = []
+
+    @property
+    def best_signal(self):
+        """Лучший уровень сигнала среди BSSID сети, либо None"""
+        signals = [b.signal for b in self.bssids if b.signal is not None]
+        return max(signals) if signals else None
+
+    def __repr__(self):
+        return f"NetworkInfo(ssid={self.ssid!r}, auth={self.auth!r}, bssids={len(self.bssids)})"
+
+
+def _oem_encoding():
+    """OEM-кодировка консоли Windows (в ней netsh пишет в канал), иначе None"""
+    if os.name != 'nt':
+        return None
+    try:
+        import ctypes
+        return f"cp{ctypes.windll.kernel32.GetOEMCP()}"
+    except Exception:
+        return None
+
+
+OEM_ENCODING = _oem_encoding()
+
+
+def _label_score(text):
+    """Количество строк с узнаваемыми метками netsh"""
+    score = 0
+    for line in text.splitlines():
+        match = _FIELD_RE.match(line)
+        if match and _label_key(match.group(1)) in _LABELS:
+            score += 1
+    return score
+
+
+def decode_output(data):
+    """Декодирует байтовый вывод netsh, подбирая кодировку по узнаваемым меткам"""
+    if isinstance(data, str):
+        return data
+
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+
+    # Обычный случай на Windows: вывод в OEM-кодировке системы
+    if OEM_ENCODING is not None:
+        try:
+            text = data.decode(OEM_ENCODING)
+            if _label_score(text) > 0:
+                return text
+        except (UnicodeDecodeError, LookupError):
+            pass
+
+    best_text, best_score = None, -1
+    for encoding in CANDIDATE_ENCODINGS[1:]:
+        text = data.decode(encoding, errors='replace')
+        score = _label_score(text)
+        if score > best_score:
+            best_text, best_score = text, score
+    return best_text
+
+
+def command_error(output):
+    """Первая строка вывода команды netsh с сообщением об ошибке или None"""
+    for line in decode_output(output).splitlines():
+        lowered = line.strip().lower()
+        if lowered.startswith(_ERRORS) and not any(word in lowered for word in _SUCCESS):
+            return line.strip()
+    return None
+
+
+def _apply_interface_field(info, key, value):
+    if key in ('channel', 'signal'):
+        setattr(info, key, _to_int(value))
+    elif key in ('rx_rate', 'tx_rate'):
+        setattr(info, key, _to_float(value))
+    elif key == 'state':
+        lowered = value.lower()
+        info.state = _STATES.get(lowered, lowered)
+    elif key == 'bssid':
+        info.bssid = value.lower()
+    else:
+        setattr(info, key, value)
+
+
+def parse_interfaces(output):
+    """Разбирает `netsh wlan show interfaces` в список InterfaceInfo"""
+    text = decode_output(output)
+    interfaces = []
+    current = None
+
+    for line in text.splitlines():
+        match = _FIELD_RE.match(line)
+        if not match:
+            continue
+        key = _LABELS.get(_label_key(match.group(1)))
+        if key is None:
+            continue
+        value = match.group(2)
+
+        # Каждый интерфейс начинается с поля "Имя" / "Name"
+        if key == 'name' or current is None:
+            current = InterfaceInfo()
+            interfaces.append(current)
+        _apply_interface_field(current, key, value)
+
+    return interfaces
+
+
+def parse_networks(output):
+    """Разбирает `netsh wlan show networks [mode=bssid]` в список NetworkInfo"""
+    text = decode_output(output)
+    networks = []
+    network = None
+    bssid = None
+
+    for line in text.splitlines():
+        header = _SSID_HEADER_RE.match(line)
+        if header:
+            network = NetworkInfo(header.group(1))
+            networks.append(network)
+            bssid = None
+            continue
+        if network is None:
+            continue
+
+        header = _BSSID_HEADER_RE.match(line)
+        if header:
+            bssid = BssidInfo(header.group(1).lower())
+            network.bssids.append(bssid)
+            continue
+
+        match = _FIELD_RE.match(line)
+        if not match:
+            continue
+        key = _LABELS.get(_label_key(match.group(1)))
+        if key is None:
+            continue
+        value = match.group(2)
+
+        if bssid is not None and key in ('signal', 'channel'):
+            setattr(bssid, key, _to_int(value))
+        elif bssid is not None and key == 'radio_type':
+            bssid.radio_type = value
+        elif key in ('network_type', 'auth', 'cipher'):
+            setattr(network, key, value)
+
+    return networks
+
+
+def find_network(networks, ssid):
+    """Точный поиск сети по SSID (без совпадения подстрок вроде "Home" / "Home-Guest")"""
+    for network in networks:
+        if network.ssid == ssid:
+            return network
+    return None
+
+
+def connected_interface(interfaces, ssid=None):
+    """Первый подключённый интерфейс (при заданном ssid — подключённый именно к нему)"""
+    for info in interfaces:
+        if info.is_connected and (ssid is None or info.ssid == ssid):
+            return info
+    return None
@@ -0,0 +1,229 @@
+import asyncio
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import config
+from backend import SystemBackend
+from netsh_parser import (InterfaceInfo, NetworkInfo, connected_interface, find_network,
+                          parse_interfaces, parse_networks)
+
+
+@dataclass(frozen=True)
+class NetworkSnapshot:
+    """Неизменяемый снимок состояния Wi-Fi за один такт мониторинга"""
+
+    timestamp: float
+    current_ssid: Optional[str]
+    is_connected: bool
+    ssid_visible: bool
+    scan_skipped: bool
+    interfaces: Tuple[InterfaceInfo, ...] = ()
+    networks: Optional[Tuple[NetworkInfo, ...]] = None
+
+    @property
+    def interface(self):
+        """Интерфейс, подключённый к сети (или первый найденный), либо None"""
+        return connected_interface(self.interfaces) or (self.interfaces[0] if self.interfaces else None)
+
+    def age(self, now=None):
+        """Возраст снимка в секундах"""
+        return (now if now is not None else time.monotonic()) - self.timestamp
+
+
+class ProbeEngine:
+    """Собирает `show interfaces` и `show networks` в один снимок с TTL-кэшем.
+
+    Все запуски netsh асинхронные (через backend, по умолчанию
+    backend.SystemBackend) и имеют собственный дедлайн; при отмене задачи
+    процесс netsh завершается. Если передана session (command_session.CommandSession), запросы
+    `show` и команды netsh из command() выполняются в ней без запуска нового процесса. interface
+    ограничивает снимок одним адаптером; с hub (supervisor.ScanHub)
+    результаты `show` разделяются со всеми мониторами процесса.
+    """
+
+    def __init__(self, ssid: str, ttl: float = None, session=None, interface=None, hub=None, backend=None):
+        self.ssid = ssid
+        self.backend = backend or SystemBackend()
+        self.clock = self.backend.clock
+        self.ttl = config.SNAPSHOT_TTL if ttl is None else ttl
+        self.session = session
+        self.interface = interface
+        self.hub = hub
+        self.direct_spawns = 0
+        self.scan_count = 0
+        self.scan_skipped_count = 0
+        self.snapshot_count = 0
+        self.cache_hits = 0
+        self.timeout_count = 0
+        self.last_snapshot = None  # Последний снимок, invalidate() его не сбрасывает
+        self.assume_visible = False  # Видимость сети, пока нет снимка со сканированием (тёплый старт)
+        self._snapshot = None
+        self._pending = {}  # (scan, survey) -> задача идущего опроса
+
+    async def run(self, args, timeout=None):
+        """Запускает netsh и учитывает запуск процесса в статистике.
+
+        Вывод возвращается байтами: кодировку определяет netsh_parser.
+        По истечении timeout процесс убивается и выбрасывается TimeoutExpired.
+        """
+        self.direct_spawns += 1
+        try:
+            return await self.backend.run(args, timeout)
+        except subprocess.TimeoutExpired:
+            self.timeout_count += 1
+            raise
+
+    async def command(self, args, timeout=None):
+        """Команда netsh: в сессии команд, если она есть (без запуска процесса), иначе через run().
+
+        Отказ netsh в сессии виден по ненулевому коду возврата, как и у процесса.
+        """
+        if self.session is not None and args and args[0] == "netsh":
+            return await self.session.run(args, timeout=timeout)
+        return await self.run(args, timeout)
+
+    async def aclose(self):
+        """Освобождает сессию команд (её процесс привязан к текущему циклу событий)"""
+        if self.session is not None:
+            await self.session.aclose()
+
+    @property
+    def spawn_count(self):
+        """Все запуски процессов: прямые и перезапуски сессии команд"""
+        return self.direct_spawns + (self.session.spawn_count if self.session else 0)
+
+    def invalidate(self):
+        """Сбрасывает кэш, следующий вызов snapshot() опросит netsh заново"""
+        self._snapshot = None
+
+    async def snapshot(self, force=False, scan=True, survey=False):
+        """Возвращает актуальный снимок, при необходимости опрашивая netsh.
+
+        Параллельные вызовы внутри одного такта ждут один общий опрос, если
+        он не беднее запрошенного (опрос без сканирования не отвечает на
+        запрос со сканированием). При scan=False эфир не сканируется:
+        видимость сети берётся из последнего снимка, в том числе сброшенного
+        invalidate() (без него — assume_visible). survey=True
+        сканирует эфир и при подключении к нашей сети — чтобы увидеть
+        соседние точки доступа.
+        """
+        cached = self._snapshot
+        if not force and cached is not None and cached.age(self.clock()) < self.ttl:
+            self.cache_hits += 1
+            return cached
+
+        key = (scan, survey)
+        pending = next((task for (pending_scan, pending_survey), task in self._pending.items()
+                        if (pending_scan or not scan) and (pending_survey or not survey)), None)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._collect(scan, survey))
+            pending.add_done_callback(lambda future: self._collected(key, future))
+        else:
+            self.cache_hits += 1
+        return await asyncio.shield(pending)
+
+    def _collected(self, key, future):
+        """Сохраняет результат завершившегося опроса в кэш"""
+        if self._pending.get(key) is future:
+            del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self._snapshot = self.last_snapshot = future.result()
+            self.snapshot_count += 1
+
+    async def _collect(self, allow_scan=True, survey=False):
+        """Опрашивает интерфейсы и, только если нужно, сканирует эфир"""
+        interfaces = await self.poll_interfaces()
+        active = connected_interface(interfaces, self.ssid) or connected_interface(interfaces)
+        current_ssid = active.ssid if active else None
+        is_connected = active is not None
+
+        # Уже подключены к нужной сети — сканирование эфира ничего не добавит
+        if is_connected and current_ssid == self.ssid and not survey:
+            self.scan_skipped_count += 1
+            return NetworkSnapshot(
+                timestamp=self.clock(),
+                current_ssid=current_ssid,
+                is_connected=True,
+                ssid_visible=True,
+                scan_skipped=True,
+                interfaces=interfaces,
+            )
+
+        if not allow_scan:
+            # Видимость — из последнего снимка: после invalidate() сеть не «пропадает»
+            previous = self.last_snapshot
+            if previous is None:
+                visible = self.assume_visible
+            elif previous.networks is not None:
+                visible = find_network(previous.networks, self.ssid) is not None  # И после retarget()
+            else:
+                visible = previous.ssid_visible
+            self.scan_skipped_count += 1
+            return NetworkSnapshot(
+                timestamp=self.clock(),
+                current_ssid=current_ssid,
+                is_connected=is_connected,
+                ssid_visible=visible,
+                scan_skipped=True,
+                interfaces=interfaces,
+                networks=previous.networks if previous else None,
+            )
+
+        networks = await self._networks()
+        self.scan_count += 1
+        return NetworkSnapshot(
+            timestamp=self.clock(),
+            current_ssid=current_ssid,
+            is_connected=is_connected,
+            ssid_visible=find_network(networks, self.ssid) is not None,
+            scan_skipped=False,
+            interfaces=interfaces,
+            networks=networks,
+        )
+
+    async def poll_interfaces(self):
+        """Опрашивает только `show interfaces` в обход кэша снимков (без сканирования)"""
+        if self.hub is not None:
+            interfaces = await self.hub.interfaces(self._query)
+        else:
+            interfaces = tuple(parse_interfaces(await self._query(["interfaces"], config.INTERFACE_TIMEOUT)))
+        if self.interface is not None:
+            interfaces = tuple(info for info in interfaces if info.name == self.interface)
+        return interfaces
+
+    async def _networks(self):
+        """Сканирование эфира (`show networks mode=bssid`) своего адаптера"""
+        if self.hub is not None:
+            return await self.hub.networks(self.interface, self._query)
+        view = ["networks", "mode=bssid"] + ([f"interface={self.interface}"] if self.interface else [])
+        return tuple(parse_networks(await self._query(view, config.SCAN_TIMEOUT)))
+
+    async def _query(self, view, timeout):
+        """Выполняет `netsh wlan show <view...>`, при ошибке возвращает пустой вывод"""
+        args = ["netsh", "wlan", "show", *view]
+        try:
+            result = await self.command(args, timeout)
+        except subprocess.TimeoutExpired:
+            return b""
+        except Exception as e:
+            print(f"Ошибка при выполнении netsh wlan show {' '.join(view)}: {e}")
+            return b""
+
+        if result.returncode != 0:
+            return b""
+        return result.stdout or b""
+
+    def stats(self):
+        """Статистика запусков процессов и использования кэша"""
+        return {
+            "spawns": self.spawn_count,
+            "snapshots": self.snapshot_count,
+            "scans": self.scan_count,
+            "scans_skipped": self.scan_skipped_count,
+            "cache_hits": self.cache_hits,
+            "timeouts": self.timeout_count,
+            **(self.session.stats() if self.session else {}),
+        }
+
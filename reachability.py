@@ -0,0 +1,219 @@
+import asyncio
+from collections import deque
+
+import config
+from tracing import span
+
+
+class Target:
+    """Цель проверки доступности: TCP-подключение к host:port"""
+
+    __slots__ = ('name', 'host', 'port')
+
+    def __init__(self, name, host, port):
+        self.name = name
+        self.host = host
+        self.port = port
+
+    def __repr__(self):
+        return f"Target({self.name!r}, {self.host!r}, {self.port!r})"
+
+
+class TargetStats:
+    """Скользящее окно результатов по одной цели: RTT, потери, джиттер"""
+
+    __slots__ = ('samples', 'attempts', 'failures', '_rto', '_stale')
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)  # RTT в секундах, None — потеря
+        self.attempts = 0
+        self.failures = 0
+        self._rto = None
+        self._stale = False  # Были попытки после расчёта _rto
+
+    def record(self, rtt):
+        self.attempts += 1
+        if rtt is None:
+            self.failures += 1
+        self.samples.append(rtt)
+        self._stale = True
+
+    def _rtts(self):
+        return [rtt for rtt in self.samples if rtt is not None]
+
+    @property
+    def rtt(self):
+        """Средний RTT по окну (секунды) или None"""
+        rtts = self._rtts()
+        return sum(rtts) / len(rtts) if rtts else None
+
+    @property
+    def loss(self):
+        """Доля неудачных попыток в окне (0..1)"""
+        if not self.samples:
+            return 0.0
+        return sum(1 for rtt in self.samples if rtt is None) / len(self.samples)
+
+    @property
+    def jitter(self):
+        """Средняя разница соседних RTT в окне (секунды)"""
+        rtts = self._rtts()
+        if len(rtts) < 2:
+            return 0.0
+        return sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (len(rtts) - 1)
+
+    @property
+    def rto(self):
+        """RTT + 4 * джиттер по окну (секунды) или None, если успешных попыток ещё не было.
+
+        Если в окне остались одни потери (долгий сбой), действует последнее
+        посчитанное значение: иначе каждая гонка до восстановления ждала бы
+        полный таймаут. Пересчитывается только после новых попыток.
+        """
+        if self._stale:
+            self._stale = False
+            rtt = self.rtt
+            if rtt is not None:
+                self._rto = rtt + 4 * self.jitter
+        return self._rto
+
+    def as_dict(self):
+        return {
+            "rtt": self.rtt,
+            "loss": self.loss,
+            "jitter": self.jitter,
+            "attempts": self.attempts,
+            "failures": self.failures,
+        }
+
+
+class ReachabilityResult:
+    """Итог одной гонки: какая цель ответила первой и за сколько"""
+
+    __slots__ = ('reachable', 'target', 'rtt', 'elapsed')
+
+    def __init__(self, reachable, target=None, rtt=None, elapsed=0.0):
+        self.reachable = reachable
+        self.target = target
+        self.rtt = rtt
+        self.elapsed = elapsed
+
+    def __bool__(self):
+        return self.reachable
+
+    def __repr__(self):
+        name = self.target.name if self.target else None
+        return f"ReachabilityResult(reachable={self.reachable}, target={name!r}, rtt={self.rtt!r})"
+
+
+class ReachabilityProber:
+    """Проверка доступности сети гонкой нескольких целей (в стиле happy eyeballs).
+
+    Цели запускаются по очереди с шагом stagger (или сразу после неудачи
+    предыдущей), первый успех выигрывает, остальные попытки отменяются.
+    Дедлайн гонки подстраивается под измеренный RTT, поэтому вывод
+    "нет интернета" делается за несколько RTT, а не за полный таймаут.
+    connect(host, port) открывает TCP-соединение (по умолчанию
+    asyncio.open_connection).
+    """
+
+    def __init__(self, targets=None, stagger=None, timeout=None, min_timeout=None, window=None,
+                 connect=None):
+        targets = config.INTERNET_TARGETS if targets is None else targets
+        self.targets = [t if isinstance(t, Target) else Target(*t) for t in targets]
+        self.stagger = config.REACHABILITY_STAGGER if stagger is None else stagger
+        self.timeout = config.INTERNET_TIMEOUT if timeout is None else timeout
+        self.min_timeout = config.REACHABILITY_MIN_TIMEOUT if min_timeout is None else min_timeout
+        window = config.REACHABILITY_WINDOW if window is None else window
+        self._stats = {target.name: TargetStats(window) for target in self.targets}
+        self.connect = connect or asyncio.open_connection
+        self.last_result = None
+
+    def deadline(self):
+        """Дедлайн гонки: RTT + 4 * джиттер лучшей цели, в пределах [min_timeout, timeout]"""
+        best = None
+        for stats in self._stats.values():
+            rto = stats.rto
+            if rto is None:
+                continue
+            if best is None or rto < best:
+                best = rto
+        if best is None:
+            return self.timeout
+        return min(self.timeout, max(self.min_timeout, best))
+
+    async def probe(self):
+        """Запускает гонку целей и возвращает ReachabilityResult.
+
+        Дедлайн общий для всей гонки: попытки, которые к нему не завершились,
+        отменяются и считаются потерями; завершившиеся учитывает _attempt().
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.deadline()
+        queue = list(self.targets)
+        running = {}
+
+        try:
+            while running or queue:
+                remaining = deadline - loop.time()
+                if remaining > 0:
+                    if queue:
+                        target = queue.pop(0)
+                        running[asyncio.ensure_future(self._attempt(target))] = target
+                    wait_for = min(self.stagger, remaining) if queue else remaining
+                    done, _ = await asyncio.wait(running, timeout=wait_for,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    # Дедлайн истёк: сначала забираем попытки, успевшие завершиться
+                    done = {task for task in running if task.done()}
+
+                for task in done:
+                    target = running.pop(task)
+                    rtt = task.result()
+                    if rtt is not None:
+                        self.last_result = ReachabilityResult(
+                            True, target, rtt, loop.time() - started)
+                        return self.last_result
+                if remaining <= 0:
+                    break
+
+            # Незавершённые попытки отменяются ниже и считаются потерями
+            for target in running.values():
+                self._stats[target.name].record(None)
+        finally:
+            # Проигравшие попытки отменяются; отмена закрывает их сокеты
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        self.last_result = ReachabilityResult(False, elapsed=loop.time() - started)
+        return self.last_result
+
+    async def _attempt(self, target):
+        """Одна попытка TCP-подключения; возвращает RTT или None.
+
+        Своего таймаута нет: по дедлайну гонки попытку отменяет probe().
+        Соединение закрывается без ожидания, чтобы отмена не пришлась
+        на уже учтённую попытку.
+        """
+        stats = self._stats[target.name]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with span("connect", target=target.name, host=target.host, port=target.port) as current:
+            try:
+                _, writer = await self.connect(target.host, target.port)
+            except OSError as e:
+                current.set(error=type(e).__name__)
+                stats.record(None)
+                return None
+
+        rtt = loop.time() - started
+        writer.close()
+        stats.record(rtt)
+        return rtt
+
+    def stats(self):
+        """Статистика по целям: {имя: {rtt, loss, jitter, attempts, failures}}"""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
@@ -0,0 +1,247 @@
+import asyncio
+import random
+import socket
+import time
+from collections import deque
+from enum import Enum
+
+import config
+from metrics_exporter import TIME_TO_RECOVER
+from netsh_parser import connected_interface
+from tracing import span
+
+try:
+    import psutil
+except ImportError:  # Без psutil адрес берётся по маршруту к шлюзу, а не с интерфейса Wi-Fi
+    psutil = None
+
+
+class ReconnectState(Enum):
+    """Этапы переподключения"""
+
+    IDLE = "idle"
+    ASSOCIATING = "associating"
+    AUTHENTICATING = "authenticating"
+    IP_ACQUIRED = "ip_acquired"
+    VERIFIED = "verified"
+    FAILED = "failed"
+
+
+# Состояния интерфейса из netsh_parser -> этап переподключения
+_INTERFACE_STATES = {
+    'discovering': ReconnectState.ASSOCIATING,
+    'associating': ReconnectState.ASSOCIATING,
+    'authenticating': ReconnectState.AUTHENTICATING,
+}
+
+
+def local_address(gateway=None):
+    """Адрес, с которого система пошла бы к шлюзу, или None, если маршрута нет.
+
+    UDP-сокет только выбирает маршрут, пакеты не отправляются.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((gateway or config.ROUTER_IP, 80))
+        return sock.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def _leased(address):
+    """Адрес выдан DHCP (не 0.0.0.0 и не APIPA 169.254.x.x)"""
+    return address is not None and address != "0.0.0.0" and not address.startswith("169.254.")
+
+
+def has_ip_lease(interface=None, gateway=None):
+    """Есть ли адрес у интерфейса Wi-Fi interface (имя из netsh).
+
+    Маршрут к шлюзу есть и через проводной адаптер, поэтому адрес берётся
+    с самого интерфейса (psutil). Без psutil, имени или если psutil такого
+    интерфейса не знает — адрес, с которого система пошла бы к шлюзу.
+    """
+    if interface and psutil is not None:
+        addresses = psutil.net_if_addrs().get(interface)
+        if addresses is not None:
+            return any(_leased(item.address) for item in addresses if item.family == socket.AF_INET)
+    return _leased(local_address(gateway))
+
+
+class ReconnectMachine:
+    """Переподключение как конечный автомат:
+    idle -> associating -> authenticating -> ip_acquired -> verified.
+
+    После команды connect состояние интерфейса опрашивается с коротким
+    интервалом, и успех фиксируется сразу, как только появился адрес.
+    Между неудачными попытками — экспоненциальная задержка со случайным
+    разбросом; она растёт и между циклами. Цикл — несколько попыток
+    (RECONNECT_ATTEMPTS): после неудачного цикла run() возвращается в такт,
+    а следующий цикл начнётся не раньше retry_at. Время восстановления
+    каждой успешной попытки сохраняется.
+    """
+
+    def __init__(self, monitor, clock=time.monotonic, sleep=asyncio.sleep, lease_check=has_ip_lease):
+        self.monitor = monitor
+        self.clock = clock
+        self.sleep = sleep
+        self.lease_check = lease_check
+        self.state = ReconnectState.IDLE
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.recovery_times = deque(maxlen=100)
+        self.streak = 0  # Неудачных попыток подряд, в том числе в прошлых циклах
+        self.retry_at = None  # Раньше этого времени новый цикл не начинается (None — сразу)
+        self.status = None  # Итог последнего неудачного цикла
+        self._abort = False
+
+    def abort(self):
+        """Прерывает текущий цикл после ближайшей попытки (например, сеть сменилась)"""
+        self._abort = True
+
+    def _set_state(self, state):
+        self.state = state
+
+    def backoff(self, attempt):
+        """Задержка перед следующей попыткой: экспонента с разбросом 50-100%"""
+        delay = min(config.RECONNECT_MAX_DELAY, config.RECONNECT_DELAY * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def retry_in(self):
+        """Сколько секунд до следующего цикла (0 — можно начинать)"""
+        return 0.0 if self.retry_at is None else max(0.0, self.retry_at - self.clock())
+
+    async def run(self, on_progress=None, attempts=None):
+        """Выполняет цикл из attempts попыток (по умолчанию RECONNECT_ATTEMPTS); возвращает (успех, сообщение).
+
+        Перед каждой следующей попыткой видимость сети проверяется заново:
+        если она пропала из эфира, цикл заканчивается сразу.
+        """
+        monitor = self.monitor
+        max_attempts = attempts or config.RECONNECT_ATTEMPTS
+        started = self.clock()
+        progress = on_progress or (lambda message: None)
+        self._abort = False
+        self.retry_at = None
+
+        for attempt in range(1, max_attempts + 1):
+            self.attempts += 1
+            with span("reconnect.attempt", attempt=attempt) as current:
+                try:
+                    failure = await self._attempt()
+                except Exception as e:
+                    failure = f"Ошибка: {str(e)}"
+                current.set(failure=failure, state=self.state.value)
+
+            if failure is None:
+                elapsed = self.clock() - started
+                self.successes += 1
+                self.streak = 0
+                self.recovery_times.append(elapsed)
+                TIME_TO_RECOVER.observe(elapsed)
+                monitor.journal.write("reconnect", ssid=monitor.ssid, attempt=attempt, result="success",
+                                      elapsed=round(elapsed, 3), state=self.state.value)
+                monitor.connected = True
+                monitor.ssid_available = True
+                # Снимок до подключения устарел — следующий такт опросит netsh заново
+                monitor.engine.invalidate()
+
+                message = f"Успешно подключено к {monitor.ssid} за {elapsed:.1f} с"
+                if self.state is not ReconnectState.VERIFIED:
+                    message += " (интернет не подтверждён)"
+                return True, message
+
+            self.failures += 1
+            self.streak += 1
+            monitor.journal.write("reconnect", ssid=monitor.ssid, attempt=attempt, result="failure",
+                                  reason=failure, state=self.state.value)
+            self._set_state(ReconnectState.FAILED)
+            progress(f"Попытка {attempt}/{max_attempts}: {failure}")
+
+            if self._abort or attempt == max_attempts:
+                break
+            delay = self.backoff(self.streak)
+            with span("reconnect.backoff", delay=delay):
+                await self.sleep(delay)
+            if self._abort:
+                break
+            # За время задержки сеть могла пропасть из эфира
+            await monitor.refresh_async(force=True)
+            if not monitor.ssid_available:
+                self._set_state(ReconnectState.IDLE)
+                return False, f"Сеть {monitor.ssid} пропала из эфира"
+
+        self._set_state(ReconnectState.IDLE)
+        if self._abort:
+            return False, "Переподключение прервано"
+        delay = self.backoff(self.streak)
+        self.retry_at = self.clock() + delay
+        self.status = f"Не удалось подключиться после {attempt} попыток, следующая через {delay:.0f} с"
+        return False, self.status
+
+    async def _attempt(self):
+        """Одна попытка; возвращает None при успехе или текст причины неудачи"""
+        monitor = self.monitor
+        engine = monitor.engine
+        self._set_state(ReconnectState.ASSOCIATING)
+
+        # Профиль переустанавливается, только если изменились его параметры
+        with span("profile.ensure"):
+            await monitor.profiles.ensure(engine, monitor.ssid, monitor.password)
+
+        args = ["netsh", "wlan", "connect", f"name={monitor.ssid}"]
+        if monitor.interface:
+            args.append(f"interface={monitor.interface}")
+        result = await engine.command(args)
+        if result.returncode != 0:
+            # Возможно, профиль удалили извне — в следующий раз установим заново
+            monitor.profiles.forget(monitor.ssid)
+            return "Ошибка команды подключения"
+
+        deadline = self.clock() + config.RECONNECT_ASSOCIATION_TIMEOUT
+        progressed = False
+        while self.clock() < deadline:
+            with span("reconnect.poll", state=self.state.value):
+                await self.sleep(config.RECONNECT_POLL_INTERVAL)
+                interfaces = await engine.poll_interfaces()
+
+            interface = connected_interface(interfaces, monitor.ssid)
+            if interface is not None:
+                if self.lease_check(interface.name):
+                    self._set_state(ReconnectState.IP_ACQUIRED)
+                    break
+                # Ассоциация есть, ждём адрес от DHCP
+                self._set_state(ReconnectState.AUTHENTICATING)
+                progressed = True
+                continue
+
+            info = interfaces[0] if interfaces else None
+            state = _INTERFACE_STATES.get(info.state) if info else None
+            if state is not None:
+                self._set_state(state)
+                progressed = True
+            elif progressed:
+                # Интерфейс вернулся в "отключено" после начала ассоциации
+                return "Не удалось установить соединение"
+        else:
+            return "Не удалось установить соединение"
+
+        with span("reconnect.verify"):
+            reachable = await monitor.reachability.probe()
+        if reachable:
+            self._set_state(ReconnectState.VERIFIED)
+        return None
+
+    def stats(self):
+        """Счётчики попыток и время восстановления (секунды)"""
+        times = self.recovery_times
+        return {
+            "reconnect_attempts": self.attempts,
+            "reconnect_successes": self.successes,
+            "reconnect_failures": self.failures,
+            "time_to_recover_last": times[-1] if times else None,
+            "time_to_recover_min": min(times) if times else None,
+            "time_to_recover_avg": sum(times) / len(times) if times else None,
+        }
@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import config
+from tracing import span
+
+
+@dataclass(frozen=True)
+class RouterStatus:
+    """Состояние роутера по данным веб-интерфейса"""
+
+    timestamp: float
+    wan_up: Optional[bool] = None
+    wan_ip: Optional[str] = None
+    uptime: Optional[int] = None  # секунды
+    clients: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def describe(self):
+        """Строка статуса для лога"""
+        if self.error is not None:
+            return f"Роутер: {self.error}"
+        parts = []
+        if self.wan_up is not None:
+            parts.append(f"WAN {'подключен' if self.wan_up else 'отключен'}"
+                         + (f" ({self.wan_ip})" if self.wan_ip else ""))
+        if self.uptime is not None:
+            parts.append(f"работает {self.uptime // 3600} ч {self.uptime % 3600 // 60} мин")
+        if self.clients is not None:
+            parts.append(f"клиентов DHCP: {self.clients}")
+        return "Роутер: " + (", ".join(parts) or "нет данных")
+
+
+class RouterAuthError(Exception):
+    """Роутер отклонил пароль администратора"""
+
+
+class RouterClient:
+    """Клиент веб-интерфейса роутера поверх одной keep-alive сессии requests.
+
+    Ответы кэшируются на ROUTER_CACHE_TTL секунд; после этого запрос
+    уходит с If-None-Match / If-Modified-Since, и на 304 используется
+    сохранённое тело. Вход выполняется один раз и повторяется только
+    когда роутер ответил 401/403 (сессия истекла).
+    """
+
+    def __init__(self, host=None, password=None, user=None, scheme=None, timeout=None,
+                 cache_ttl=None, clock=time.monotonic):
+        self.base_url = f"{scheme or config.ROUTER_SCHEME}://{host or config.ROUTER_IP}"
+        self.user = config.ROUTER_ADMIN_USER if user is None else user
+        self.password = config.ROUTER_ADMIN_PASSWORD if password is None else password
+        self.timeout = config.ROUTER_TIMEOUT if timeout is None else timeout
+        self.cache_ttl = config.ROUTER_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.clock = clock
+        self.logins = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.cache_hits = 0
+        self._session = None
+        self._authenticated = False
+        self._cache = {}  # путь -> (время получения, ETag, Last-Modified, данные)
+
+    def _ensure_session(self):
+        if self._session is None:
+            import requests  # Загружается только при первой проверке роутера
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            # Одно постоянное соединение на роутер
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def login(self):
+        """Вход в веб-интерфейс; cookie сессии сохраняется в requests.Session"""
+        session = self._ensure_session()
+        with span("router.login"):
+            self.logins += 1
+            self.requests += 1
+            response = session.post(self.base_url + config.ROUTER_LOGIN_PATH,
+                                    data={"username": self.user, "password": self.password},
+                                    timeout=self.timeout)
+        if response.status_code in (401, 403):
+            raise RouterAuthError("неверный пароль администратора")
+        response.raise_for_status()
+        self._authenticated = True
+
+    def get(self, path):
+        """JSON по пути веб-интерфейса с учётом кэша и условных запросов"""
+        cached = self._cache.get(path)
+        now = self.clock()
+        if cached is not None and now - cached[0] < self.cache_ttl:
+            self.cache_hits += 1
+            return cached[3]
+
+        if not self._authenticated:
+            self.login()
+        response = self._request(path, cached)
+        if response.status_code in (401, 403):
+            # Сессия истекла — входим заново и повторяем запрос один раз
+            self._authenticated = False
+            self.login()
+            response = self._request(path, cached)
+
+        if response.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            data = cached[3]
+        else:
+            response.raise_for_status()
+            data = response.json()
+        self._cache[path] = (now, response.headers.get("ETag", cached[1] if cached else None),
+                             response.headers.get("Last-Modified", cached[2] if cached else None), data)
+        return data
+
+    def _request(self, path, cached):
+        headers = {}
+        if cached is not None:
+            if cached[1]:
+                headers["If-None-Match"] = cached[1]
+            if cached[2]:
+                headers["If-Modified-Since"] = cached[2]
+        with span("router.get", path=path) as current:
+            self.requests += 1
+            response = self._ensure_session().get(self.base_url + path, headers=headers,
+                                                  timeout=self.timeout)
+            current.set(status=response.status_code, bytes=len(response.content))
+        return response
+
+    def status(self):
+        """Собирает RouterStatus из разделов config.ROUTER_ENDPOINTS"""
+        endpoints = config.ROUTER_ENDPOINTS
+        wan = self.get(endpoints["wan"])
+        system = self.get(endpoints["system"])
+        clients = self.get(endpoints["clients"])
+        if isinstance(clients, dict):
+            clients = clients.get("clients", [])
+
+        wan_state = str(wan.get("status", wan.get("state", ""))).lower()
+        uptime = system.get("uptime")
+        return RouterStatus(
+            timestamp=time.time(),
+            wan_up=wan_state in ("up", "connected", "online", "1", "true") if wan_state else None,
+            wan_ip=wan.get("ip") or wan.get("ipaddr"),
+            uptime=int(uptime) if uptime is not None else None,
+            clients=len(clients) if isinstance(clients, list) else None,
+        )
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+            self._authenticated = False
+
+    def stats(self):
+        return {"router_requests": self.requests, "router_logins": self.logins,
+                "router_not_modified": self.not_modified, "router_cache_hits": self.cache_hits}
+
+
+class RouterHealth:
+    """Проверка роутера в отдельном потоке, чтобы медленный роутер не задерживал такт.
+
+    check() возвращает asyncio.Future текущего цикла событий; повторный
+    вызов, пока предыдущая проверка не завершилась, ждёт её же.
+    close() не ждёт зависшую проверку: сессию закрывает она сама по окончании.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or RouterClient()
+        self.last_status = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router")
+        self._lock = threading.Lock()
+        self._pending = None
+        self._closing = False
+
+    @property
+    def busy(self):
+        return self._pending is not None and not self._pending.done()
+
+    def check(self):
+        if self._closing:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(RouterStatus(time.time(), error="проверки остановлены"))
+            return future
+        if not self.busy:
+            self._pending = self._executor.submit(self._check)
+        return asyncio.wrap_future(self._pending)
+
+    def _check(self):
+        with self._lock:
+            try:
+                status = self.client.status()
+            except RouterAuthError as e:
+                status = RouterStatus(time.time(), error=str(e))
+            except ImportError:
+                status = RouterStatus(time.time(), error="библиотека requests не установлена")
+            except Exception as e:
+                status = RouterStatus(time.time(), error=f"ошибка запроса ({type(e).__name__})")
+            self.last_status = status
+            if self._closing:
+                self.client.close()  # close() не дождался этой проверки
+            return status
+
+    def close(self):
+        """Останавливает проверки без ожидания: _lock держит идущая (возможно, зависшая) проверка"""
+        self._closing = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._lock.acquire(blocking=False):
+            try:
+                self.client.close()
+            finally:
+                self._lock.release()
+
+    def stats(self):
+        return self.client.stats()
@@ -0,0 +1,254 @@
+import time
+from collections import deque
+
+import config
+from event_backend import EVENT_SCAN_COMPLETE
+
+PROBE_SCAN = "scan"
+PROBE_INTERFACE = "interface"
+PROBE_INTERNET = "internet"
+
+# Таймер asyncio срабатывает раньше срока на разрешение часов (в Windows ~15,6 мс):
+# проверка, до срока которой меньше CLOCK_SLACK, уже считается подошедшей
+CLOCK_SLACK = 0.02
+
+
+class ProbeSchedule:
+    """Интервал одного типа проверки: растёт, пока всё стабильно, и сбрасывается при изменениях"""
+
+    __slots__ = ('name', 'min_interval', 'max_interval', 'base_max_interval', 'interval',
+                 'next_due', 'runs')
+
+    def __init__(self, name, min_interval, max_interval):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.base_max_interval = self.max_interval
+        self.interval = min_interval
+        self.next_due = 0.0
+        self.runs = 0
+
+    def tighten(self):
+        """Ситуация меняется — проверяем как можно чаще"""
+        self.interval = self.min_interval
+
+    def relax(self, factor):
+        """Всё стабильно — реже"""
+        self.interval = min(self.max_interval, self.interval * factor)
+
+    def slow_down(self):
+        """Сразу к максимальному интервалу"""
+        self.interval = self.max_interval
+
+
+class AdaptiveScheduler:
+    """Расписание проверок цикла мониторинга.
+
+    Для каждого типа проверки (сканирование, интерфейс, интернет) свой
+    интервал в пределах [CHECK_INTERVAL, *_INTERVAL_MAX]. Сканирование
+    при подключении почти не выполняется, интерфейс опрашивается чаще при
+    падении сигнала, интернет — сразу после сбоя. Запуски netsh и время
+    CPU ограничены бюджетом на минуту: при его исчерпании проверки
+    откладываются. События ОС (event_backend) делают проверки
+    внеочередными, а пока поток событий активен, опрос netsh редкий.
+    """
+
+    def __init__(self, clock=time.monotonic, cpu_clock=time.process_time):
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        base = config.CHECK_INTERVAL
+        self.schedules = {
+            PROBE_SCAN: ProbeSchedule(PROBE_SCAN, base, config.SCAN_INTERVAL_MAX),
+            PROBE_INTERFACE: ProbeSchedule(PROBE_INTERFACE, base, config.INTERFACE_INTERVAL_MAX),
+            PROBE_INTERNET: ProbeSchedule(PROBE_INTERNET, base, config.INTERNET_INTERVAL_MAX),
+        }
+        self.spawn_budget = config.SPAWN_BUDGET_PER_MINUTE
+        self.cpu_budget = config.CPU_BUDGET_PER_MINUTE
+        self.deferred = 0
+        self._spawns = deque()  # (время, количество запусков)
+        self._cpu = deque()  # (время, секунды CPU)
+        self._last_spawn_count = 0
+        self._last_cpu = cpu_clock()
+        self._last_state = None
+        self._last_signal = None
+        self._internet_down = False
+
+    def _trim(self, now):
+        horizon = now - 60
+        while self._spawns and self._spawns[0][0] < horizon:
+            self._spawns.popleft()
+        while self._cpu and self._cpu[0][0] < horizon:
+            self._cpu.popleft()
+
+    def spawns_last_minute(self, now=None):
+        self._trim(self.clock() if now is None else now)
+        return sum(count for _, count in self._spawns)
+
+    def cpu_last_minute(self, now=None):
+        self._trim(self.clock() if now is None else now)
+        return sum(seconds for _, seconds in self._cpu)
+
+    def charge(self, spawn_count):
+        """Учитывает запуски процессов (по счётчику ProbeEngine) и время CPU"""
+        now = self.clock()
+        spawned = spawn_count - self._last_spawn_count
+        self._last_spawn_count = spawn_count
+        if spawned > 0:
+            self._spawns.append((now, spawned))
+
+        cpu = self.cpu_clock()
+        used = cpu - self._last_cpu
+        self._last_cpu = cpu
+        if used > 0:
+            self._cpu.append((now, used))
+
+    def over_budget(self, now=None):
+        """Исчерпан ли бюджет запусков netsh или CPU за последнюю минуту"""
+        now = self.clock() if now is None else now
+        return (self.spawns_last_minute(now) >= self.spawn_budget
+                or self.cpu_last_minute(now) >= self.cpu_budget)
+
+    def due(self, now=None):
+        """Набор проверок, которые пора выполнить"""
+        now = self.clock() if now is None else now
+        due = {name for name, schedule in self.schedules.items() if schedule.next_due - now < CLOCK_SLACK}
+
+        # netsh дорогой: при исчерпанном бюджете откладываем всё, кроме интернета
+        netsh_due = due & {PROBE_SCAN, PROBE_INTERFACE}
+        if netsh_due and self.over_budget(now):
+            self.deferred += len(netsh_due)
+            for name in netsh_due:
+                self.schedules[name].next_due = now + self.schedules[name].min_interval
+            due -= netsh_due
+        return due
+
+    def completed(self, names, now=None):
+        """Отмечает выполненные проверки и назначает следующий запуск"""
+        now = self.clock() if now is None else now
+        for name in names:
+            schedule = self.schedules[name]
+            schedule.runs += 1
+            schedule.next_due = now + schedule.interval
+
+    def delay(self, now=None):
+        """Сколько спать до ближайшей запланированной проверки"""
+        now = self.clock() if now is None else now
+        next_due = min(schedule.next_due for schedule in self.schedules.values())
+        return max(0.0, next_due - now)
+
+    def observe_link(self, connected, ssid_visible, signal):
+        """Подстраивает интервалы сканирования и опроса интерфейса по снимку"""
+        factor = config.SCHEDULE_BACKOFF
+        scan = self.schedules[PROBE_SCAN]
+        interface = self.schedules[PROBE_INTERFACE]
+        state = (connected, ssid_visible)
+        changed = self._last_state is not None and state != self._last_state
+        falling = (signal is not None and self._last_signal is not None
+                   and self._last_signal - signal >= config.SIGNAL_DROP_THRESHOLD)
+        self._last_state = state
+        self._last_signal = signal
+
+        if changed or falling:
+            interface.tighten()
+        else:
+            interface.relax(factor)
+
+        if connected:
+            scan.slow_down()
+        elif changed:
+            scan.tighten()
+        else:
+            # Сети давно нет в эфире — сканируем всё реже, но не реже SCAN_INTERVAL_MAX и при
+            # потоке событий: о появлении сети он не сообщает, а переподключение её больше не ищет
+            scan.relax(factor)
+            scan.interval = min(scan.interval, scan.base_max_interval)
+
+        # Пока нет подключения, интерфейс опрашивается вместе со сканированием
+        if not connected:
+            interface.interval = min(interface.interval, scan.interval)
+
+    def set_events_active(self, active):
+        """Пока работает поток событий ОС, опрос netsh нужен лишь как страховка"""
+        for name in (PROBE_SCAN, PROBE_INTERFACE):
+            schedule = self.schedules[name]
+            if active:
+                schedule.max_interval = max(schedule.base_max_interval, config.EVENT_FALLBACK_INTERVAL)
+            else:
+                schedule.max_interval = schedule.base_max_interval
+                schedule.interval = min(schedule.interval, schedule.max_interval)
+                schedule.next_due = min(schedule.next_due, self.clock() + schedule.interval)
+
+    def on_event(self, kind):
+        """Событие от ОС: соответствующие проверки выполняются немедленно"""
+        names = (PROBE_INTERFACE, PROBE_INTERNET)
+        if kind == EVENT_SCAN_COMPLETE:
+            names = (PROBE_SCAN,)
+        for name in names:
+            self.request(name)
+
+    def request(self, name):
+        """Проверка name выполняется в ближайшем такте, дальше — с минимальным интервалом"""
+        schedule = self.schedules[name]
+        schedule.tighten()
+        schedule.next_due = 0.0
+
+    def request_at(self, name, when):
+        """Проверка name — не позже when (например, к следующему циклу переподключения)"""
+        schedule = self.schedules[name]
+        schedule.next_due = min(schedule.next_due, when)
+
+    def restore(self, intervals, now=None):
+        """Тёплый старт: интервалы прошлого запуска вместо минимальных.
+
+        Интерфейс и интернет проверяются в первом же такте, сканирование
+        эфира — только через восстановленный интервал.
+        """
+        now = self.clock() if now is None else now
+        for name, interval in intervals.items():
+            schedule = self.schedules.get(name)
+            if schedule is None:
+                continue
+            upper = schedule.max_interval
+            if name != PROBE_INTERNET:
+                upper = max(upper, config.EVENT_FALLBACK_INTERVAL)  # Уточнит set_events_active
+            schedule.interval = min(upper, max(schedule.min_interval, interval))
+        scan = self.schedules[PROBE_SCAN]
+        scan.next_due = now + scan.interval
+
+    def intervals(self):
+        """Текущие интервалы проверок (для сохранения между запусками)"""
+        return {name: schedule.interval for name, schedule in self.schedules.items()}
+
+    def observe_internet(self, has_internet):
+        """После сбоя интернет проверяется часто, при стабильной работе — реже.
+
+        Пока сбой продолжается, интервал снова растёт, но только до
+        INTERNET_RETRY_INTERVAL_MAX: восстановление замечается за секунды,
+        а долгий сбой не проверяется каждую секунду.
+        """
+        schedule = self.schedules[PROBE_INTERNET]
+        if has_internet:
+            schedule.relax(config.SCHEDULE_BACKOFF)
+        elif self._internet_down:
+            schedule.interval = min(max(schedule.min_interval, config.INTERNET_RETRY_INTERVAL_MAX),
+                                    schedule.interval * config.SCHEDULE_BACKOFF)
+        else:
+            schedule.tighten()
+        self._internet_down = not has_internet
+
+    def stats(self):
+        """Текущие интервалы, число запусков и использование бюджета.
+
+        Только читает состояние (окна бюджета не обрезает); вызывается из
+        потока цикла — другие потоки читают опубликованную копию (MonitorCore.budget).
+        """
+        horizon = self.clock() - 60
+        return {
+            "intervals": self.intervals(),
+            "runs": {name: s.runs for name, s in self.schedules.items()},
+            "deferred": self.deferred,
+            "spawns_last_minute": sum(count for when, count in self._spawns if when >= horizon),
+            "spawn_budget": self.spawn_budget,
+            "cpu_last_minute": sum(seconds for when, seconds in self._cpu if when >= horizon),
+            "cpu_budget": self.cpu_budget,
+        }
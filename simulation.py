@@ -0,0 +1,958 @@
+import argparse
+import asyncio
+import errno
+import json
+import math
+import os
+import random
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+
+import config
+from event_backend import EVENT_CONNECTED, EVENT_DISCONNECTED, PollingBackend, WlanEvent
+from journal import Journal
+from monitor_core import MonitorCore
+from monitor_state import LinkState
+from wifi_monitor import WiFiMonitor
+
+LINK_SIGNAL_MIN = 10  # Ниже этого уровня точка не видна в эфире и связь с ней рвётся
+# Сбои за шлюзом: их видит только проверка интернета, а исправить монитор их не может.
+# Их метрики — отдельные ключи internet_*, простой во время них в downtime не входит
+INTERNET_KINDS = ("blackout", "portal", "upstream")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "simulation_baseline.json")
+
+# Допуск регрессии: метрика -> (относительный, абсолютный); больше базового значения
+# с учётом допуска — регрессия. Время CPU зависит от машины, поэтому допуск шире.
+# Медиана обнаружения — самая быстрая из задержек DHCP, то есть фаза проверки
+# интернета: у одного и того же кода при сдвиге RTT шлюза на 1 мс она 0,2-2,8 с.
+REGRESSION_TOLERANCE = {
+    "spawns_per_hour": (0.10, 1),
+    "cpu_ms_per_hour": (0.50, 20),
+    "detection_p50": (0.20, 3.0),
+    "detection_p95": (0.20, 0.5),
+    "recovery_p50": (0.20, 0.5),
+    "recovery_p95": (0.20, 1.0),
+    "downtime_per_day": (0.10, 10),
+    "missed": (0, 0),
+    "internet_detection_p50": (0.20, 0.5),
+    "internet_detection_p95": (0.20, 1.0),
+    "internet_recovery_p50": (0.20, 0.5),
+    "internet_recovery_p95": (0.20, 1.0),
+    "internet_missed": (0, 0),
+}
+
+
+class VirtualClock:
+    """Виртуальное время симуляции: стоит на месте, пока цикл событий его не сдвинет"""
+
+    def __init__(self, start=0.0, epoch=1_700_000_000.0):
+        self.now = start
+        self.epoch = epoch  # Время time.time() в момент 0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now
+
+    def advance(self, seconds):
+        self.now += max(seconds, 0.0)
+
+
+class _IdleSelector:
+    """Селектор, который вместо ожидания ближайшего таймера сдвигает виртуальное время.
+
+    Готовый ввод-вывод (сигналы, потоки) проверяется без ожидания; если
+    таймеров нет вовсе, ждём ввод-вывод по-настоящему.
+    """
+
+    def __init__(self, selector, clock):
+        self._selector = selector
+        self._clock = clock
+
+    def select(self, timeout=None):
+        ready = self._selector.select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            return self._selector.select(None)
+        self._clock.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Цикл asyncio на VirtualClock: sleep и таймауты не ждут, время перескакивает к ближайшему"""
+
+    def __init__(self, clock):
+        super().__init__(_IdleSelector(selectors.DefaultSelector(), clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.monotonic()
+
+
+class _AccessPoint:
+    """Точка доступа симуляции: кривая сигнала и провалы (fade)"""
+
+    __slots__ = ('ssid', 'bssid', 'channel', 'curve', 'fades')
+
+    def __init__(self, ssid, bssid, curve, channel):
+        self.ssid = ssid
+        self.bssid = bssid
+        self.channel = channel
+        self.curve = curve  # [(время, сигнал %)], между точками — линейно
+        self.fades = []  # (начало, спад, провал, подъём)
+
+
+def _interpolate(curve, now):
+    if now <= curve[0][0]:
+        return curve[0][1]
+    for (t0, v0), (t1, v1) in zip(curve, curve[1:]):
+        if now <= t1:
+            return v0 + (v1 - v0) * (now - t0) / (t1 - t0)
+    return curve[-1][1]
+
+
+def _fade_factor(elapsed, fall, hold, rise):
+    if elapsed <= 0 or elapsed >= fall + hold + rise:
+        return 1.0
+    if elapsed < fall:
+        return 1 - elapsed / fall
+    if elapsed < fall + hold:
+        return 0.0
+    return (elapsed - fall - hold) / rise
+
+
+class SimulatedEnvironment:
+    """Сценарий радиоэфира и сети для симуляции мониторинга.
+
+    Сценарий задаётся заранее: какие точки доступа в эфире и с каким
+    сигналом, когда они выключены (access_point_down), когда DHCP не
+    выдаёт адрес (dhcp_failure), когда у провайдера нет интернета
+    (blackout), когда сеть требует входа на странице (captive_portal),
+    когда TCP-подключения проходят, а HTTP не отвечает (upstream_outage),
+    когда сигнал точки проваливается (fade). Состояние в любой
+    момент вычисляется по виртуальному времени clock, поэтому неделя
+    сбоев проигрывается за секунды. Каждый сбой попадает в outages —
+    (вид, начало, конец) — для подсчёта задержки обнаружения и
+    восстановления (см. simulate).
+    """
+
+    def __init__(self, clock=None, seed=0, interface="Wi-Fi"):
+        self.clock = clock or VirtualClock()
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.network_rng = random.Random(f"{seed}:network")  # RTT: число соединений не сдвигает сценарий
+        self.interface = interface
+        self.association_delay = (1.0, 3.0)  # Пределы длительности ассоциации, с
+        self.dhcp_delay = 0.5  # Выдача адреса после ассоциации
+        self.dhcp_retry = 60  # ОС сама повторяет запрос адреса с этим интервалом
+        self.gateway_rtt = 0.003
+        self.internet_rtt = (0.015, 0.040)
+        self.signal_noise = 2.0  # Стандартное отклонение шума сигнала, %
+        self.outages = []
+        self.associations = 0
+        self._aps = {}
+        self._down = []  # (SSID, начало, конец)
+        self._dhcp = []
+        self._blackouts = []
+        self._portals = []
+        self._upstream = []
+        self._link = None  # BSSID подключённой точки
+        self._association = None  # (SSID, BSSID или None, время готовности)
+        self._lease_at = None  # Когда выдан адрес (None — адреса нет)
+        self._next_dhcp = None  # Следующая попытка ОС получить адрес
+        self._listeners = []
+
+    # --- сценарий ---
+
+    def add_access_point(self, ssid, bssid, signal=80, channel=36):
+        """Точка доступа; signal — уровень в % или кривая [(время, %)]"""
+        curve = sorted(signal) if isinstance(signal, (list, tuple)) else [(0.0, signal)]
+        self._aps[bssid.lower()] = _AccessPoint(ssid, bssid.lower(), curve, channel)
+        return self
+
+    def access_point_down(self, ssid, start, end):
+        """Все точки сети ssid выключены: сеть не видна, связь рвётся"""
+        self._down.append((ssid, start, end))
+        self.outages.append(("ap_down", start, end))
+        return self
+
+    def dhcp_failure(self, start, end):
+        """Адрес теряется в момент start, DHCP не отвечает до end"""
+        self._dhcp.append((start, end))
+        self.outages.append(("dhcp", start, end))
+        return self
+
+    def blackout(self, start, end):
+        """Связь с точкой и шлюзом есть, интернета и DNS нет"""
+        self._blackouts.append((start, end))
+        self.outages.append(("blackout", start, end))
+        return self
+
+    def captive_portal(self, start, end):
+        """Сеть требует входа: TCP и DNS работают, HTTP перенаправляется на страницу входа"""
+        self._portals.append((start, end))
+        self.outages.append(("portal", start, end))
+        return self
+
+    def upstream_outage(self, start, end):
+        """Отказ за шлюзом провайдера: TCP-подключения и DNS проходят, HTTP-ответа нет"""
+        self._upstream.append((start, end))
+        self.outages.append(("upstream", start, end))
+        return self
+
+    def fade(self, bssid, start, fall=120, hold=300, rise=120):
+        """Сигнал точки плавно падает до нуля, держится и восстанавливается.
+
+        Сбой в outages — момент, когда точка уходит ниже LINK_SIGNAL_MIN:
+        без упреждающего перехода на другую точку связь рвётся здесь.
+        """
+        ap = self._aps[bssid.lower()]
+        ap.fades.append((start, fall, hold, rise))
+        crossing = self._crossing(ap, start, fall)
+        self.outages.append(("fade", crossing, crossing))
+        return self
+
+    def associated(self, ssid):
+        """ОС уже подключена к лучшей точке сети ssid и имеет адрес (монитор запущен при рабочей связи)"""
+        ap = self._best(ssid, self.clock.monotonic())
+        self._link = ap.bssid
+        self._lease_at = self.clock.monotonic()
+        return self
+
+    @staticmethod
+    def _crossing(ap, start, fall):
+        """Когда провал сигнала, начатый в start, уводит точку ниже LINK_SIGNAL_MIN"""
+        level = _interpolate(ap.curve, start)
+        return start + fall * (1 - LINK_SIGNAL_MIN / level) if level > LINK_SIGNAL_MIN else start
+
+    def transition_times(self):
+        """Моменты, когда состояние эфира меняется скачком (для событий ОС)"""
+        times = set()
+        for window in (*self._down, *self._dhcp, *self._blackouts, *self._portals, *self._upstream):
+            times.update(window[-2:])
+        for ap in self._aps.values():
+            for start, fall, hold, rise in ap.fades:
+                times.update((self._crossing(ap, start, fall), start + fall + hold + rise))
+        return sorted(times)
+
+    # --- состояние на текущий момент ---
+
+    def _level(self, ap, now):
+        level = _interpolate(ap.curve, now)
+        for fade in ap.fades:
+            level *= _fade_factor(now - fade[0], *fade[1:])
+        return level
+
+    def visible(self, ap, now=None):
+        now = self.clock.monotonic() if now is None else now
+        if any(ssid == ap.ssid and start <= now < end for ssid, start, end in self._down):
+            return False
+        return self._level(ap, now) >= LINK_SIGNAL_MIN
+
+    def signal(self, ap, now=None):
+        """Уровень сигнала с шумом; шум зависит только от точки и секунды, а не от числа запросов"""
+        now = self.clock.monotonic() if now is None else now
+        noise = random.Random(f"{self.seed}:{ap.bssid}:{int(now)}").gauss(0, self.signal_noise)
+        return max(0, min(100, round(self._level(ap, now) + noise)))
+
+    def access_points(self, now=None):
+        """Видимые точки доступа"""
+        now = self.clock.monotonic() if now is None else now
+        return [ap for ap in self._aps.values() if self.visible(ap, now)]
+
+    def _best(self, ssid, now):
+        candidates = [ap for ap in self.access_points(now) if ap.ssid == ssid]
+        return max(candidates, key=lambda ap: self._level(ap, now), default=None)
+
+    @staticmethod
+    def _within(windows, now):
+        return any(start <= now < end for start, end in windows)
+
+    def update(self):
+        """Доводит состояние подключения до текущего момента: ассоциация, разрыв, адрес"""
+        now = self.clock.monotonic()
+        if self._association is not None and now >= self._association[2]:
+            ssid, bssid, ready_at = self._association
+            self._association = None
+            ap = self._aps.get(bssid) if bssid else self._best(ssid, ready_at)
+            if ap is not None and ap.ssid == ssid and self.visible(ap, ready_at):
+                self._link = ap.bssid
+                self._lease_at = None
+                self._next_dhcp = ready_at + self.dhcp_delay
+                self._notify(EVENT_CONNECTED, ap)
+
+        if self._link is not None and not self.visible(self._aps[self._link], now):
+            self.disconnect()
+            return
+
+        if self._link is not None:
+            if self._lease_at is not None and any(self._lease_at < start <= now for start, _ in self._dhcp):
+                # Аренда потеряна, ОС повторяет запрос адреса
+                lost = min(start for start, _ in self._dhcp if self._lease_at < start <= now)
+                self._lease_at = None
+                self._next_dhcp = lost + self.dhcp_retry
+            while self._lease_at is None and self._next_dhcp is not None and self._next_dhcp <= now:
+                if self._within(self._dhcp, self._next_dhcp):
+                    self._next_dhcp += self.dhcp_retry
+                else:
+                    self._lease_at = self._next_dhcp
+
+    @property
+    def link(self):
+        """Подключённая точка доступа или None"""
+        self.update()
+        return self._aps[self._link] if self._link is not None else None
+
+    @property
+    def association_ready(self):
+        """Когда завершится текущая ассоциация (None — её нет)"""
+        return self._association[2] if self._association is not None else None
+
+    @property
+    def associating(self):
+        self.update()
+        return self._association[0] if self._association is not None else None
+
+    def has_lease(self):
+        return self.link is not None and self._lease_at is not None
+
+    def internet(self, now=None):
+        now = self.clock.monotonic() if now is None else now
+        return not self._within(self._blackouts, now)
+
+    def http_response(self, now=None):
+        """Что получает HTTP-запрос в интернет: ответ сервера, страница входа портала или ничего"""
+        now = self.clock.monotonic() if now is None else now
+        if self._within(self._portals, now):
+            return b"HTTP/1.1 302 Found\r\nLocation: http://portal.example/login\r\nContent-Length: 0\r\n\r\n"
+        if self._within(self._upstream, now):
+            return b""  # Соединение закрыто без ответа
+        return b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n"
+
+    # --- действия монитора ---
+
+    def begin_association(self, ssid, bssid=None):
+        """Команда подключения: False, если сеть не видна"""
+        self.update()
+        now = self.clock.monotonic()
+        if (self._aps.get(bssid) if bssid else self._best(ssid, now)) is None:
+            return False
+        if self._link is not None:
+            self.disconnect()
+        self.associations += 1
+        ready_at = now + self.rng.uniform(*self.association_delay)
+        self._association = (ssid, bssid, ready_at)
+        asyncio.get_running_loop().call_at(ready_at, self.update)
+        return True
+
+    def disconnect(self):
+        if self._link is not None:
+            ap = self._aps[self._link]
+            self._link = self._lease_at = self._next_dhcp = None
+            self._notify(EVENT_DISCONNECTED, ap)
+        self._association = None
+
+    def renew_lease(self):
+        """Повторный запрос адреса; успех, если DHCP сейчас отвечает"""
+        if self.link is None or self._within(self._dhcp, self.clock.monotonic()):
+            return False
+        if self._lease_at is None:
+            self._lease_at = self.clock.monotonic()
+        return True
+
+    # --- подписчики (события ОС) ---
+
+    def subscribe(self, callback):
+        """callback(вид события, точка доступа) при подключении и разрыве"""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, kind, ap):
+        for callback in list(self._listeners):
+            callback(kind, ap)
+
+
+def build_scenario(days=7, seed=1, ssid="Home"):
+    """Типичная неделя: две точки сети, сбой каждые 1,5-4,5 часа.
+
+    Виды сбоев: точка выключена (1-15 мин), нет интернета у провайдера
+    (0,5-30 мин), DHCP не выдаёт адрес (1-10 мин), провал сигнала одной
+    из точек (другая остаётся).
+    """
+    environment = SimulatedEnvironment(seed=seed)
+    rng = environment.rng
+    primary, secondary = "a4:2b:b0:11:22:33", "a4:2b:b0:11:22:35"
+    environment.add_access_point(ssid, primary, 75, channel=36)
+    environment.add_access_point(ssid, secondary, 55, channel=1)
+    environment.add_access_point(ssid + "-Guest", "a4:2b:b0:11:22:34", 70, channel=6)
+
+    faded = primary
+    t = 1800.0
+    end = days * 86400 - 3600
+    while True:
+        t += rng.uniform(1.5 * 3600, 4.5 * 3600)
+        if t >= end:
+            break
+        kind = rng.choices(("ap_down", "blackout", "dhcp", "fade"), (3, 3, 2, 2))[0]
+        if kind == "ap_down":
+            environment.access_point_down(ssid, t, t + rng.uniform(60, 900))
+        elif kind == "blackout":
+            environment.blackout(t, t + rng.uniform(30, 1800))
+        elif kind == "dhcp":
+            environment.dhcp_failure(t, t + rng.uniform(60, 600))
+        else:
+            environment.fade(faded, t)
+            faded = secondary if faded == primary else primary
+    return environment
+
+
+def build_internet_scenario(days=2, seed=1, ssid="Home"):
+    """Сбои за шлюзом: связь с точкой и шлюзом есть, интернета нет, сбой каждые 1-3 часа.
+
+    Виды: нет интернета у провайдера (0,5-30 мин), captive portal до входа
+    (1-10 мин), TCP-подключения проходят, а HTTP не отвечает (1-20 мин).
+    Отдельный сценарий, чтобы неделя build_scenario и её базовые значения
+    не зависели от этих сбоев.
+    """
+    environment = SimulatedEnvironment(seed=seed)
+    rng = environment.rng
+    environment.add_access_point(ssid, "a4:2b:b0:11:22:33", 75, channel=36)
+    environment.add_access_point(ssid + "-Guest", "a4:2b:b0:11:22:34", 70, channel=6)
+
+    t = 1800.0
+    end = days * 86400 - 3600
+    while True:
+        t += rng.uniform(3600, 3 * 3600)
+        if t >= end:
+            break
+        kind = rng.choice(INTERNET_KINDS)
+        if kind == "blackout":
+            environment.blackout(t, t + rng.uniform(30, 1800))
+        elif kind == "portal":
+            environment.captive_portal(t, t + rng.uniform(60, 600))
+        else:
+            environment.upstream_outage(t, t + rng.uniform(60, 1200))
+    return environment
+
+
+class _Writer:
+    """StreamWriter симулированного соединения: данные никуда не уходят"""
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+    def is_closing(self):
+        return True
+
+    async def wait_closed(self):
+        pass
+
+
+class SimulatedSession:
+    """Сессия команд поверх симуляции: один "процесс" на все запросы, как у CommandSession"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.spawn_count = 0
+        self.commands = 0
+        self._running = False
+
+    async def run(self, args, timeout=None):
+        if not self._running:
+            self._running = True
+            self.spawn_count += 1
+        self.commands += 1
+        return await self.backend.execute(args, timeout, session=True)
+
+    async def aclose(self):
+        self._running = False
+
+    def stats(self):
+        return {"session_spawns": self.spawn_count, "session_commands": self.commands,
+                "session_restarts": max(self.spawn_count - 1, 0), "session_timeouts": 0}
+
+
+class SimulatedEventBackend(PollingBackend):
+    """Поток событий ОС симуляции: подключение и разрыв приходят в момент перехода"""
+
+    streaming = True
+
+    def __init__(self, environment):
+        super().__init__()
+        self.environment = environment
+        self._on_event = None
+        self._timers = []
+
+    @property
+    def active(self):
+        return self._on_event is not None
+
+    async def start(self, on_event):
+        self._on_event = on_event
+        self.spawn_count += 1  # Настоящий поток событий — один долгоживущий процесс
+        self.environment.subscribe(self._deliver)
+        loop = asyncio.get_running_loop()
+        self._timers = [loop.call_at(t, self.environment.update)
+                        for t in self.environment.transition_times() if t >= loop.time()]
+
+    async def stop(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+        self.environment.unsubscribe(self._deliver)
+        self._on_event = None
+
+    def _deliver(self, kind, ap):
+        self.events_received += 1
+        self._on_event(WlanEvent(kind, self.environment.interface, ap.ssid, ap.bssid))
+
+
+def _matches(args, command):
+    """Команда из config (до первого подставляемого параметра) совпадает с args"""
+    if not command:
+        return False
+    prefix = []
+    for arg in command:
+        if "{" in arg:
+            break
+        prefix.append(arg)
+    return args[:len(prefix)] == prefix
+
+
+class SimulatedBackend:
+    """backend для WiFiMonitor поверх SimulatedEnvironment (см. backend.SystemBackend).
+
+    Отвечает на команды netsh текстом в формате английской Windows (его
+    разбирает настоящий netsh_parser), выполняет команды исправления из
+    config, а сокеты и DNS ведут себя по состоянию сценария. Время
+    выполнения команд и RTT — виртуальные. session и events по умолчанию
+    следуют config.COMMAND_SESSION и config.EVENT_BACKEND.
+    """
+
+    # Длительность команд: ключ — первое слово после `netsh wlan` или имя команды
+    LATENCY = {"show": 0.03, "networks": 0.12, "connect": 0.2, "disconnect": 0.1,
+               "renew": 1.5, "other": 0.05}
+    SESSION_LATENCY = 0.005  # Без запуска процесса команда в сессии отвечает быстрее
+
+    def __init__(self, environment, data_dir, session=None, events=None):
+        self.environment = environment
+        self.data_dir = data_dir
+        # Журнал в каталоге прогона и выключен: поток-писатель исказил бы замер CPU
+        self.journal = Journal(os.path.join(data_dir, "journal"), enabled=False)
+        self.session = config.COMMAND_SESSION if session is None else session
+        self.events = config.EVENT_BACKEND != "polling" if events is None else events
+        self.clock = environment.clock.monotonic
+        self.wall = environment.clock.time
+        self.commands = {}
+
+    def create_session(self):
+        return SimulatedSession(self) if self.session else None
+
+    def create_event_backend(self):
+        return SimulatedEventBackend(self.environment) if self.events else PollingBackend()
+
+    async def run(self, args, timeout=None):
+        return await self.execute(args, timeout)
+
+    async def execute(self, args, timeout=None, session=False):
+        """Выполняет команду в симуляции по истечении её виртуальной длительности"""
+        args = list(args)
+        kind = self._kind(args)
+        self.commands[kind] = self.commands.get(kind, 0) + 1
+        latency = self.LATENCY.get(kind, self.LATENCY["other"])
+        if session:
+            latency = max(latency - self.LATENCY["show"], 0) + self.SESSION_LATENCY
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise subprocess.TimeoutExpired(args, timeout)
+        await asyncio.sleep(latency)
+        code, output = self._execute(kind, args)
+        if kind == "roam" and code == 0:
+            # nmcli возвращается, только когда подключение завершено
+            await asyncio.sleep(self.environment.association_ready - self.clock())
+            self.environment.update()
+        return subprocess.CompletedProcess(args, code, output.encode('utf-8'), b"")
+
+    @staticmethod
+    def _kind(args):
+        if args[:2] == ["netsh", "wlan"] and len(args) > 2:
+            if args[2:4] == ["show", "networks"]:
+                return "networks"
+            return args[2]
+        if _matches(args, config.RENEW_LEASE_COMMAND):
+            return "renew"
+        if _matches(args, config.FLUSH_DNS_COMMAND):
+            return "flush_dns"
+        if _matches(args, config.ROAM_COMMAND):
+            return "roam"
+        return "other"
+
+    def _execute(self, kind, args):
+        environment = self.environment
+        params = dict(arg.split("=", 1) for arg in args[3:] if "=" in arg)
+        interface = params.get("interface")
+        if interface is not None and interface != environment.interface:
+            return 1, f'There is no such wireless interface on the system: "{interface}".\n'
+        if kind == "show":
+            return 0, self._interfaces_text()
+        if kind == "networks":
+            return 0, self._networks_text()
+        if kind == "connect":
+            if environment.begin_association(params.get("name")):
+                return 0, "Connection request was completed successfully.\n"
+            return 1, f'The network specified by profile "{params.get("name")}" is not available to connect.\n'
+        if kind == "disconnect":
+            environment.disconnect()
+            return 0, f'Disconnection request was completed successfully for interface "{environment.interface}".\n'
+        if kind in ("add", "delete", "flush_dns"):
+            return 0, ""
+        if kind == "renew":
+            return (0, "") if environment.renew_lease() else (1, "An error occurred while renewing interface.\n")
+        if kind == "roam":
+            bssids = [arg.lower() for arg in args if arg.lower() in environment._aps]
+            ssid = environment._aps[bssids[0]].ssid if bssids else None
+            return (0, "") if bssids and environment.begin_association(ssid, bssids[0]) else (10, "Error\n")
+        return 1, f"Unknown command: {' '.join(args)}\n"
+
+    def _interfaces_text(self):
+        environment = self.environment
+        ap = environment.link
+        lines = ["", "There is 1 interface on the system:", "",
+                 f"    Name                   : {environment.interface}",
+                 "    Description            : Simulated Wi-Fi adapter",
+                 "    Physical address       : 02:00:00:00:00:01"]
+        if ap is not None:
+            signal = environment.signal(ap)
+            rate = round(866.7 * signal / 100, 1)
+            lines += ["    State                  : connected",
+                      f"    SSID                   : {ap.ssid}",
+                      f"    BSSID                  : {ap.bssid}",
+                      "    Network type           : Infrastructure",
+                      "    Radio type             : 802.11ac",
+                      "    Authentication         : WPA2-Personal",
+                      "    Cipher                 : CCMP",
+                      f"    Channel                : {ap.channel}",
+                      f"    Receive rate (Mbps)    : {rate}",
+                      f"    Transmit rate (Mbps)   : {round(rate * 0.9, 1)}",
+                      f"    Signal                 : {signal}%",
+                      f"    Profile                : {ap.ssid}"]
+        elif environment.associating is not None:
+            lines += ["    State                  : associating",
+                      f"    SSID                   : {environment.associating}"]
+        else:
+            lines.append("    State                  : disconnected")
+        return "\r\n".join(lines + ["", "    Hosted network status  : Not available", ""])
+
+    def _networks_text(self):
+        environment = self.environment
+        networks = {}
+        for ap in environment.access_points():
+            networks.setdefault(ap.ssid, []).append(ap)
+        lines = [f"Interface name : {environment.interface}",
+                 f"There are {len(networks)} networks currently visible.", ""]
+        for n, (ssid, aps) in enumerate(networks.items(), 1):
+            lines += [f"SSID {n} : {ssid}",
+                      "    Network type            : Infrastructure",
+                      "    Authentication          : WPA2-Personal",
+                      "    Encryption              : CCMP"]
+            for m, ap in enumerate(aps, 1):
+                lines += [f"    BSSID {m}                 : {ap.bssid}",
+                          f"         Signal             : {environment.signal(ap)}%",
+                          f"         Channel            : {ap.channel}"]
+            lines.append("")
+        return "\r\n".join(lines)
+
+    # --- сокеты и DNS ---
+
+    async def open_connection(self, host, port):
+        """TCP по состоянию сценария: без адреса — сразу ошибка, без интернета — таймаут.
+
+        Проверки доступности только подключаются; HTTP-проверка читает
+        ответ — его определяет SimulatedEnvironment.http_response().
+        """
+        environment = self.environment
+        if not environment.has_lease():
+            raise OSError(errno.ENETUNREACH, "Network is unreachable")
+        if host == config.ROUTER_IP:
+            await asyncio.sleep(environment.gateway_rtt)
+        elif not environment.internet():
+            await asyncio.sleep(3600)  # Ответа нет: попытку отменит дедлайн проверки
+        else:
+            await asyncio.sleep(environment.network_rng.uniform(*environment.internet_rtt))
+        if not environment.has_lease():
+            raise OSError(errno.ECONNRESET, "Connection reset")
+        reader = asyncio.StreamReader()
+        reader.feed_data(environment.http_response())
+        reader.feed_eof()
+        return reader, _Writer()
+
+    async def getaddrinfo(self, host, port):
+        environment = self.environment
+        if not environment.has_lease():
+            raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+        if not environment.internet():
+            await asyncio.sleep(3600)  # Резолвер провайдера не отвечает
+        await asyncio.sleep(environment.gateway_rtt)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", port))]
+
+    def local_address(self, gateway=None):
+        if self.environment.link is None:
+            return None
+        return "192.168.1.23" if self.environment.has_lease() else "169.254.10.20"
+
+    def has_ip_lease(self, interface=None, gateway=None):
+        return self.environment.has_lease()
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class SimulationReport:
+    """Итоги прогона: запуски процессов, CPU и задержки обнаружения и восстановления"""
+
+    __slots__ = ('duration', 'spawns', 'cpu', 'wall', 'outages', 'detection', 'recovery', 'missed',
+                 'downtime', 'transitions', 'stats', 'startup')
+
+    def __init__(self, duration, spawns, cpu, wall, outages, detection, recovery, missed, downtime,
+                 transitions, stats, startup=None):
+        self.duration = duration  # Виртуальные секунды
+        self.spawns = spawns
+        self.cpu = cpu  # Настоящие секунды CPU процесса
+        self.wall = wall  # Настоящие секунды прогона
+        self.outages = outages
+        self.detection = detection  # [(вид сбоя, задержка обнаружения, с)]
+        self.recovery = recovery  # [(вид сбоя, от устранения причины до ONLINE, с)]
+        self.missed = missed  # Виды сбоев, закончившихся раньше, чем монитор их заметил
+        self.downtime = downtime  # Время не в ONLINE после первого подключения вне сбоев за шлюзом, с
+        self.transitions = transitions
+        self.stats = stats
+        self.startup = startup  # (тёплый старт, секунды и запуски процессов до первого ONLINE)
+
+    def summary(self, extra=()):
+        """Метрики, которые сравниваются с базовыми (см. regressions).
+
+        Задержки без префикса — по сбоям, которые монитор видит на своей
+        стороне (точка, DHCP, сигнал), internet_* — по сбоям за шлюзом,
+        в том числе из отчётов extra (см. build_internet_scenario).
+        """
+        hours = self.duration / 3600
+        summary = {
+            "spawns_per_hour": round(self.spawns / hours, 2),
+            "cpu_ms_per_hour": round(self.cpu * 1000 / hours, 1),
+        }
+        for prefix, internet in (("", False), ("internet_", True)):
+            reports = (self, *extra) if internet else (self,)
+            detection = [delay for report in reports for kind, delay in report.detection
+                         if (kind in INTERNET_KINDS) == internet]
+            recovery = [delay for report in reports for kind, delay in report.recovery
+                        if (kind in INTERNET_KINDS) == internet]
+            missed = [kind for report in reports for kind in report.missed]
+            summary.update({
+                prefix + "detection_p50": round(_percentile(detection, 0.5), 2),
+                prefix + "detection_p95": round(_percentile(detection, 0.95), 2),
+                prefix + "recovery_p50": round(_percentile(recovery, 0.5), 2),
+                prefix + "recovery_p95": round(_percentile(recovery, 0.95), 2),
+                **({} if internet else {"downtime_per_day": round(self.downtime / (self.duration / 86400), 1)}),
+                prefix + "missed": sum(1 for kind in missed if (kind in INTERNET_KINDS) == internet),
+            })
+        return summary
+
+    def describe(self, extra=()):
+        summary = self.summary(extra)
+        return (f"Симуляция {self.duration / 86400:.1f} сут за {self.wall:.1f} с, сбоев: {self.outages}, "
+                f"переходов состояния: {self.transitions}\n"
+                f"  запусков процессов: {self.spawns} ({summary['spawns_per_hour']}/ч), "
+                f"CPU: {summary['cpu_ms_per_hour']} мс на час симуляции\n"
+                f"  обнаружение сбоя: p50 {summary['detection_p50']} с, p95 {summary['detection_p95']} с, "
+                f"не замечено: {summary['missed']}\n"
+                f"  восстановление: p50 {summary['recovery_p50']} с, p95 {summary['recovery_p95']} с, "
+                f"простой: {summary['downtime_per_day']} с/сут\n"
+                f"  за шлюзом (и {sum(report.outages for report in extra)} сбоев отдельного сценария): "
+                f"обнаружение p50 {summary['internet_detection_p50']} с, "
+                f"p95 {summary['internet_detection_p95']} с, не замечено: {summary['internet_missed']}; "
+                f"восстановление p50 {summary['internet_recovery_p50']} с, "
+                f"p95 {summary['internet_recovery_p95']} с")
+
+
+def _analyse(states, outages, end):
+    """Задержки обнаружения и восстановления по переходам состояния [(время, LinkState)].
+
+    Простой считается вне сбоев за шлюзом (INTERNET_KINDS): их длительность
+    задаёт провайдер, а не монитор, — для них есть задержка восстановления.
+    """
+    def state_at(moment):
+        current = None
+        for t, state in states:
+            if t > moment:
+                break
+            current = state
+        return current
+
+    detection, recovery, missed = [], [], []
+    for kind, start, stop in sorted(outages, key=lambda outage: outage[1]):
+        if stop > end:
+            continue
+        if kind != "fade" and state_at(start) is LinkState.ONLINE:
+            first = next((t for t, state in states
+                          if t >= start and state not in (LinkState.ONLINE, LinkState.INFO)), None)
+            if first is None or first >= stop:
+                missed.append(kind)
+            else:
+                detection.append((kind, first - start))
+        if state_at(stop) is LinkState.ONLINE:
+            recovery.append((kind, 0.0))
+        else:
+            online = next((t for t, state in states if t >= stop and state is LinkState.ONLINE), end)
+            recovery.append((kind, online - stop))
+
+    excluded = sorted((start, stop) for kind, start, stop in outages if kind in INTERNET_KINDS)
+
+    def outside(start, stop):
+        """Длительность [start, stop) за вычетом сбоев за шлюзом"""
+        total, position = 0.0, start
+        for window_start, window_stop in excluded:
+            if window_stop <= position or window_start >= stop:
+                continue
+            total += max(0.0, window_start - position)
+            position = max(position, window_stop)
+        return total + max(0.0, stop - position)
+
+    downtime, down_since = 0.0, None
+    started = next((t for t, state in states if state is LinkState.ONLINE), None)
+    for t, state in states:
+        if started is None or t < started or state is LinkState.INFO:
+            continue
+        if state is LinkState.ONLINE:
+            if down_since is not None:
+                downtime += outside(down_since, t)
+                down_since = None
+        elif down_since is None:
+            down_since = t
+    if down_since is not None:
+        downtime += outside(down_since, end)
+    return detection, recovery, missed, downtime
+
+
+def simulate(environment, duration, ssid="Home", password="simulated-password", session=None, events=None,
+             data_dir=None):
+    """Прогоняет MonitorCore (цикл MonitorThread) на сценарии duration виртуальных секунд.
+
+    data_dir — каталог кэшей и сохранённого состояния (по умолчанию
+    временный): общий каталог у двух прогонов проверяет тёплый старт.
+    """
+    clock = environment.clock
+    states = []
+
+    def on_state(state, changed):
+        if changed:
+            states.append((clock.monotonic(), state.state))
+
+    random_state = random.getstate()
+    random.seed(environment.seed)  # Разброс задержек ReconnectMachine.backoff
+    loop = VirtualTimeLoop(clock)
+    with nullcontext(data_dir) if data_dir else tempfile.TemporaryDirectory(prefix="wifi-sim-") as data_dir:
+        backend = SimulatedBackend(environment, data_dir, session=session, events=events)
+        monitor = WiFiMonitor(ssid, password, backend=backend)
+        core = MonitorCore(monitor, on_state=on_state)
+        core.router_check_interval = math.inf  # Веб-интерфейса роутера в симуляции нет
+        end = clock.monotonic() + duration
+        cpu, wall = time.process_time(), time.perf_counter()
+        try:
+            task = loop.create_task(core.run())
+            loop.call_at(end, task.cancel)
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+            stats = monitor.get_stats()
+        finally:
+            loop.close()
+            monitor.metrics.close()
+            monitor.router.close()
+            random.setstate(random_state)
+
+    detection, recovery, missed, downtime = _analyse(states, environment.outages, end)
+    spawns = monitor.engine.spawn_count + monitor.events.spawn_count
+    return SimulationReport(duration, spawns, cpu, wall, len(environment.outages), detection, recovery,
+                            missed, downtime, len(states), stats,
+                            startup=(core.warm, core.startup_time, core.startup_spawns))
+
+
+def run_suite(days=7, seed=1, internet_days=2):
+    """Неделя сбоев из build_scenario и сбои за шлюзом из build_internet_scenario; [отчёты]"""
+    return [simulate(build_scenario(days, seed), days * 86400),
+            simulate(build_internet_scenario(internet_days, seed), internet_days * 86400)]
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def regressions(summary, baseline):
+    """[(метрика, значение, предел)] метрик, вышедших за допуск относительно базовых"""
+    result = []
+    for name, (relative, absolute) in REGRESSION_TOLERANCE.items():
+        if name not in baseline or name not in summary:
+            continue
+        limit = baseline[name] * (1 + relative) + absolute
+        if summary[name] > limit:
+            result.append((name, summary[name], limit))
+    return result
+
+
+def main(argv=None):
+    """python simulation.py [--days 7] [--seed 1] [--write-baseline]; код 1 при регрессии"""
+    parser = argparse.ArgumentParser(description="Симуляция мониторинга на виртуальном времени")
+    parser.add_argument("--days", type=float, default=7, help="длительность сценария, сутки")
+    parser.add_argument("--seed", type=int, default=1, help="зерно сценария")
+    parser.add_argument("--write-baseline", action="store_true",
+                        help=f"сохранить результат как базовый ({BASELINE_PATH})")
+    args = parser.parse_args(argv)
+
+    report, *extra = run_suite(args.days, args.seed)
+    print(report.describe(extra))
+    summary = report.summary(extra)
+    if args.write_baseline:
+        with open(BASELINE_PATH, "w", encoding='utf-8') as f:
+            json.dump({"days": args.days, "seed": args.seed, **summary}, f, indent=2)
+            f.write("\n")
+        print(f"Базовые значения сохранены в {BASELINE_PATH}")
+        return 0
+
+    baseline = load_baseline()
+    if baseline is None:
+        print("Базовых значений нет: python simulation.py --write-baseline")
+        return 0
+    failed = regressions(summary, baseline)
+    for name, value, limit in failed:
+        print(f"  РЕГРЕССИЯ {name}: {value} (допустимо до {limit:.2f})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
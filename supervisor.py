@@ -0,0 +1,344 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import config
+from backend import SystemBackend
+from monitor_core import MonitorCore
+from monitor_state import LinkState
+from netsh_parser import find_network, parse_interfaces, parse_networks
+from wifi_monitor import WiFiMonitor
+
+# Состояния, в которых выбранная сеть работает; в остальных (кроме INFO) — нет
+_HEALTHY = (LinkState.ONLINE, LinkState.CONNECTED)
+
+
+class ScanHub:
+    """Общие для всех мониторов процесса запросы `netsh wlan show`.
+
+    `show interfaces` выполняется один раз на SNAPSHOT_TTL для всех
+    адаптеров, `show networks` — один раз на SCAN_SHARE_TTL для каждого
+    адаптера, сколько бы сетей на нём ни отслеживалось. Одновременные
+    запросы ждут один общий запуск. Подписчики (subscribe) получают
+    каждый новый результат сканирования.
+    """
+
+    def __init__(self, scan_ttl=None, interface_ttl=None, clock=time.monotonic):
+        self.scan_ttl = config.SCAN_SHARE_TTL if scan_ttl is None else scan_ttl
+        self.interface_ttl = config.SNAPSHOT_TTL if interface_ttl is None else interface_ttl
+        self.clock = clock
+        self.queries = 0
+        self.shared = 0
+        self._results = {}  # ключ -> (время, разобранный результат)
+        self._pending = {}
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """callback(interface, networks) вызывается после каждого сканирования"""
+        self._subscribers.append(callback)
+
+    async def interfaces(self, query):
+        """Разобранный `show interfaces`; query — ProbeEngine._query вызывающего монитора"""
+        return await self._get(("interfaces",), ["interfaces"], config.INTERFACE_TIMEOUT,
+                               self.interface_ttl, query, parse_interfaces)
+
+    async def networks(self, interface, query):
+        """Разобранный `show networks mode=bssid` адаптера interface (None — адаптер по умолчанию)"""
+        view = ["networks", "mode=bssid"] + ([f"interface={interface}"] if interface else [])
+        return await self._get(("networks", interface), view, config.SCAN_TIMEOUT,
+                               self.scan_ttl, query, parse_networks)
+
+    async def _get(self, key, view, timeout, ttl, query, parse):
+        cached = self._results.get(key)
+        if cached is not None and self.clock() - cached[0] < ttl:
+            self.shared += 1
+            return cached[1]
+        pending = self._pending.get(key)
+        if pending is None:
+            self.queries += 1
+            pending = self._pending[key] = asyncio.ensure_future(self._fetch(key, view, timeout, query, parse))
+        else:
+            self.shared += 1
+        return await asyncio.shield(pending)
+
+    async def _fetch(self, key, view, timeout, query, parse):
+        try:
+            result = tuple(parse(await query(view, timeout)))
+        finally:
+            self._pending.pop(key, None)
+        self._results[key] = (self.clock(), result)
+        if key[0] == "networks":
+            for callback in list(self._subscribers):
+                callback(key[1], result)
+        return result
+
+    async def aclose(self):
+        """Отменяет незавершённые общие запросы (их процессы привязаны к циклу событий)"""
+        pending = list(self._pending.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._results.clear()
+
+    def stats(self):
+        return {"hub_queries": self.queries, "hub_shared": self.shared}
+
+
+@dataclass(frozen=True)
+class Network:
+    """Сеть из списка адаптера; меньшее значение priority — предпочтительнее"""
+
+    ssid: str
+    password: str
+    priority: int = 0
+
+
+@dataclass(frozen=True)
+class AdapterPlan:
+    """Адаптер (None — адаптер по умолчанию) и его сети в порядке приоритета"""
+
+    interface: Optional[str]
+    networks: Tuple[Network, ...]
+
+
+class FailoverPolicy:
+    """Выбор сети адаптера по приоритету и измеренному качеству.
+
+    Сеть пригодна, если видна в эфире с сигналом не ниже
+    FAILOVER_MIN_SIGNAL. Текущая сеть меняется, когда она неисправна
+    (нет в эфире, нет интернета, портал, не подключается) дольше FAILOVER_HOLD секунд,
+    или когда более приоритетная сеть пригодна дольше FAILOVER_HOLD.
+    Среди сетей одного приоритета выбирается с лучшим сигналом. После
+    переключения следующее возможно не раньше чем через FAILOVER_HOLD.
+    """
+
+    def __init__(self, networks, clock=time.monotonic):
+        self.networks = sorted(networks, key=lambda network: network.priority)
+        self.clock = clock
+        self.current = self.networks[0]
+        self.signals = {}  # SSID -> лучший сигнал последнего сканирования (None — не видна)
+        self.switches = 0
+        self._usable_since = {}
+        self._unhealthy_since = None
+        self._switched_at = None
+
+    def observe_scan(self, networks, now=None):
+        now = self.clock() if now is None else now
+        for network in self.networks:
+            info = find_network(networks, network.ssid)
+            signal = info.best_signal if info is not None else None
+            self.signals[network.ssid] = signal
+            if signal is not None and signal >= config.FAILOVER_MIN_SIGNAL:
+                self._usable_since.setdefault(network.ssid, now)
+            else:
+                self._usable_since.pop(network.ssid, None)
+
+    def observe_state(self, state, now=None):
+        now = self.clock() if now is None else now
+        if state.state in _HEALTHY:
+            self._unhealthy_since = None
+        elif state.state is not LinkState.INFO and self._unhealthy_since is None:
+            self._unhealthy_since = now
+
+    def _usable(self, network, now):
+        since = self._usable_since.get(network.ssid)
+        return since is not None and now - since >= config.FAILOVER_HOLD
+
+    def _rank(self, network):
+        signal = self.signals.get(network.ssid)
+        return network.priority, -(signal if signal is not None else -1)
+
+    def choose(self, now=None):
+        """Сеть, на которую пора переключиться, или None"""
+        now = self.clock() if now is None else now
+        if self._switched_at is not None and now - self._switched_at < config.FAILOVER_HOLD:
+            return None
+        usable = sorted((network for network in self.networks
+                         if network != self.current and self._usable(network, now)), key=self._rank)
+        if not usable:
+            return None
+        best = usable[0]
+        unhealthy = (self._unhealthy_since is not None
+                     and now - self._unhealthy_since >= config.FAILOVER_HOLD)
+        if unhealthy or best.priority < self.current.priority:
+            return best
+        return None
+
+    def switch(self, network, now=None):
+        self.current = network
+        self.switches += 1
+        self._switched_at = self.clock() if now is None else now
+        self._unhealthy_since = None
+
+    @property
+    def needs_survey(self):
+        """Нужны свежие сканирования: адаптер на резервной сети или текущая неисправна"""
+        return self.current.priority > self.networks[0].priority or self._unhealthy_since is not None
+
+
+class _Unit:
+    """Монитор одного адаптера: WiFiMonitor, его цикл и политика выбора сети"""
+
+    __slots__ = ('plan', 'monitor', 'core', 'policy', 'pending')
+
+    def __init__(self, plan, monitor, core, policy):
+        self.plan = plan
+        self.monitor = monitor
+        self.core = core
+        self.policy = policy
+        self.pending = None  # Сеть, на которую переключиться перед следующим тактом
+
+
+class Supervisor:
+    """Несколько адаптеров и резервные сети в одном цикле asyncio.
+
+    На каждый адаптер — один WiFiMonitor/MonitorCore, все сети его списка
+    оцениваются по одному общему сканированию (ScanHub), поэтому число
+    запусков netsh растёт с числом адаптеров, а не сетей. Пока адаптер
+    не на самой приоритетной сети, раз в SUPERVISOR_SCAN_INTERVAL
+    запрашивается сканирование, чтобы вернуться на неё, когда она появится.
+    on_state(interface, state, changed) — как у MonitorCore, плюс адаптер.
+    backend (см. backend.SystemBackend) общий для всех мониторов.
+    """
+
+    def __init__(self, plans, on_state=None, hub=None, backend=None):
+        self.backend = backend or SystemBackend()
+        self.clock = self.backend.clock
+        self.hub = hub or ScanHub(clock=self.clock)
+        self.on_state = on_state or (lambda interface, state, changed: None)
+        self.units = []
+        for plan in plans:
+            first = sorted(plan.networks, key=lambda network: network.priority)[0]
+            monitor = WiFiMonitor(first.ssid, first.password, interface=plan.interface, hub=self.hub,
+                                  backend=self.backend)
+            unit = _Unit(plan, monitor, None, FailoverPolicy(plan.networks, clock=self.clock))
+            unit.core = MonitorCore(monitor, on_state=self._state_handler(unit))
+            unit.core.before_tick = self._switch_handler(unit)
+            self.units.append(unit)
+        self.hub.subscribe(self._on_scan)
+        self._loop = None
+        self._task = None
+        self._stop_requested = False
+        self._lock = threading.Lock()
+        self.last_stats = None  # Копия stats(), обновляется циклом раз в секунду — для других потоков
+
+    def _state_handler(self, unit):
+        def on_state(state, changed):
+            unit.policy.observe_state(state)
+            self.on_state(unit.plan.interface, state, changed)
+        return on_state
+
+    def _switch_handler(self, unit):
+        def before_tick():
+            if unit.pending is not None:
+                network, unit.pending = unit.pending, None
+                self._switch(unit, network, self.clock())
+        return before_tick
+
+    def _on_scan(self, interface, networks):
+        for unit in self.units:
+            if unit.plan.interface == interface:
+                unit.policy.observe_scan(networks)
+
+    def run_forever(self):
+        """Запускает все мониторы в текущем потоке и блокирует его до stop()"""
+        try:
+            asyncio.run(self._main())
+        except asyncio.CancelledError:
+            pass
+
+    async def _main(self):
+        with self._lock:
+            if self._stop_requested:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        try:
+            await self.run()
+        finally:
+            with self._lock:
+                self._loop = None
+                self._task = None
+
+    def stop(self):
+        """Останавливает все мониторы из любого потока"""
+        with self._lock:
+            self._stop_requested = True
+            if self._loop is not None and self._task is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+    async def run(self):
+        tasks = [asyncio.ensure_future(unit.core.run()) for unit in self.units]
+        tasks.append(asyncio.ensure_future(self._supervise()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Общие запросы — до закрытия сессий команд мониторов
+            await self.hub.aclose()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _supervise(self):
+        """Раз в секунду проверяет политики; сканирование для возврата на приоритетную сеть"""
+        last_survey = {}
+        while True:
+            await asyncio.sleep(config.CHECK_INTERVAL)
+            self.last_stats = self.stats()
+            now = self.clock()
+            for unit in self.units:
+                network = unit.policy.choose(now)
+                if network is not None:
+                    # Сеть меняется только между тактами; затянувшееся переподключение прерываем
+                    unit.pending = network
+                    if unit.core.ticking:
+                        unit.monitor.reconnect.abort()
+                    else:
+                        unit.core.expedite()
+                elif (unit.policy.needs_survey
+                      and now - last_survey.get(unit.plan.interface, -config.SUPERVISOR_SCAN_INTERVAL)
+                      >= config.SUPERVISOR_SCAN_INTERVAL):
+                    last_survey[unit.plan.interface] = now
+                    unit.core.request_survey()
+
+    def _switch(self, unit, network, now):
+        previous = unit.policy.current
+        unit.policy.switch(network, now)
+        unit.monitor.journal.write("failover", interface=unit.plan.interface, previous=previous.ssid,
+                                   ssid=network.ssid, signal=unit.policy.signals.get(network.ssid))
+        print(f"Адаптер {unit.plan.interface or 'по умолчанию'}: переключение с {previous.ssid} "
+              f"на {network.ssid}")
+        unit.monitor.retarget(network.ssid, network.password)
+        unit.core.expedite()
+
+    def states(self):
+        """Последнее опубликованное состояние каждого адаптера: [(адаптер, MonitorState или None)]"""
+        return [(unit.plan.interface, unit.core.publisher.last) for unit in self.units]
+
+    def request_reconnect(self, interface=None):
+        """Переподключение адаптера interface (None — всех) из любого потока; None или текст ошибки"""
+        units = [unit for unit in self.units if interface is None or unit.plan.interface == interface]
+        if not units:
+            return f"нет адаптера {interface}"
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            return "мониторинг не запущен"
+        for unit in units:
+            loop.call_soon_threadsafe(unit.core.reconnect_now)
+        return None
+
+    def stats(self):
+        stats = self.hub.stats()
+        for unit in self.units:
+            name = unit.plan.interface or "default"
+            stats[f"{name}_ssid"] = unit.policy.current.ssid
+            stats[f"{name}_failovers"] = unit.policy.switches
+        return stats
+
+    def close(self):
+        for unit in self.units:
+            unit.monitor.metrics.close()
+            unit.monitor.router.close()
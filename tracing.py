@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import config
+
+_current = contextvars.ContextVar("wifi_monitor_span", default=None)
+
+
+class Span:
+    """Интервал трассировки; используется как контекстный менеджер.
+
+    Вложенность: родитель — span, открытый в том же контексте (в том числе
+    в задаче, созданной внутри него). set() добавляет аргументы, например
+    код возврата процесса или число байт.
+    """
+
+    __slots__ = ('tracer', 'name', 'args', 'start', 'track', 'parent', 'tick', '_token')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        tracer = self.tracer
+        parent = _current.get()
+        self.parent = parent.name if parent is not None else None
+        self.track = tracer._track()
+        self.tick = tracer.tick
+        self._token = _current.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._record(self, end)
+        return False
+
+
+class _NullSpan:
+    """Заглушка при выключенной трассировке: ничего не измеряет и не хранит"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def set(self, **args):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Трассировка такта мониторинга в кольцевой буфер с экспортом в Chrome trace.
+
+    Пока enabled == False, span() возвращает NULL_SPAN — цена одна проверка
+    флага. Если такт длится дольше TRACE_SLOW_TICK, последние
+    TRACE_DUMP_TICKS тактов сохраняются в TRACE_DIR (в отдельном потоке).
+    """
+
+    def __init__(self, enabled=None, capacity=None, slow_tick=None, dump_ticks=None, directory=None):
+        self.enabled = config.TRACE_ENABLED if enabled is None else enabled
+        self.slow_tick = config.TRACE_SLOW_TICK if slow_tick is None else slow_tick
+        self.dump_ticks = config.TRACE_DUMP_TICKS if dump_ticks is None else dump_ticks
+        self.directory = directory or config.TRACE_DIR
+        self.events = deque(maxlen=capacity or config.TRACE_RING_SIZE)
+        self.tick = 0
+        self.dumps = 0
+        self._tracks = weakref.WeakKeyDictionary()
+        self._thread_tracks = {}
+        self._track_ids = itertools.count(1)
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _track(self):
+        """Дорожка в трассе: своя для каждой задачи asyncio и каждого потока"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            track = self._tracks.get(task)
+            if track is None:
+                track = self._tracks[task] = next(self._track_ids)
+            return track
+        ident = threading.get_ident()
+        track = self._thread_tracks.get(ident)
+        if track is None:
+            track = self._thread_tracks[ident] = next(self._track_ids)
+        return track
+
+    def _record(self, span, end):
+        args = span.args
+        if span.parent is not None:
+            args['parent'] = span.parent
+        self.events.append((span.name, span.start, end - span.start, span.track, span.tick, args))
+
+    def begin_tick(self):
+        """Начинает новый такт; spans запоминают номер такта для выборочного сброса"""
+        self.tick += 1
+        return self.tick
+
+    def end_tick(self, duration):
+        """Завершает такт; медленный такт сбрасывает последние такты на диск"""
+        if self.enabled and self.slow_tick and duration >= self.slow_tick:
+            first = self.tick - self.dump_ticks + 1
+            self.dump(f"slow-tick-{self.tick}", [event for event in self.events if event[4] >= first])
+
+    def dump(self, prefix="trace", events=None):
+        """Сохраняет трассу в TRACE_DIR в фоновом потоке; возвращает путь файла"""
+        events = list(self.events) if events is None else events
+        path = os.path.join(self.directory, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        self.dumps += 1
+        threading.Thread(target=self.export, args=(path, events), daemon=True).start()
+        return path
+
+    def chrome_trace(self, events=None):
+        """Трасса в формате Chrome trace / Perfetto (JSON Object Format)"""
+        pid = os.getpid()
+        trace = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "wifi_monitor"}}]
+        for name, start, duration, track, tick, args in list(self.events if events is None else events):
+            trace.append({"name": name, "cat": "wifi_monitor", "ph": "X", "pid": pid, "tid": track,
+                          "ts": start / 1000, "dur": duration / 1000, "args": {"tick": tick, **args}})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export(self, path, events=None):
+        """Сохраняет трассу в файл (открывается в chrome://tracing или ui.perfetto.dev)"""
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding='utf-8') as f:
+                json.dump(self.chrome_trace(events), f, ensure_ascii=False, default=str)
+        except OSError as e:
+            print(f"Ошибка сохранения трассы: {e}")
+            return None
+        return path
+
+
+TRACER = Tracer()
+
+
+def span(name, **args):
+    """Span глобального трассировщика (NULL_SPAN, если трассировка выключена)"""
+    if not TRACER.enabled:
+        return NULL_SPAN
+    return Span(TRACER, name, args)
@@ -0,0 +1,205 @@
+import base64
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import config
+
+CRYPTPROTECT_UI_FORBIDDEN = 0x1
+
+STORE_KEYRING = "keyring"  # Системное хранилище паролей (пакет keyring)
+STORE_DPAPI = "dpapi"  # Файл, зашифрованный DPAPI Windows для текущего пользователя
+
+
+def write_json_atomic(path, data):
+    """Записывает JSON через временный файл и os.replace: читатель видит старую или новую версию"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + "-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+def _dpapi(data, protect):
+    """CryptProtectData / CryptUnprotectData: ключ привязан к учётной записи Windows"""
+    import ctypes
+    from ctypes import wintypes
+
+    class Blob(ctypes.Structure):
+        _fields_ = [("cbData", wintypes.DWORD), ("pbData", ctypes.POINTER(ctypes.c_char))]
+
+    buffer = ctypes.create_string_buffer(data, len(data))
+    source = Blob(len(data), ctypes.cast(buffer, ctypes.POINTER(ctypes.c_char)))
+    result = Blob()
+    crypt32 = ctypes.windll.crypt32
+    function = crypt32.CryptProtectData if protect else crypt32.CryptUnprotectData
+    if not function(ctypes.byref(source), None, None, None, None, CRYPTPROTECT_UI_FORBIDDEN,
+                    ctypes.byref(result)):
+        raise ctypes.WinError()
+    try:
+        return ctypes.string_at(result.pbData, result.cbData)
+    finally:
+        ctypes.windll.kernel32.LocalFree(result.pbData)
+
+
+class CredentialStore:
+    """SSID и пароль между запусками, чтобы не спрашивать их каждый раз.
+
+    Пароль хранится в системном хранилище через keyring, если пакет
+    установлен, иначе на Windows — в файле, зашифрованном DPAPI. Без того
+    и другого пароль не сохраняется (открытым текстом он на диск не
+    попадает). В credentials.json — SSID и способ хранения пароля.
+    """
+
+    def __init__(self, path=None, service=None):
+        self.path = path or os.path.join(config.APP_DATA_DIR, "credentials.json")
+        self.service = service or config.CREDENTIALS_SERVICE
+
+    def load(self):
+        """(ssid, password) или (None, None), если сохранённых данных нет"""
+        data = _read_json(self.path)
+        if not data or not data.get("ssid"):
+            return None, None
+        ssid = data["ssid"]
+        try:
+            if data.get("store") == STORE_KEYRING:
+                import keyring  # Необязательная зависимость
+                password = keyring.get_password(self.service, ssid)
+            elif data.get("store") == STORE_DPAPI and os.name == 'nt':
+                password = _dpapi(base64.b64decode(data["password"]), protect=False).decode('utf-8')
+            else:
+                password = None
+        except Exception as e:
+            print(f"Ошибка чтения сохранённого пароля: {e}")
+            password = None
+        return (ssid, password) if password else (None, None)
+
+    def save(self, ssid, password):
+        """Сохраняет SSID и пароль; False, если надёжного хранилища для пароля нет"""
+        data = None
+        try:
+            import keyring
+            keyring.set_password(self.service, ssid, password)
+            data = {"ssid": ssid, "store": STORE_KEYRING}
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"Ошибка сохранения пароля в хранилище ОС: {e}")
+
+        if data is None and os.name == 'nt':
+            try:
+                blob = _dpapi(password.encode('utf-8'), protect=True)
+                data = {"ssid": ssid, "store": STORE_DPAPI, "password": base64.b64encode(blob).decode('ascii')}
+            except OSError as e:
+                print(f"Ошибка шифрования пароля: {e}")
+        if data is None:
+            print("Пароль не сохранён: нет хранилища паролей ОС (установите пакет keyring)")
+            return False
+
+        try:
+            write_json_atomic(self.path, data)
+        except OSError as e:
+            print(f"Ошибка при сохранении учётных данных: {e}")
+            return False
+        return True
+
+    def clear(self):
+        """Забывает сохранённые SSID и пароль"""
+        data = _read_json(self.path)
+        if data and data.get("store") == STORE_KEYRING:
+            try:
+                import keyring
+                keyring.delete_password(self.service, data.get("ssid"))
+            except Exception as e:
+                print(f"Ошибка удаления пароля из хранилища ОС: {e}")
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Ошибка удаления учётных данных: {e}")
+
+
+@dataclass(frozen=True)
+class WarmState:
+    """Последнее подтверждённое состояние связи для тёплого старта"""
+
+    ssid: str
+    fingerprint: str  # Отпечаток профиля (wlan_profile.ProfileManager.fingerprint): пароль не менялся
+    bssid: Optional[str] = None
+    last_good: Optional[float] = None  # Unix-время последней проверенной связи
+    intervals: Dict[str, float] = field(default_factory=dict)  # Интервалы расписания на тот момент
+
+
+class WarmStateStore:
+    """Небольшой JSON с WarmState; пишется атомарно и только при изменении.
+
+    Смена сети, точки доступа или отпечатка записывается сразу, а
+    last_good и интервалы (они меняются почти каждый такт) — не чаще
+    раза в WARM_STATE_REFRESH секунд, поэтому при стабильной связи файл
+    почти не переписывается.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writes = 0
+        self.skipped = 0
+        self._saved = None
+
+    def load(self):
+        """Сохранённое состояние или None (файла нет или он повреждён)"""
+        data = _read_json(self.path)
+        if data is None:
+            return None
+        try:
+            state = WarmState(
+                ssid=str(data["ssid"]), fingerprint=str(data["fingerprint"]), bssid=data.get("bssid"),
+                last_good=float(data["last_good"]) if data.get("last_good") is not None else None,
+                intervals={str(name): float(value) for name, value in (data.get("intervals") or {}).items()})
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+        self._saved = state
+        return state
+
+    def _changed(self, state):
+        previous = self._saved
+        if previous is None or (state.ssid, state.fingerprint, state.bssid) != (
+                previous.ssid, previous.fingerprint, previous.bssid):
+            return True
+        if state.last_good is None or previous.last_good is None:
+            return state.last_good != previous.last_good
+        return state.last_good - previous.last_good >= config.WARM_STATE_REFRESH
+
+    def update(self, state):
+        """Записывает state, если он отличается от сохранённого; True, если файл переписан"""
+        if not self._changed(state):
+            self.skipped += 1
+            return False
+        try:
+            write_json_atomic(self.path, asdict(state))
+        except OSError as e:
+            print(f"Ошибка при сохранении состояния: {e}")
+            return False
+        self._saved = state
+        self.writes += 1
+        return True
+
+    def stats(self):
+        return {"warm_state_writes": self.writes, "warm_state_skipped": self.skipped}
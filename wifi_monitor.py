@@ -1,179 +1,210 @@
+import asyncio
+import os
 import subprocess
 import time
-import re
-import os
-import socket
 
 import config
-
-# Настройка для скрытия окон CMD в EXE (PyInstaller --windowed)
-if os.name == 'nt':  # Только для Windows
-    STARTUPINFO = subprocess.STARTUPINFO()
-    STARTUPINFO.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-    STARTUPINFO.wShowWindow = subprocess.SW_HIDE
-else:
-    STARTUPINFO = None
+from backend import SystemBackend
+from diagnosis import REMEDY_FLUSH_DNS, REMEDY_RENEW_LEASE, DiagnosisPipeline
+from link_quality import LinkQualityAnalyzer
+from metrics_exporter import PROBE_DURATION, RTT
+from metrics_store import MetricsStore
+from probe_engine import ProbeEngine
+from tracing import span
+from reachability import ReachabilityProber
+from router_health import RouterHealth
+from reconnect import ReconnectMachine
+from warm_start import WarmStateStore
+from wlan_profile import ProfileManager
 
 
 class WiFiMonitor:
-    """Класс для мониторинга и управления Wi-Fi подключениями"""
+    """Класс для мониторинга и управления Wi-Fi подключениями.
 
-    def __init__(self, ssid: str, password: str):
+    Проверки реализованы корутинами (*_async) и выполняются в цикле asyncio
+    (см. monitor_core.MonitorCore). Синхронные методы — обёртки для вызова
+    вне цикла событий. Процессы, сокеты и часы — через backend
+    (по умолчанию backend.SystemBackend, в тестах — simulation.SimulatedBackend).
+    """
+
+    def __init__(self, ssid: str, password: str, interface=None, hub=None, backend=None):
         self.ssid = ssid
         self.password = password
+        self.interface = interface  # Имя адаптера; None — адаптер по умолчанию
         self.connected = False
         self.ssid_available = False
+        self.backend = backend = backend or SystemBackend()
+        self.journal = backend.journal
+        self.engine = ProbeEngine(ssid, session=backend.create_session(), interface=interface, hub=hub,
+                                  backend=backend)
+        self.reachability = ReachabilityProber(connect=backend.open_connection)
+        self.profiles = ProfileManager(os.path.join(backend.data_dir, "profiles.json"))
+        self.reconnect = ReconnectMachine(self, clock=backend.clock, lease_check=backend.has_ip_lease)
+        self.events = backend.create_event_backend()
+        self.metrics = MetricsStore(os.path.join(backend.data_dir, "metrics", *([interface] if interface else [])))
+        self.router = RouterHealth()
+        self.diagnosis = DiagnosisPipeline(self, clock=backend.clock)
+        self.quality = LinkQualityAnalyzer(ssid, clock=backend.clock)
+        self.warm_state = WarmStateStore(os.path.join(backend.data_dir,
+                                                      f"state-{interface}.json" if interface else "state.json"))
+        self.last_stats = None  # Копия get_stats() на конец такта (publish_stats) — для других потоков
+
+    async def refresh_async(self, force=False, scan=True, survey=False):
+        """Обновляет общий для всех проверок снимок состояния сети"""
+        started = time.perf_counter()
+        with span("wifi.refresh", force=force, scan=scan, survey=survey) as current:
+            snapshot = await self.engine.snapshot(force=force, scan=scan, survey=survey)
+            probe = "scan" if scan and not snapshot.scan_skipped else "interface"
+            current.set(probe=probe, visible=snapshot.ssid_visible, connected=snapshot.is_connected)
+        PROBE_DURATION[probe].observe(time.perf_counter() - started)
+        self.ssid_available = snapshot.ssid_visible
+        self.connected = snapshot.is_connected and snapshot.current_ssid == self.ssid
+        self.quality.observe(snapshot)
+        return snapshot
+
+    def retarget(self, ssid, password):
+        """Переключает монитор на другую сеть (см. supervisor.FailoverPolicy)"""
+        self.ssid = self.engine.ssid = ssid
+        self.password = password
+        self.connected = False
+        self.engine.invalidate()
+        self.diagnosis.invalidate()
+        self.quality = LinkQualityAnalyzer(ssid, clock=self.backend.clock)
+
+    async def aclose(self):
+        """Освобождает процессы, привязанные к текущему циклу событий"""
+        await self.engine.aclose()
+
+    def _run_sync(self, coro):
+        """Выполняет корутину в отдельном цикле событий (для вызова вне MonitorCore)"""
+        async def run():
+            try:
+                return await coro
+            finally:
+                await self.aclose()
+        return asyncio.run(run())
+
+    def snapshot(self, force=False):
+        """Возвращает снимок состояния сети (вне цикла событий)"""
+        return self._run_sync(self.refresh_async(force=force))
 
     def check_wifi_available(self):
         """Проверяет, доступна ли указанная Wi-Fi сеть в радиусе действия"""
-        try:
-            result = subprocess.run(
-                ["netsh", "wlan", "show", "networks"],
-                capture_output=True,
-                text=True,
-                encoding='cp866',
-                timeout=5,
-                startupinfo=STARTUPINFO  # Скрывает окно
-            )
-
-            if result.returncode == 0:
-                networks = result.stdout
-                self.ssid_available = self.ssid in networks
-                return self.ssid_available
-            return False
-
-        except subprocess.TimeoutExpired:
-            return False
-        except Exception as e:
-            print(f"Ошибка при сканировании сетей: {e}")
-            return False
+        self.snapshot()
+        return self.ssid_available
 
     def get_current_connection(self):
         """Получает информацию о текущем подключении"""
-        try:
-            result = subprocess.run(
-                ["netsh", "wlan", "show", "interfaces"],
-                capture_output=True,
-                text=True,
-                encoding='cp866',
-                timeout=3,
-                startupinfo=STARTUPINFO  # Скрывает окно
-            )
-
-            if result.returncode == 0:
-                output = result.stdout
-                ssid_match = re.search(r'SSID\s*:\s*(.+)', output)
-                state_match = re.search(r'Состояние\s*:\s*(.+)', output, re.IGNORECASE)
-
-                current_ssid = ssid_match.group(1).strip() if ssid_match else None
-                is_connected = "подключено" in output.lower() if state_match else False
-
-                if current_ssid == self.ssid and is_connected:
-                    self.connected = True
-                    return True
-                else:
-                    self.connected = False
-                    return False
-            return False
+        self.snapshot()
+        return self.connected
 
-        except Exception as e:
-            print(f"Ошибка при получении информации о подключении: {e}")
-            return False
+    def get_stats(self):
+        """Статистика запусков netsh, кэшей и переподключений"""
+        return {**self.engine.stats(), **self.profiles.stats(), **self.reconnect.stats(),
+                **self.events.stats(), **self.metrics.stats(), **self.journal.stats(),
+                **self.router.stats(), **self.diagnosis.stats(),
+                **self.quality.stats(), **self.warm_state.stats()}
 
-    def connect_to_wifi(self):
-        """Подключается к указанной Wi-Fi сети"""
-        max_attempts = config.RECONNECT_ATTEMPTS
+    def publish_stats(self):
+        """Снимок статистики для экспорта метрик, API управления и GUI (вызывается из цикла мониторинга).
 
-        for attempt in range(1, max_attempts + 1):
-            try:
-                # Удаляем старый профиль
-                subprocess.run(
-                    ["netsh", "wlan", "delete", "profile", f"name={self.ssid}"],
-                    capture_output=True,
-                    text=True,
-                    startupinfo=STARTUPINFO  # Скрывает окно
-                )
-
-                # Создаем XML профиль
-                profile_xml = f"""<?xml version="1.0"?>
-<WLANProfile xmlns="http://www.microsoft.com/networking/WLAN/profile/v1">
-    <name>{self.ssid}</name>
-    <SSIDConfig>
-        <SSID>
-            <name>{self.ssid}</name>
-        </SSID>
-    </SSIDConfig>
-    <connectionType>ESS</connectionType>
-    <connectionMode>auto</connectionMode>
-    <MSM>
-        <security>
-            <authEncryption>
-                <authentication>WPA2PSK</authentication>
-                <encryption>AES</encryption>
-                <useOneX>false</useOneX>
-            </authEncryption>
-            <sharedKey>
-                <keyType>passPhrase</keyType>
-                <protected>false</protected>
-                <keyMaterial>{self.password}</keyMaterial>
-            </sharedKey>
-        </security>
-    </MSM>
-</WLANProfile>"""
-
-                # Сохраняем временный XML-файл
-                temp_filename = f"{self.ssid.replace(' ', '_')}.xml"
-                with open(temp_filename, "w", encoding='utf-8') as f:
-                    f.write(profile_xml)
-
-                # Добавляем профиль
-                subprocess.run(
-                    ["netsh", "wlan", "add", "profile", f"filename={temp_filename}"],
-                    capture_output=True,
-                    text=True,
-                    startupinfo=STARTUPINFO  # Скрывает окно
-                )
-
-                # Подключаемся
-                connect_result = subprocess.run(
-                    ["netsh", "wlan", "connect", f"name={self.ssid}"],
-                    capture_output=True,
-                    text=True,
-                    startupinfo=STARTUPINFO  # Скрывает окно
-                )
-
-                # Удаляем временный файл
-                if os.path.exists(temp_filename):
-                    os.remove(temp_filename)
-
-                # Проверяем результат подключения
-                if connect_result.returncode == 0:
-                    time.sleep(3)
-
-                    if self.get_current_connection():
-                        return True, f"Успешно подключено к {self.ssid}"
-                    else:
-                        return False, f"Попытка {attempt}/{max_attempts}: Не удалось установить соединение"
-                else:
-                    return False, f"Попытка {attempt}/{max_attempts}: Ошибка команды подключения"
+        get_stats() читает очереди и счётчики, которые цикл меняет, поэтому
+        другие потоки читают только last_stats — он заменяется целиком.
+        """
+        self.last_stats = {**self.get_stats(), "connected": self.connected}
 
-            except Exception as e:
-                error_msg = f"Попытка {attempt}/{max_attempts}: Ошибка: {str(e)}"
-                return False, error_msg
-
-            if attempt < max_attempts:
-                time.sleep(config.RECONNECT_DELAY)
+    def connect_to_wifi(self):
+        """Подключается к указанной Wi-Fi сети (вне цикла событий)"""
+        return self._run_sync(self.connect_to_wifi_async())
+
+    async def connect_to_wifi_async(self, on_progress=None, attempts=None):
+        """Подключается к указанной Wi-Fi сети (см. reconnect.ReconnectMachine)"""
+        with span("wifi.connect", ssid=self.ssid):
+            return await self.reconnect.run(on_progress, attempts)
+
+    async def roam_async(self, bssid=None, on_progress=None):
+        """Переход на другую точку доступа нашей сети, пока текущая связь ещё есть.
+
+        Если config.ROAM_COMMAND задан, подключение к bssid выполняет он;
+        netsh точку выбрать не умеет — тогда разрыв и переподключение
+        через ReconnectMachine, и Windows сама подключается к самой сильной.
+        """
+        snapshot = self.engine.last_snapshot
+        interface = snapshot.interface if snapshot is not None else None
+        name = interface.name if interface is not None and interface.name else ""
+        with span("wifi.roam", bssid=bssid) as current:
+            if bssid and config.ROAM_COMMAND:
+                args = [arg.format(ssid=self.ssid, bssid=bssid, interface=name) for arg in config.ROAM_COMMAND]
+                try:
+                    result = await self.engine.run(args, timeout=config.REMEDY_TIMEOUT)
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    print(f"Ошибка перехода на точку {bssid}: {e}")
+                else:
+                    current.set(returncode=result.returncode)
+                    if result.returncode == 0:
+                        self.engine.invalidate()
+                        self.diagnosis.invalidate()
+                        return True, f"Переход на точку доступа {bssid} выполнен"
 
-        return False, f"Не удалось подключиться после {max_attempts} попыток"
+            args = ["netsh", "wlan", "disconnect"] + ([f"interface={name}"] if name else [])
+            try:
+                await self.engine.command(args, timeout=config.REMEDY_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                print(f"Ошибка отключения: {e}")
+            self.engine.invalidate()
+            self.diagnosis.invalidate()
+            return await self.connect_to_wifi_async(on_progress)
 
     def check_internet(self):
-        """Проверяет доступность интернета"""
-        try:
-            socket.create_connection((config.ROUTER_IP, 80), timeout=2)
-            return True
-        except:
+        """Проверяет доступность интернета (вне цикла событий)"""
+        return self._run_sync(self.check_internet_async())
+
+    async def check_internet_async(self):
+        """Проверяет доступность интернета: гонка целей из config.INTERNET_TARGETS и HTTP-проверка 204.
+
+        TCP-подключение проходит и через captive portal, и при отказе за
+        шлюзом провайдера, поэтому интернет есть, только если после гонки
+        ответила и HTTP-проверка (уровень diagnosis.HTTP). Если гонка не
+        прошла, интернета нет и без неё.
+        """
+        started = time.perf_counter()
+        with span("wifi.check_internet") as current:
+            result = await self.reachability.probe()
+            current.set(reachable=result.reachable,
+                        target=result.target.name if result.target else None, rtt=result.rtt)
+            reachable = result.reachable
+            if reachable:
+                verified = await self.diagnosis.verify()
+                reachable = verified.ok
+                current.set(http=verified.ok, detail=verified.detail)
+        PROBE_DURATION["internet"].observe(time.perf_counter() - started)
+        RTT.set(result.rtt)
+        return reachable
+
+    async def diagnose_async(self):
+        """Послойная диагностика связи (см. diagnosis.DiagnosisPipeline)"""
+        return await self.diagnosis.run()
+
+    async def remedy_async(self, remedy):
+        """Выполняет исправление REMEDY_RENEW_LEASE или REMEDY_FLUSH_DNS; возвращает успех.
+
+        Полное переподключение — connect_to_wifi_async().
+        """
+        commands = {REMEDY_RENEW_LEASE: config.RENEW_LEASE_COMMAND, REMEDY_FLUSH_DNS: config.FLUSH_DNS_COMMAND}
+        snapshot = self.engine.last_snapshot
+        interface = snapshot.interface if snapshot is not None else None
+        name = interface.name if interface is not None and interface.name else ""
+        args = [arg.format(interface=name) for arg in commands[remedy]]
+        args = [arg for arg in args if arg]  # Без имени интерфейса — для всех адаптеров
+        with span("wifi.remedy", remedy=remedy) as current:
             try:
-                socket.create_connection(("8.8.8.8", 53), timeout=2)
-                return True
-            except:
-                return False
\ No newline at end of file
+                result = await self.engine.run(args, timeout=config.REMEDY_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                print(f"Ошибка исправления {remedy}: {e}")
+                return False
+            finally:
+                # Состояние сети могло измениться — следующая проверка заново
+                self.diagnosis.invalidate()
+                self.engine.invalidate()
+            current.set(returncode=result.returncode)
+        return result.returncode == 0
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+from xml.sax.saxutils import escape
+
+import config
+
+PROFILE_TEMPLATE = """<?xml version="1.0"?>
+<WLANProfile xmlns="http://www.microsoft.com/networking/WLAN/profile/v1">
+    <name>{ssid}</name>
+    <SSIDConfig>
+        <SSID>
+            <name>{ssid}</name>
+        </SSID>
+    </SSIDConfig>
+    <connectionType>ESS</connectionType>
+    <connectionMode>auto</connectionMode>
+    <MSM>
+        <security>
+            <authEncryption>
+                <authentication>{auth}</authentication>
+                <encryption>{cipher}</encryption>
+                <useOneX>false</useOneX>
+            </authEncryption>
+            <sharedKey>
+                <keyType>passPhrase</keyType>
+                <protected>false</protected>
+                <keyMaterial>{key}</keyMaterial>
+            </sharedKey>
+        </security>
+    </MSM>
+</WLANProfile>"""
+
+
+def build_profile_xml(ssid, password, auth="WPA2PSK", cipher="AES"):
+    """Собирает XML профиля WLAN (значения экранируются)"""
+    return PROFILE_TEMPLATE.format(ssid=escape(ssid), key=escape(password),
+                                   auth=escape(auth), cipher=escape(cipher))
+
+
+class ProfileManager:
+    """Устанавливает профиль WLAN только при изменении его параметров.
+
+    Отпечаток (SSID, аутентификация, шифр, ключ) хранится в кэше на диске
+    в виде солёного SHA-256. Если отпечаток совпадает, установленный профиль
+    переиспользуется без запуска netsh и без записи файлов.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or os.path.join(config.APP_DATA_DIR, "profiles.json")
+        self.installs = 0
+        self.reuses = 0
+        self._cache = self._load()
+        self._salt_saved = os.path.exists(self.cache_path)
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data.get("profiles"), dict) and data.get("salt"):
+                return data
+        except (OSError, ValueError, AttributeError):
+            pass
+        return {"salt": secrets.token_hex(16), "profiles": {}}
+
+    def _save(self):
+        """Атомарно записывает кэш отпечатков"""
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".profiles-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding='utf-8') as f:
+                json.dump(self._cache, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def fingerprint(self, ssid, password, auth="WPA2PSK", cipher="AES"):
+        """Отпечаток параметров профиля"""
+        if not self._salt_saved:
+            # Отпечатки сравниваются и между запусками (warm_start) — соль должна их пережить
+            self._salt_saved = True
+            try:
+                self._save()
+            except OSError as e:
+                print(f"Ошибка при сохранении кэша профилей: {e}")
+        digest = hashlib.sha256(self._cache["salt"].encode())
+        for part in (ssid, auth, cipher, password):
+            digest.update(b"\0" + part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_current(self, ssid, fingerprint):
+        """Совпадает ли отпечаток с профилем, установленным ранее"""
+        return self._cache["profiles"].get(ssid) == fingerprint
+
+    def forget(self, ssid):
+        """Забывает отпечаток: при следующем ensure() профиль будет переустановлен"""
+        if self._cache["profiles"].pop(ssid, None) is not None:
+            try:
+                self._save()
+            except OSError as e:
+                print(f"Ошибка при сохранении кэша профилей: {e}")
+
+    async def ensure(self, engine, ssid, password, auth="WPA2PSK", cipher="AES"):
+        """Гарантирует установленный актуальный профиль; True, если он был переписан"""
+        fingerprint = self.fingerprint(ssid, password, auth, cipher)
+        if self.is_current(ssid, fingerprint):
+            self.reuses += 1
+            return False
+
+        # XML пишется в личный временный каталог пользователя, а не в рабочий
+        fd, temp_path = tempfile.mkstemp(prefix="wlan-", suffix=".xml")
+        try:
+            with os.fdopen(fd, "w", encoding='utf-8') as f:
+                f.write(build_profile_xml(ssid, password, auth, cipher))
+
+            await engine.command(["netsh", "wlan", "delete", "profile", f"name={ssid}"])
+            result = await engine.command(["netsh", "wlan", "add", "profile", f"filename={temp_path}"])
+        finally:
+            os.remove(temp_path)
+
+        if result.returncode != 0:
+            raise RuntimeError("не удалось добавить профиль Wi-Fi")
+
+        self.installs += 1
+        self._cache["profiles"][ssid] = fingerprint
+        try:
+            self._save()
+        except OSError as e:
+            print(f"Ошибка при сохранении кэша профилей: {e}")
+        return True
+
+    def stats(self):
+        return {"profile_installs": self.installs, "profile_reuses": self.reuses}